@@ -1,70 +1,264 @@
+"""
+Скрипт ищет на europa-market.ru (config.BASE_URL) ссылки на товары по артикулам из in/arts_for_get_product_links.txt и записывает
+результаты в out/product_links_from_arts.txt (артикул, ссылка или статус через табуляцию).
+
+Сначала артикулы ищутся в локальном индексе артикул -> ссылка (см. article_index.py), собранном из результатов
+step2 и step3; на сайте ищутся только неизвестные индексу артикулы.
+
+Поиск идет параллельно SEARCH_WORKERS страницами одного браузера. При перезапуске артикулы, для которых в выходном
+файле уже есть ссылка или "Не найден", пропускаются. Найденные ссылки и "не найден" также сохраняются в постоянный
+кэш out/arts_cache.json: повторный запуск по тому же списку ищет на сайте только нерешенные артикулы. Записи "не найден"
+старше NOT_FOUND_RECHECK_HOURS (по дате проверки checked) ищутся заново - товар мог появиться в ассортименте.
+
+Поиск идет в сессии выбранного магазина (см. city_session.py). Если сохраненной сессии нет или она устарела, город
+устанавливается заново; если это не удалось, скрипт не ищет, чтобы не записать ссылки не из ассортимента магазина.
+
+Время каждого поиска по фазам пишется в out/metrics (см. crawl_metrics.py), сводка выводится в конце.
+"""
+import os
+import json
+import time
 import asyncio
+import datetime
 from playwright.async_api import async_playwright, TimeoutError
 from tqdm import tqdm
 
+from article_index import load_article_index
+from city_session import load_session_state, save_session_state_async, set_city_async, invalidate_session_state
+from config import BASE_URL, HEADLESS, RATE_LIMIT
+from crawl_metrics import CrawlMetrics, UrlTimer
+from rate_limiter import RateLimiter
+
+INPUT_FILE = os.path.join("in", "arts_for_get_product_links.txt")
+OUTPUT_FILE = os.path.join("out", "product_links_from_arts.txt")
+CACHE_FILE = os.path.join("out", "arts_cache.json")
+
+SHOP_INDEX = "241001"
+# Частота запросов в минуту (на все страницы вместе): начальная, минимальная, максимальная (см. rate_limiter.py)
+REQUESTS_PER_MINUTE = RATE_LIMIT or (10, 2, 40)
+DDOS_PAUSE_SECONDS = 60
+SEARCH_WORKERS = 4
+# Сколько ждать, пока на странице поиска появится карточка товара или сообщение "Нет подходящих товаров", мс
+SEARCH_TIMEOUT = 15000
+# Как часто сохранять кэш (каждые N новых результатов)
+SAVE_CACHE_EVERY = 20
+# Через сколько часов заново искать артикулы, записанные в кэш как "не найден"
+NOT_FOUND_RECHECK_HOURS = 7 * 24
+
+NOT_FOUND = "Не найден"
+LINK_NOT_FOUND = "Ссылка не найдена"
+LOAD_ERROR = "Ошибка загрузки страницы"
+OTHER_ERROR = "Ошибка"
+
+# Результат поиска: null, пока страница не определилась
+SEARCH_STATE_JS = """
+() => {
+    if (document.title.toLowerCase().includes('ddos')) return {state: 'ddos'};
+    if (document.body && document.body.innerText.includes('Нет подходящих товаров')) return {state: 'not_found'};
+    const link = document.querySelector('div.product-card a');
+    if (link && link.getAttribute('href')) return {state: 'found', href: link.getAttribute('href')};
+    return null;
+}
+"""
+
+
+def read_articles(filepath: str) -> list[str]:
+    with open(filepath, "r", encoding="utf-8") as articles_file:
+        articles = [line.strip() for line in articles_file if line.strip()]
+    return list(dict.fromkeys(articles))
+
+
+def load_resolved(filepath: str) -> dict:
+    """Артикулы, уже решенные в выходном файле: найдена ссылка или товар точно не найден."""
+    resolved = {}
+    if not os.path.exists(filepath):
+        return resolved
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) == 2 and (parts[1].startswith('http') or parts[1] == NOT_FOUND):
+                resolved[parts[0]] = parts[1]
+    return resolved
+
+
+def load_cache(filepath: str) -> dict:
+    if not os.path.exists(filepath):
+        return {}
+    try:
+        with open(filepath, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"Кэш {filepath} поврежден, начинаем с пустого.")
+        return {}
+
+
+def save_cache(cache: dict, filepath: str):
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, filepath)
+
+
+def cache_value(entry: dict) -> str:
+    """Значение для выходного файла по записи кэша."""
+    return entry['url'] if entry['status'] == 'found' else NOT_FOUND
+
+
+def is_cache_fresh(entry: dict) -> bool:
+    """Можно ли взять результат из кэша: найденные ссылки не устаревают, "не найден" - через NOT_FOUND_RECHECK_HOURS."""
+    if entry['status'] == 'found':
+        return True
+    cutoff = datetime.datetime.now() - datetime.timedelta(hours=NOT_FOUND_RECHECK_HOURS)
+    return entry.get('checked', '') >= cutoff.isoformat(timespec='seconds')
+
+
+async def search_article(page, article: str, limiter: RateLimiter, timer: UrlTimer | None = None) -> str:
+    """Ищет артикул на сайте. Возвращает ссылку на товар или статус (Не найден, Ошибка загрузки страницы ...)."""
+    timer = timer or UrlTimer()
+    search_url = f"{BASE_URL}/catalog?search={article}"
+    with timer.phase('sleep'):
+        await limiter.wait_async()
+    timer.attempt()
+    started = time.perf_counter()
+    try:
+        with timer.phase('navigation'):
+            await page.goto(search_url, wait_until="domcontentloaded", timeout=30000)
+        with timer.phase('classification'):
+            handle = await page.wait_for_function(SEARCH_STATE_JS, polling=200, timeout=SEARCH_TIMEOUT)
+            result = await handle.json_value()
+    except TimeoutError:
+        limiter.record_error()
+        return LINK_NOT_FOUND if page.url.startswith(search_url) else LOAD_ERROR
+    except Exception as e:
+        limiter.record_error()
+        print(f"Произошла непредвиденная ошибка для артикула {article}: {e}")
+        return OTHER_ERROR
+
+    if result['state'] == 'ddos':
+        print(f"DDoS-Guard на артикуле {article}, снижаем частоту: {limiter.summary()}")
+        limiter.record_ddos()
+        timer.mark_ddos()
+        return LOAD_ERROR
+    limiter.record_success(time.perf_counter() - started)
+    if result['state'] == 'not_found':
+        return NOT_FOUND
+    return f"{BASE_URL}{result['href']}"
+
+
+async def restore_session_state(browser) -> str | None:
+    """Сохраненной сессии магазина нет или она устарела: устанавливает город заново и сохраняет сессию.
+    Возвращает путь к сессии или None, если установить город не удалось."""
+    print("Сохраненной сессии магазина нет или она устарела, устанавливаем город")
+    context = await browser.new_context()
+    try:
+        await set_city_async(await context.new_page(), BASE_URL, SHOP_INDEX)
+        return await save_session_state_async(context, SHOP_INDEX)
+    except Exception as e:
+        print(f"Не удалось установить город: {e}")
+        invalidate_session_state(SHOP_INDEX)
+        return None
+    finally:
+        await context.close()
+
 
 async def main():
     """
     Основная асинхронная функция для парсинга ссылок на товары.
     """
-    input_file = "in/arts_for_get_product_links.txt"
-    output_file = "out/product_links_from_arts.txt"
-    base_url = "https://europa-market.ru"
-
     print("Запуск парсера...")
+    try:
+        articles = read_articles(INPUT_FILE)
+    except FileNotFoundError:
+        print(f"Ошибка: Файл '{INPUT_FILE}' не найден. Пожалуйста, создайте его и добавьте артикулы.")
+        return
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)  # Установите headless=False, чтобы видеть окно браузера
-        page = await browser.new_page()
+    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+    resolved = load_resolved(OUTPUT_FILE)
+    cache = load_cache(CACHE_FILE)
+    limiter = RateLimiter(*REQUESTS_PER_MINUTE, ddos_pause=DDOS_PAUSE_SECONDS)
+    metrics = CrawlMetrics('arts_to_links')
 
-        try:
-            with open(input_file, "r", encoding="utf-8") as articles_file:
-                articles = articles_file.readlines()
-        except FileNotFoundError:
-            print(f"Ошибка: Файл '{input_file}' не найден. Пожалуйста, создайте его и добавьте артикулы.")
-            await browser.close()
+    with open(OUTPUT_FILE, "a", encoding="utf-8") as results_file:
+        def write_result(article: str, value: str):
+            results_file.write(f"{article}\t{value}\n")
+            results_file.flush()
+
+        # Артикулы из локального индекса и кэша дописываем в выходной файл без обращения к сайту
+        article_index = load_article_index()
+        to_search = []
+        from_index = from_cache = 0
+        for article in articles:
+            if article in resolved:
+                continue
+            if article in article_index:
+                write_result(article, article_index[article])
+                from_index += 1
+            elif article in cache and is_cache_fresh(cache[article]):
+                write_result(article, cache_value(cache[article]))
+                from_cache += 1
+            else:
+                to_search.append(article)
+        print(f"Артикулов: {len(articles)}, уже в файле: {len(resolved)}, из индекса: {from_index}, "
+              f"из кэша: {from_cache}, к поиску: {len(to_search)}")
+        if not to_search:
+            print(f"Работа завершена. Результаты сохранены в файл '{OUTPUT_FILE}'.")
             return
 
-        with open(output_file, "a", encoding="utf-8") as results_file:
-            for article in tqdm(articles):
-                article_clean = article.strip()
-                if not article_clean:
-                    continue
+        queue = asyncio.Queue()
+        for article in to_search:
+            queue.put_nowait(article)
+        unsaved = 0
 
-                search_url = f"{base_url}/catalog?search={article_clean}"
-                print(f"Обрабатывается артикул: {article_clean} -> {search_url}")
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=HEADLESS)  # EUROPA_HEADLESS=1 - без окна браузера
+            # Сессия магазина, сохраненная step2/step3, чтобы поиск шел по ассортименту выбранного магазина
+            session_state = load_session_state(SHOP_INDEX) or await restore_session_state(browser)
+            if not session_state:
+                await browser.close()
+                print("Магазин не выбран: поиск без выбранного магазина дает ссылки не из его ассортимента, "
+                      "работа остановлена.")
+                return
+            context = await browser.new_context(storage_state=session_state)
 
-                try:
-                    await page.goto(search_url, wait_until="networkidle", timeout=30000)
+            with tqdm(total=len(to_search), desc="Поиск артикулов", unit="арт") as pbar:
+                async def worker():
+                    nonlocal unsaved
+                    page = await context.new_page()
+                    while True:
+                        try:
+                            article = queue.get_nowait()
+                        except asyncio.QueueEmpty:
+                            break
+                        timer = metrics.start(article)
+                        value = await search_article(page, article, limiter, timer)
+                        with timer.phase('persistence'):
+                            write_result(article, value)
+                            if value == NOT_FOUND or value.startswith('http'):
+                                cache[article] = {'status': 'found' if value.startswith('http') else 'not_found',
+                                                  'url': value if value.startswith('http') else None,
+                                                  'checked': datetime.datetime.now().isoformat(timespec='seconds')}
+                                unsaved += 1
+                                if unsaved >= SAVE_CACHE_EVERY:
+                                    save_cache(cache, CACHE_FILE)
+                                    unsaved = 0
+                        timer.finish('found' if value.startswith('http') else value)
+                        if page.is_closed():
+                            page = await context.new_page()
+                        pbar.update(1)
+                        pbar.set_postfix_str(f"{limiter.rate:.1f} запр/мин")
+                    await page.close()
 
-                    # Проверяем, есть ли сообщение о том, что товар не найден
-                    not_found_locator = page.locator('text="Нет подходящих товаров"')
+                try:
+                    await asyncio.gather(*(worker() for _ in range(SEARCH_WORKERS)))
+                finally:
+                    save_cache(cache, CACHE_FILE)
 
-                    if await not_found_locator.is_visible(timeout=7000):
-                        print(f"Товар с артикулом {article_clean} не найден.")
-                        results_file.write(f"{article_clean}\tНе найден\n")
-                    else:
-                        # Ищем ссылку на карточку товара
-                        product_link_locator = page.locator("div.product-card a").first
+            await browser.close()
 
-                        try:
-                            href = await product_link_locator.get_attribute("href", timeout=7000)
-                            full_url = f"{base_url}{href}"
-                            print(f"Найдена ссылка: {full_url}")
-                            results_file.write(f"{article_clean}\t{full_url}\n")
-                        except TimeoutError:
-                            print(f"Не удалось найти ссылку для артикула {article_clean} на странице.")
-                            results_file.write(f"{article_clean}\tСсылка не найдена\n")
-
-                except TimeoutError:
-                    print(f"Ошибка: не удалось загрузить страницу для артикула {article_clean}. Пропускаем.")
-                    results_file.write(f"{article_clean}\tОшибка загрузки страницы\n")
-                except Exception as e:
-                    print(f"Произошла непредвиденная ошибка для артикула {article_clean}: {e}")
-                    results_file.write(f"{article_clean}\tОшибка\n")
-
-        await browser.close()
-        print(f"Работа завершена. Результаты сохранены в файл '{output_file}'.")
+    print(f"Работа завершена. Результаты сохранены в файл '{OUTPUT_FILE}'.")
+    print(f"Частота запросов: {limiter.summary()}")
+    metrics.close()
+    print(f"Замеры ({metrics.path}):\n{metrics.report()}")
 
 
 if __name__ == "__main__":
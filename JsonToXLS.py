@@ -2,69 +2,111 @@
 Скрипт считывает файл JSON (необходимо задать FILE_NAME_JSON и имя результирующего файла) с товарами и записывает
 данные в Excel.
 Формируется 1 лист с товарами и логикой обработки.
+
+Выгрузка потоковая: товары читаются из хранилища (data.json и журнал дозаписи, см. product_store.py) порциями
+по CHUNK_SIZE и сразу пишутся в книгу openpyxl в режиме write-only, поэтому память не зависит от размера каталога.
+Ширина столбцов считается по первым WIDTH_SAMPLE_ROWS строкам. Если задан ROWS_PER_FILE, выгрузка делится на
+несколько файлов: ПарсЕвро.xlsx, ПарсЕвро_2.xlsx, ...
+
+Цены для маркетплейсов считаются по таблице PRICE_RULES сразу для всего столбца цен (numpy), по одному набору
+правил на маркетплейс. Сравнение скорости с прежним построчным расчетом: bench_pricing.py
+
+Перед выгрузкой ссылки на фото проверяются и загружаются в локальный кэш (см. image_cache.py, CHECK_IMAGES):
+мертвые ссылки и повторы одной и той же картинки у товара в столбцы фото не попадают.
 """
-import json
+import os
+from itertools import islice
+import numpy as np
 import pandas as pd
+from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
 
+from image_cache import check_product_images
+from product_store import iter_products, log_path_for
+
 # Имена файлов для удобства вынесены в константы
 FILE_NAME_JSON = 'out/data.json'
 RESULT_FILE_NAME = 'out/ПарсЕвро250909.xlsx'
 
-
-def read_json():
-    """Считывает данные из JSON файла."""
-    try:
-        with open(FILE_NAME_JSON, 'r', encoding='utf-8') as json_file:
-            data = json.load(json_file)
-            return data
-    except FileNotFoundError:
-        print(f"Ошибка: Файл {FILE_NAME_JSON} не найден.")
-        return None
-    except json.JSONDecodeError:
-        print(f"Ошибка: Не удалось декодировать JSON из файла {FILE_NAME_JSON}.")
-        return None
-
-
-def transform_price(x):
-    """Трансформирует цену по заданным правилам."""
-    if not isinstance(x, (int, float)):
-        return 0  # Возвращаем 0 или другое значение по умолчанию, если цена некорректна
-
-    match x:
-        case _ if x < 100:
-            result = x * 7
-        case _ if x < 250:
-            result = x * 6
-        case _ if x < 500:
-            result = x * 5
-        case _ if x < 750:
-            result = x * 4.5
-        case _ if x < 1000:
-            result = x * 4
-        case _ if x < 1500:
-            result = x * 3.5
-        case _ if x < 2000:
-            result = x * 3
-        case _ if x < 3000:
-            result = x * 2.5
-        case _ if x < 4000:
-            result = x * 2
-        case _:
-            result = x * 1.5
-
-    result = max(result, 590)
-    return round(result)
-
-
-def create_df_by_dict(data_dict):
+CHUNK_SIZE = 5000
+WIDTH_SAMPLE_ROWS = 1000
+ROWS_PER_FILE = None  # например, 10000 - не более 10000 товаров в одном файле
+# Проверять ссылки на фото перед выгрузкой (повторные запуски проверяют только новые ссылки)
+CHECK_IMAGES = True
+
+# Правила цен по маркетплейсам. tiers - (верхняя граница цены Европы, множитель) по возрастанию, последняя граница -
+# бесконечность; floor - минимальная цена; discount - множитель для "цены до скидки". Столбцы задаются для каждого
+# маркетплейса отдельно, все наборы считаются за один проход по столбцу цен.
+PRICE_RULES = {
+    'OZON': {
+        'tiers': [(100, 7), (250, 6), (500, 5), (750, 4.5), (1000, 4), (1500, 3.5), (2000, 3), (3000, 2.5),
+                  (4000, 2), (float('inf'), 1.5)],
+        'floor': 590,
+        'discount': 1.3,
+        'price_column': 'Цена для OZON',
+        'discount_column': 'Цена до скидки',
+    },
+}
+PRICE_COLUMNS = [column for rules in PRICE_RULES.values()
+                 for column in (rules['price_column'], rules['discount_column'])]
+
+# Итоговый порядок столбцов
+DESIRED_ORDER = [
+    'Артикул', 'Название', *PRICE_COLUMNS, 'НДС',
+    'Цена Европы', 'Вес товара', 'Ссылка на главное фото товара',
+    'Ссылки на другие фото товара', 'Описание', 'ArtNumber',
+    'Характеристики', 'art_url'
+]
+# Фиксированная ширина для длинных полей
+FIXED_WIDTHS = {
+    'Название': 30, 'Описание': 50, 'Характеристики': 50, 'Ссылка на главное фото товара': 30,
+    'Ссылки на другие фото товара': 30, 'art_url': 30,
+}
+
+
+def apply_price_rules(df, price_rules=PRICE_RULES):
+    """
+    Добавляет в DataFrame столбцы цен для всех маркетплейсов из price_rules. Цена Европы, которая не является числом,
+    дает цену 0 (без учета минимальной цены и скидки).
+    """
+    source = df['Цена Европы']
+    if pd.api.types.is_numeric_dtype(source) and not pd.api.types.is_bool_dtype(source):
+        valid = source.notna().to_numpy()
+    else:
+        valid = source.map(lambda x: isinstance(x, (int, float)) and not isinstance(x, bool) and x == x).to_numpy()
+    prices = np.where(valid, pd.to_numeric(source.where(valid, 0), errors='coerce'), 0).astype(float)
+
+    for rules in price_rules.values():
+        bounds = np.array([bound for bound, _ in rules['tiers']], dtype=float)
+        multipliers = np.array([multiplier for _, multiplier in rules['tiers']], dtype=float)
+        # Индекс первой границы, которая строго больше цены (как в цепочке "x < граница")
+        tier = np.minimum(np.searchsorted(bounds, prices, side='right'), len(bounds) - 1)
+        result = np.round(np.maximum(prices * multipliers[tier], rules['floor']))
+        result = np.where(valid, result, 0).astype(np.int64)
+        df[rules['price_column']] = result
+        df[rules['discount_column']] = np.round(result * rules['discount']).astype(np.int64)
+    return df
+
+
+# Столбцы строки товара до добавления вычисляемых
+ROW_COLUMNS = [
+    "ArtNumber", "Название", "Цена Европы", "Описание", "Вес товара", "Ссылка на главное фото товара",
+    "Ссылки на другие фото товара", "art_url", "Характеристики"
+]
+
+
+def create_df_by_dict(data_dict, image_cache=None):
     """
     Преобразует словарь с данными о товарах в DataFrame, обрабатывая
     описание, вес и другие поля согласно новым требованиям.
+    Если передан image_cache, мертвые и повторяющиеся ссылки на фото убираются.
     """
     rows = []
 
     for key, value in data_dict.items():
+        # Товары, которые при обновлении цен оказались не в наличии, не выгружаем
+        if value.get("stock", "В наличии") != "В наличии":
+            continue
         characteristics = value.get("characteristics", {})
 
         # 1. Формирование нового описания
@@ -91,6 +133,8 @@ def create_df_by_dict(data_dict):
 
         # 3. Обработка ссылок на изображения
         img_urls = value.get("img_url", [])
+        if image_cache is not None:
+            img_urls = image_cache.filter_urls(img_urls)
         img_url1 = img_urls[0] if img_urls else "-"
         img_url2 = ", ".join(img_urls[1:]) if len(img_urls) > 1 else "-"
 
@@ -108,56 +152,95 @@ def create_df_by_dict(data_dict):
         }
         rows.append(row)
 
-    df = pd.DataFrame(rows)
+    df = pd.DataFrame(rows, columns=ROW_COLUMNS)
 
     # Добавляем вычисляемые столбцы
-    df["Артикул"] = df["ArtNumber"].apply(lambda art: f'e_{art}')
-    df['Цена для OZON'] = df['Цена Европы'].apply(transform_price)
-    df['Цена до скидки'] = df['Цена для OZON'].apply(lambda x: int(round(x * 1.3)))
+    df["Артикул"] = 'e_' + df["ArtNumber"].astype(str)
+    apply_price_rules(df)
     df["НДС"] = "Не облагается"
 
     # Задаем итоговый порядок столбцов
-    desired_order = [
-        'Артикул', 'Название', 'Цена для OZON', 'Цена до скидки', 'НДС',
-        'Цена Европы', 'Вес товара', 'Ссылка на главное фото товара',
-        'Ссылки на другие фото товара', 'Описание', 'ArtNumber',
-        'Характеристики', 'art_url'
-    ]
-    final_columns = [col for col in desired_order if col in df.columns]
+    final_columns = [col for col in DESIRED_ORDER if col in df.columns]
     result_df = df[final_columns]
 
     return result_df
 
 
-def create_xls(df_res, file_name):
-    """Сохраняет итоговый DataFrame в Excel-файл с одним листом и форматированием."""
-    with pd.ExcelWriter(file_name, engine='openpyxl') as writer:
-        df_res.to_excel(writer, sheet_name='OZON', index=False)
-        worksheet_ozon = writer.sheets['OZON']
+def iter_df_chunks(products, chunk_size=CHUNK_SIZE, image_cache=None):
+    """Перебирает товары порциями и возвращает по DataFrame на каждую порцию."""
+    products = iter(products)
+    while True:
+        chunk = dict(islice(products, chunk_size))
+        if not chunk:
+            return
+        yield create_df_by_dict(data_dict=chunk, image_cache=image_cache)
+
 
-        # Автоподбор ширины столбцов и форматирование
-        for idx, column in enumerate(df_res.columns):
-            column_width = max(df_res[column].astype(str).map(len).max(), len(column)) + 2
-            col_letter = get_column_letter(idx + 1)
-            worksheet_ozon.column_dimensions[col_letter].width = column_width
+def column_widths(df_sample):
+    """Ширина столбцов по выборке строк, для длинных полей - фиксированная."""
+    widths = {}
+    for column in df_sample.columns:
+        sample_width = df_sample[column].astype(str).map(len).max() if len(df_sample) else 0
+        widths[column] = FIXED_WIDTHS.get(column, max(sample_width, len(column)) + 2)
+    return widths
 
-        # Установка фиксированной ширины для длинных полей
-        worksheet_ozon.column_dimensions['B'].width = 30  # Название
-        worksheet_ozon.column_dimensions[get_column_letter(df_res.columns.get_loc('Описание') + 1)].width = 50
-        worksheet_ozon.column_dimensions[get_column_letter(df_res.columns.get_loc('Характеристики') + 1)].width = 50
-        worksheet_ozon.column_dimensions[
-            get_column_letter(df_res.columns.get_loc('Ссылка на главное фото товара') + 1)].width = 30
-        worksheet_ozon.column_dimensions[
-            get_column_letter(df_res.columns.get_loc('Ссылки на другие фото товара') + 1)].width = 30
-        worksheet_ozon.column_dimensions[get_column_letter(df_res.columns.get_loc('art_url') + 1)].width = 30
 
-        # Закрепление первой строки
-        worksheet_ozon.freeze_panes = 'A2'
+def part_file_name(file_name, part):
+    """Имя файла части выгрузки: первая часть - file_name, затем file_name_2, file_name_3 ..."""
+    if part == 1:
+        return file_name
+    base, ext = os.path.splitext(file_name)
+    return f'{base}_{part}{ext}'
+
+
+def create_xls_streaming(products, file_name, rows_per_file=ROWS_PER_FILE, image_cache=None):
+    """
+    Потоково записывает товары в Excel (openpyxl write-only): лист OZON, первая строка закреплена.
+    Возвращает список созданных файлов.
+    """
+    files = []
+    workbook = worksheet = None
+    widths = None
+    rows_in_file = 0
+
+    def start_file(columns):
+        nonlocal workbook, worksheet, rows_in_file
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet('OZON')
+        for idx, column in enumerate(columns):
+            worksheet.column_dimensions[get_column_letter(idx + 1)].width = widths[column]
+        worksheet.freeze_panes = 'A2'
+        worksheet.append(list(columns))
+        rows_in_file = 0
+
+    def finish_file():
+        file = part_file_name(file_name, len(files) + 1)
+        workbook.save(file)
+        files.append(file)
+
+    for df_chunk in iter_df_chunks(products, image_cache=image_cache):
+        if widths is None:
+            widths = column_widths(df_chunk.head(WIDTH_SAMPLE_ROWS))
+            start_file(df_chunk.columns)
+        for row in df_chunk.itertuples(index=False, name=None):
+            if rows_per_file and rows_in_file >= rows_per_file:
+                finish_file()
+                start_file(df_chunk.columns)
+            worksheet.append(list(row))
+            rows_in_file += 1
+
+    if workbook is not None:
+        finish_file()
+    return files
 
 
 if __name__ == '__main__':
-    data_json = read_json()
-    if data_json:
-        df_result = create_df_by_dict(data_dict=data_json)
-        create_xls(df_result, file_name=RESULT_FILE_NAME)
-        print(f"Файл '{RESULT_FILE_NAME}' успешно создан.")
+    # До первого уплотнения товары могут быть только в журнале дозаписи data.jsonl
+    if not os.path.exists(FILE_NAME_JSON) and not os.path.exists(log_path_for(FILE_NAME_JSON)):
+        print(f"Ошибка: Файл {FILE_NAME_JSON} не найден.")
+    else:
+        images = check_product_images(FILE_NAME_JSON) if CHECK_IMAGES else None
+        created_files = create_xls_streaming(iter_products(FILE_NAME_JSON), file_name=RESULT_FILE_NAME,
+                                             image_cache=images)
+        for created_file in created_files:
+            print(f"Файл '{created_file}' успешно создан.")
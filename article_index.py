@@ -0,0 +1,63 @@
+"""
+Локальный индекс артикул -> ссылка на товар, чтобы ArtsToProductLinks не искал на сайте уже известные товары.
+
+Индекс собирается из результатов step2 (out/catalog_index.json и out/url_list_product.txt) и step3 (out/data.json
+вместе с журналом дозаписи) и сохраняется в out/article_index.json. Если какой-либо из исходных файлов изменился
+позже индекса, индекс пересобирается автоматически.
+
+Пересобрать вручную: python article_index.py
+"""
+import os
+import json
+
+from catalog_index import INDEX_FILE as CATALOG_INDEX_FILE, URL_LIST_FILE
+from product_store import ProductStore, OUTPUT_JSON_FILE, log_path_for, get_article_from_url
+
+ARTICLE_INDEX_FILE = os.path.join("out", "article_index.json")
+
+
+def source_files() -> list[str]:
+    return [URL_LIST_FILE, CATALOG_INDEX_FILE, OUTPUT_JSON_FILE, log_path_for(OUTPUT_JSON_FILE)]
+
+
+def build_article_index() -> dict:
+    """Собирает индекс из всех доступных источников. Более свежие данные step3 перекрывают данные step2."""
+    index = {}
+    if os.path.exists(URL_LIST_FILE):
+        with open(URL_LIST_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) == 3 and parts[2].startswith('http'):
+                    index[parts[0].removeprefix('e_')] = parts[2]
+    if os.path.exists(CATALOG_INDEX_FILE):
+        with open(CATALOG_INDEX_FILE, 'r', encoding='utf-8') as f:
+            for code, entry in json.load(f).items():
+                index[code] = entry['url']
+    if os.path.exists(OUTPUT_JSON_FILE) or os.path.exists(log_path_for(OUTPUT_JSON_FILE)):
+        for article, record in ProductStore(OUTPUT_JSON_FILE).load().items():
+            url = record.get('art_url')
+            if url and get_article_from_url(url) == article:
+                index[article] = url
+    return index
+
+
+def load_article_index() -> dict:
+    """Загружает индекс из файла, пересобирая его, если исходные файлы новее."""
+    if os.path.exists(ARTICLE_INDEX_FILE):
+        index_mtime = os.path.getmtime(ARTICLE_INDEX_FILE)
+        if all(not os.path.exists(path) or os.path.getmtime(path) <= index_mtime for path in source_files()):
+            with open(ARTICLE_INDEX_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    index = build_article_index()
+    os.makedirs(os.path.dirname(ARTICLE_INDEX_FILE), exist_ok=True)
+    tmp_path = ARTICLE_INDEX_FILE + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_path, ARTICLE_INDEX_FILE)
+    return index
+
+
+if __name__ == '__main__':
+    if os.path.exists(ARTICLE_INDEX_FILE):
+        os.remove(ARTICLE_INDEX_FILE)
+    print(f"Артикулов в индексе: {len(load_article_index())} ({ARTICLE_INDEX_FILE})")
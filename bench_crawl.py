@@ -0,0 +1,142 @@
+"""
+Замер скорости step2, step3 и ArtsToProductLinks без обращения к сайту: скрипты запускаются как есть (отдельным
+процессом, headless Chromium) против локальной имитации сайта fake_europa_server.py.
+
+Каждый скрипт работает в своей временной папке со своими in/ и out/: входные файлы (каталоги, ссылки на товары,
+артикулы) и сохраненная сессия магазина создаются заранее, поэтому установка города не выполняется. Уведомления
+в Telegram отключаются (EUROPA_TELEGRAM=0). Частота запросов задается постоянной --rate-limit (EUROPA_RATE_LIMIT,
+по умолчанию BENCH_RATE_LIMIT запросов в минуту), чтобы замерялись сами скрипты, а не пауза ограничителя частоты;
+для замера вместе с ограничителем - --rate-limit 0 (частота из настроек скриптов). С --capture скрипты берут данные из ответов API имитации
+(EUROPA_NETWORK_CAPTURE=1, см. network_capture.py).
+
+Результат по каждому скрипту: время работы, обработано ссылок (по замерам out/metrics, см. crawl_metrics.py),
+ссылок в минуту и запросы к серверу по типам страниц.
+
+Запуск: python bench_crawl.py [--scripts step2 step3 arts] [--products 60] [--latency 50 300] [--ddos 0.02] [--capture]
+                              [--rate-limit 6000]
+"""
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+
+from city_session import session_state_path
+from fake_europa_server import FakeEuropa, start_server
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SHOP_INDEX = '241001'
+SCRIPTS = {
+    'step2': 'step2_europe_get_arts.py',
+    'step3': 'step3_europe_get_data.py',
+    'arts': 'ArtsToProductLinks.py',
+}
+# Префикс файла замеров в out/metrics для каждого скрипта
+METRICS_NAMES = {'step2': 'step2', 'step3': 'step3', 'arts': 'arts_to_links'}
+SCRIPT_TIMEOUT_SECONDS = 3600
+# Запросов в минуту на скрипт: заведомо выше, чем успевает имитация сайта
+BENCH_RATE_LIMIT = 6000
+
+
+def write_lines(path: str, lines: list[str]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def prepare_workdir(workdir: str, fake: FakeEuropa, base_url: str):
+    """Входные файлы всех скриптов и сессия магазина с cookie для локального сервера"""
+    codes = fake.product_codes()
+    write_lines(os.path.join(workdir, 'in', 'catalogs.txt'), fake.catalog_urls(base_url))
+    write_lines(os.path.join(workdir, 'in', 'product_links_for_get_data.txt'),
+                [f'{base_url}/product/tovar-{code}' for code in codes])
+    write_lines(os.path.join(workdir, 'in', 'arts_for_get_product_links.txt'), [str(code) for code in codes])
+    state_path = os.path.join(workdir, session_state_path(SHOP_INDEX))
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    host = base_url.split('://', 1)[1].split(':', 1)[0]
+    state = {'cookies': [{'name': 'shop', 'value': SHOP_INDEX, 'domain': host, 'path': '/', 'expires': -1,
+                          'httpOnly': False, 'secure': False, 'sameSite': 'Lax'}], 'origins': []}
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+
+def count_metrics(workdir: str, name: str) -> int:
+    paths = glob.glob(os.path.join(workdir, 'out', 'metrics', f'{name}_*.jsonl'))
+    total = 0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            total += sum(1 for line in f if line.strip())
+    return total
+
+
+def run_script(key: str, fake: FakeEuropa, base_url: str, keep: bool, capture: bool = False,
+               rate_limit: float = BENCH_RATE_LIMIT) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f'bench_{key}_')
+    prepare_workdir(workdir, fake, base_url)
+    env = dict(os.environ, EUROPA_BASE_URL=base_url, EUROPA_HEADLESS='1', EUROPA_TELEGRAM='0',
+               EUROPA_NETWORK_CAPTURE='1' if capture else '0', EUROPA_RATE_LIMIT=str(rate_limit or ''),
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+    hits_before = Counter(fake.hits)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.join(REPO_DIR, SCRIPTS[key])], cwd=workdir, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                            timeout=SCRIPT_TIMEOUT_SECONDS)
+    elapsed = time.perf_counter() - started
+    urls = count_metrics(workdir, METRICS_NAMES[key])
+    hits = Counter(fake.hits)
+    hits.subtract(hits_before)
+    if result.returncode != 0 or not urls:
+        print(result.stdout[-3000:])
+    if keep:
+        print(f'Рабочая папка {key}: {workdir}')
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {'script': key, 'returncode': result.returncode, 'seconds': elapsed, 'urls': urls,
+            'urls_per_minute': urls / elapsed * 60 if elapsed else 0.0, 'hits': {k: v for k, v in hits.items() if v}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер скорости скриптов на локальной имитации сайта')
+    parser.add_argument('--scripts', nargs='+', choices=list(SCRIPTS), default=list(SCRIPTS))
+    parser.add_argument('--catalogs', type=int, default=3)
+    parser.add_argument('--products', type=int, default=60, help='товаров в каталоге')
+    parser.add_argument('--latency', type=int, nargs=2, default=(50, 300), metavar=('MIN_MS', 'MAX_MS'))
+    parser.add_argument('--errors', type=float, default=0.0, help='доля ответов 500')
+    parser.add_argument('--ddos', type=float, default=0.0, help='доля ответов DDoS-Guard')
+    parser.add_argument('--keep', action='store_true', help='не удалять рабочие папки скриптов')
+    parser.add_argument('--capture', action='store_true', help='данные из ответов API (network_capture.py)')
+    parser.add_argument('--rate-limit', type=float, default=BENCH_RATE_LIMIT,
+                        help='постоянная частота запросов в минуту, 0 - частота из настроек скриптов')
+    args = parser.parse_args()
+
+    fake = FakeEuropa(catalogs=args.catalogs, products_per_catalog=args.products, latency_ms=tuple(args.latency),
+                      error_rate=args.errors, ddos_rate=args.ddos)
+    server = start_server(fake, port=0)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    print(f'Имитация сайта: {base_url}, каталогов: {args.catalogs}, товаров в каталоге: {args.products}, '
+          f'задержка {args.latency[0]}-{args.latency[1]} мс, ошибки {args.errors:.0%}, DDoS {args.ddos:.0%}, '
+          f'частота запросов: {args.rate_limit or "из настроек скриптов"}')
+    results = []
+    try:
+        for key in args.scripts:
+            print(f'--- {SCRIPTS[key]} ---')
+            result = run_script(key, fake, base_url, args.keep, args.capture, args.rate_limit)
+            results.append(result)
+            print(f"код {result['returncode']}, {result['seconds']:.1f} с, ссылок: {result['urls']}, "
+                  f"{result['urls_per_minute']:.1f} ссылок/мин, запросы: {result['hits']}")
+    finally:
+        server.shutdown()
+
+    print('\nИтог:')
+    for result in results:
+        print(f"{result['script']:>6}: {result['urls_per_minute']:8.1f} ссылок/мин ({result['urls']} за "
+              f"{result['seconds']:.1f} с)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Сравнение скорости извлечения данных товара: прежний способ через локаторы Playwright (десятки запросов к браузеру
+на товар) и один вызов page.evaluate(EXTRACT_PRODUCT_JS) из product_extract.py.
+
+Скрипт открывает первые BENCH_URLS ссылок из in/product_links_for_get_data.txt с сохраненной сессией магазина,
+на каждой загруженной странице извлекает данные обоими способами, проверяет, что результаты совпадают,
+и выводит среднее и медианное время извлечения.
+"""
+import time
+import statistics
+from playwright.sync_api import sync_playwright, Page, TimeoutError
+from colorama import init, Fore
+
+from step3_europe_get_data import (INPUT_URL_FILE, HEADLESS_MODE, read_urls_from_file, get_article_from_url,
+                                   new_city_context)
+from product_extract import EXTRACT_PRODUCT_JS, build_product_record
+
+BENCH_URLS = 30
+REPEATS = 3
+
+
+def extract_with_locators(page: Page, product_url: str) -> dict:
+    """Извлечение через локаторы, как в parse_product_page до перехода на EXTRACT_PRODUCT_JS."""
+    cart_block = page.locator('.product-cart')
+    price_int_loc = cart_block.locator('.product-cart__price-int')
+    price_frac_loc = cart_block.locator('.product-cart__price-frac span').first
+    price_int = price_int_loc.text_content() if price_int_loc.count() > 0 else '0'
+    price_frac = price_frac_loc.text_content() if price_frac_loc.count() > 0 else '00'
+    price = float(f"{price_int}.{price_frac}")
+
+    name_loc = page.locator('.product-title__name')
+    name = name_loc.text_content().strip() if name_loc.count() > 0 else '-'
+
+    description = '-'
+    characteristics_dict = {}
+    for item in page.locator('.product-info__nutrition-item').all():
+        key = item.locator('.product-info__nutrition-name').text_content().strip()
+        value = item.locator('.product-info__nutrition-value').text_content().strip()
+        characteristics_dict[key] = value
+
+    params_container = page.locator('.product-info__params')
+    if params_container.count() > 0:
+        for block in params_container.locator('> div').all():
+            block_class = block.get_attribute('class') or ''
+            if 'product-info__params-block--columns' in block_class:
+                for inner_item in block.locator('.product-info__params-item').all():
+                    key_loc = inner_item.locator('.product-info__params-name')
+                    value_loc = inner_item.locator('.product-info__params-value')
+                    if key_loc.count() > 0 and value_loc.count() > 0:
+                        characteristics_dict[key_loc.text_content().strip()] = value_loc.text_content().strip()
+            else:
+                key_loc = block.locator('.product-info__params-name')
+                value_loc = block.locator('.product-info__params-value')
+                if key_loc.count() > 0 and value_loc.count() > 0:
+                    key = key_loc.text_content().strip()
+                    value = value_loc.text_content().strip()
+                    if 'описание' in key.lower():
+                        description = value
+                    else:
+                        characteristics_dict[key] = value
+
+    image_locators = page.locator('.product-image__image-slider img').all()
+    image_links = [loc.get_attribute('src').split('?')[0] for loc in image_locators if loc.get_attribute('src')]
+
+    return {
+        'name': name, 'price': price, 'stock': "В наличии", 'description': description,
+        'characteristics': characteristics_dict, 'img_url': image_links, 'art_url': product_url
+    }
+
+
+def extract_with_evaluate(page: Page, product_url: str) -> dict:
+    return build_product_record(page.evaluate(EXTRACT_PRODUCT_JS), product_url)
+
+
+def timed(func, page: Page, url: str) -> tuple[float, dict]:
+    """Возвращает лучшее время из REPEATS запусков (в мс) и результат извлечения."""
+    best, result = None, None
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        result = func(page, url)
+        elapsed = (time.perf_counter() - t0) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    init(autoreset=True)
+    urls = [url for url in read_urls_from_file(INPUT_URL_FILE) if get_article_from_url(url)][:BENCH_URLS]
+    locator_times, evaluate_times, mismatches = [], [], []
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=HEADLESS_MODE)
+        context, page = new_city_context(browser)
+        for url in urls:
+            page.goto(url, wait_until="domcontentloaded")
+            try:
+                page.locator('.product-cart').wait_for(timeout=7000)
+            except TimeoutError:
+                print(Fore.YELLOW + f"Пропуск (нет блока цены): {url}")
+                continue
+            locator_ms, locator_result = timed(extract_with_locators, page, url)
+            evaluate_ms, evaluate_result = timed(extract_with_evaluate, page, url)
+            locator_times.append(locator_ms)
+            evaluate_times.append(evaluate_ms)
+            if locator_result != evaluate_result:
+                mismatches.append(url)
+            print(f"{get_article_from_url(url)}: локаторы {locator_ms:.1f} мс, evaluate {evaluate_ms:.1f} мс")
+        browser.close()
+
+    if not locator_times:
+        print(Fore.RED + "Нет ни одной страницы с ценой для сравнения.")
+        return
+    print("-" * 50)
+    print(f"Страниц: {len(locator_times)}, повторов на страницу: {REPEATS}")
+    print(f"Локаторы: среднее {statistics.mean(locator_times):.1f} мс, "
+          f"медиана {statistics.median(locator_times):.1f} мс")
+    print(f"Evaluate: среднее {statistics.mean(evaluate_times):.1f} мс, "
+          f"медиана {statistics.median(evaluate_times):.1f} мс")
+    print(f"Ускорение: x{statistics.mean(locator_times) / statistics.mean(evaluate_times):.1f}")
+    if mismatches:
+        print(Fore.RED + f"Результаты различаются на {len(mismatches)} страницах: {mismatches}")
+    else:
+        print(Fore.GREEN + "Результаты обоих способов совпадают на всех страницах.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Сравнение скорости расчета цен в JsonToXLS: прежний построчный расчет (transform_price через df.apply и лямбды)
+и табличный векторный apply_price_rules на BENCH_ROWS строках. Проверяет, что результаты совпадают.
+"""
+import time
+import random
+import pandas as pd
+
+from JsonToXLS import apply_price_rules
+
+BENCH_ROWS = 100_000
+REPEATS = 3
+
+
+def transform_price(x):
+    """Трансформирует цену по заданным правилам (прежний построчный вариант)."""
+    if not isinstance(x, (int, float)):
+        return 0  # Возвращаем 0 или другое значение по умолчанию, если цена некорректна
+
+    match x:
+        case _ if x < 100:
+            result = x * 7
+        case _ if x < 250:
+            result = x * 6
+        case _ if x < 500:
+            result = x * 5
+        case _ if x < 750:
+            result = x * 4.5
+        case _ if x < 1000:
+            result = x * 4
+        case _ if x < 1500:
+            result = x * 3.5
+        case _ if x < 2000:
+            result = x * 3
+        case _ if x < 3000:
+            result = x * 2.5
+        case _ if x < 4000:
+            result = x * 2
+        case _:
+            result = x * 1.5
+
+    result = max(result, 590)
+    return round(result)
+
+
+def apply_path(df):
+    df["Артикул"] = df["ArtNumber"].apply(lambda art: f'e_{art}')
+    df['Цена для OZON'] = df['Цена Европы'].apply(transform_price)
+    df['Цена до скидки'] = df['Цена для OZON'].apply(lambda x: int(round(x * 1.3)))
+    return df
+
+
+def vectorized_path(df):
+    df["Артикул"] = 'e_' + df["ArtNumber"].astype(str)
+    return apply_price_rules(df)
+
+
+def make_df(rows):
+    """Цены как в data.json: целые, дробные, точно на границах диапазонов и немного некорректных."""
+    random.seed(1)
+    bounds = [100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000]
+    prices = []
+    for _ in range(rows):
+        kind = random.random()
+        if kind < 0.05:
+            prices.append(random.choice(bounds))
+        elif kind < 0.06:
+            prices.append('-')
+        elif kind < 0.5:
+            prices.append(random.randint(1, 8000))
+        else:
+            prices.append(round(random.uniform(1, 8000), 2))
+    return pd.DataFrame({'ArtNumber': [str(100000 + i) for i in range(rows)], 'Цена Европы': prices})
+
+
+def best_time(func, df):
+    best, result = None, None
+    for _ in range(REPEATS):
+        df_copy = df.copy()
+        t0 = time.perf_counter()
+        result = func(df_copy)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    df = make_df(BENCH_ROWS)
+    apply_time, apply_result = best_time(apply_path, df)
+    vector_time, vector_result = best_time(vectorized_path, df)
+    columns = ['Артикул', 'Цена для OZON', 'Цена до скидки']
+    same = all((apply_result[column].astype(str) == vector_result[column].astype(str)).all() for column in columns)
+    print(f"Строк: {BENCH_ROWS}, лучшее из {REPEATS} запусков")
+    print(f"apply:      {apply_time * 1000:.1f} мс")
+    print(f"векторный:  {vector_time * 1000:.1f} мс")
+    print(f"Ускорение: x{apply_time / vector_time:.1f}")
+    print("Результаты совпадают" if same else "ОШИБКА: результаты различаются")
+
+
+if __name__ == '__main__':
+    main()
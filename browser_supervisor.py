@@ -0,0 +1,156 @@
+"""
+Наблюдение за состоянием браузера step3: перезапуск только тогда, когда он действительно "устал", вместо
+перезапуска каждые N ссылок, и короткие растущие паузы после падений вместо фиксированных 5 минут.
+
+Каждые CHECK_EVERY_N_URLS ссылок через CDP (Performance.getMetrics) снимаются метрики рендерера страницы:
+занятая JS-куча и число DOM-узлов. Браузер (в параллельном режиме - страница воркера) перезапускается, если:
+- куча больше MAX_JS_HEAP_MB или узлов больше MAX_DOM_NODES (утечки памяти);
+- медиана задержки последних LATENCY_WINDOW страниц выросла в LATENCY_DRIFT_RATIO раз (и не меньше чем на
+  LATENCY_DRIFT_MIN_SECONDS) относительно медианы первых LATENCY_WINDOW страниц после запуска;
+- обработано MAX_URLS_PER_BROWSER ссылок (страховка, если метрики недоступны).
+
+После падения страницы пауза перед перезапуском берется из CRASH_WAITS_SECONDS по числу падений подряд;
+успешная загрузка сбрасывает счетчик.
+
+Использование:
+    supervisor.attach(page)                       # после запуска браузера / открытия страницы
+    supervisor.record_url(latency)                # после каждой ссылки (latency=None - неудача)
+    reason = supervisor.recycle_reason()          # перед следующей ссылкой; не None - пора перезапустить
+    wait = supervisor.record_crash()              # при падении: сколько ждать перед перезапуском
+Для асинхронного API Playwright - attach_async и recycle_reason_async.
+"""
+import statistics
+from collections import Counter, deque
+
+CHECK_EVERY_N_URLS = 10
+MAX_JS_HEAP_MB = 400
+MAX_DOM_NODES = 150000
+LATENCY_WINDOW = 10
+LATENCY_DRIFT_RATIO = 2.0
+LATENCY_DRIFT_MIN_SECONDS = 2.0
+MAX_URLS_PER_BROWSER = 1000
+CRASH_WAITS_SECONDS = (5, 15, 45, 120, 300)
+
+RECYCLE_MEMORY = 'memory'
+RECYCLE_DOM = 'dom_nodes'
+RECYCLE_LATENCY = 'latency'
+RECYCLE_MAX_URLS = 'max_urls'
+
+
+class BrowserSupervisor:
+    def __init__(self):
+        self.recycles = Counter()
+        self.crashes = 0
+        self.consecutive_crashes = 0
+        self.max_heap_mb = 0.0
+        self._cdp = None
+        self._reset()
+
+    def _reset(self):
+        self.urls = 0
+        self.baseline = []
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+        self.last_metrics = {}
+
+    def attach(self, page):
+        """Начинает наблюдение за новой страницей (синхронный Playwright)"""
+        self._reset()
+        try:
+            self._cdp = page.context.new_cdp_session(page)
+            self._cdp.send('Performance.enable')
+        except Exception as e:
+            print(f'Метрики браузера недоступны: {e}')
+            self._cdp = None
+
+    async def attach_async(self, page):
+        """attach для асинхронного Playwright"""
+        self._reset()
+        try:
+            self._cdp = await page.context.new_cdp_session(page)
+            await self._cdp.send('Performance.enable')
+        except Exception as e:
+            print(f'Метрики браузера недоступны: {e}')
+            self._cdp = None
+
+    def record_url(self, latency: float | None):
+        """Отмечает обработанную ссылку и задержку ее загрузки (None - загрузка не удалась)"""
+        self.urls += 1
+        if latency is None:
+            return
+        self.consecutive_crashes = 0
+        if len(self.baseline) < LATENCY_WINDOW:
+            self.baseline.append(latency)
+        else:
+            self.recent.append(latency)
+
+    def _check_due(self) -> bool:
+        return self._cdp is not None and self.urls > 0 and self.urls % CHECK_EVERY_N_URLS == 0
+
+    def recycle_reason(self) -> str | None:
+        """Причина перезапуска браузера или None (синхронный Playwright)"""
+        metrics = None
+        if self._check_due():
+            try:
+                metrics = self._cdp.send('Performance.getMetrics')
+            except Exception:
+                self._cdp = None
+        return self._evaluate(metrics)
+
+    async def recycle_reason_async(self) -> str | None:
+        metrics = None
+        if self._check_due():
+            try:
+                metrics = await self._cdp.send('Performance.getMetrics')
+            except Exception:
+                self._cdp = None
+        return self._evaluate(metrics)
+
+    def _evaluate(self, metrics: dict | None) -> str | None:
+        if metrics is not None:
+            self.last_metrics = {item['name']: item['value'] for item in metrics.get('metrics', [])}
+            heap_mb = self.last_metrics.get('JSHeapUsedSize', 0) / 1024 / 1024
+            self.max_heap_mb = max(self.max_heap_mb, heap_mb)
+            if heap_mb > MAX_JS_HEAP_MB:
+                return RECYCLE_MEMORY
+            if self.last_metrics.get('Nodes', 0) > MAX_DOM_NODES:
+                return RECYCLE_DOM
+        if len(self.recent) == LATENCY_WINDOW:
+            baseline = statistics.median(self.baseline)
+            recent = statistics.median(self.recent)
+            if recent > baseline * LATENCY_DRIFT_RATIO and recent - baseline > LATENCY_DRIFT_MIN_SECONDS:
+                return RECYCLE_LATENCY
+        if self.urls >= MAX_URLS_PER_BROWSER:
+            return RECYCLE_MAX_URLS
+        return None
+
+    def describe(self, reason: str) -> str:
+        """Пояснение к причине перезапуска для лога"""
+        if reason in (RECYCLE_MEMORY, RECYCLE_DOM):
+            return (f"JS-куча {self.last_metrics.get('JSHeapUsedSize', 0) / 1024 / 1024:.0f} МБ, "
+                    f"DOM-узлов {self.last_metrics.get('Nodes', 0):.0f}")
+        if reason == RECYCLE_LATENCY:
+            return (f"медиана задержки {statistics.median(self.recent):.1f} с против "
+                    f"{statistics.median(self.baseline):.1f} с после запуска")
+        return f"обработано {self.urls} ссылок"
+
+    def record_recycle(self, reason: str):
+        self.recycles[reason] += 1
+
+    def record_crash(self) -> float:
+        """Отмечает падение и возвращает паузу перед перезапуском (растет с числом падений подряд)"""
+        self.crashes += 1
+        self.consecutive_crashes += 1
+        return CRASH_WAITS_SECONDS[min(self.consecutive_crashes, len(CRASH_WAITS_SECONDS)) - 1]
+
+    def summary(self) -> str:
+        return summarize_supervisors([self])
+
+
+def summarize_supervisors(supervisors: list[BrowserSupervisor]) -> str:
+    """Сводка по перезапускам и падениям (для параллельного режима - по всем воркерам)"""
+    recycles = sum((supervisor.recycles for supervisor in supervisors), Counter())
+    crashes = sum(supervisor.crashes for supervisor in supervisors)
+    max_heap_mb = max((supervisor.max_heap_mb for supervisor in supervisors), default=0.0)
+    details = ', '.join(f'{reason}: {count}' for reason, count in sorted(recycles.items()))
+    return (f"перезапусков {sum(recycles.values())}{f' ({details})' if details else ''}, падений {crashes}, "
+            f"макс. JS-куча {max_heap_mb:.0f} МБ")
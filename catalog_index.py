@@ -0,0 +1,86 @@
+"""
+Индекс товаров из каталогов (step2): артикул -> код, название, ссылка и каталоги, в которых встретился товар.
+Товар, встречающийся в нескольких каталогах или на нескольких запусках, хранится один раз.
+
+После обхода индекс сравнивается с индексом предыдущего обхода (out/catalog_index.json):
+- новые товары - их ссылки записываются в out/new_product_urls.txt, это вход для step3;
+- удаленные - товары, пропавшие из каталогов, которые в этот раз были обойдены;
+- переименованные - товары, у которых изменилось название.
+Разница сохраняется в out/catalog_diff.json. Товары из каталогов, которые в этот раз не обходились, остаются в индексе.
+"""
+import os
+import json
+import datetime
+
+INDEX_FILE = os.path.join("out", "catalog_index.json")
+DIFF_FILE = os.path.join("out", "catalog_diff.json")
+NEW_URLS_FILE = os.path.join("out", "new_product_urls.txt")
+URL_LIST_FILE = os.path.join("out", "url_list_product.txt")
+
+
+class CatalogIndex:
+    def __init__(self, entries: dict | None = None):
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, path: str = INDEX_FILE) -> 'CatalogIndex':
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def save(self, path: str = INDEX_FILE):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def add(self, code: str, name: str, url: str, catalog: str):
+        entry = self.entries.setdefault(code, {'code': code, 'name': name, 'url': url, 'catalogs': []})
+        entry['name'] = name
+        entry['url'] = url
+        if catalog not in entry['catalogs']:
+            entry['catalogs'].append(catalog)
+
+    def merge_previous(self, previous: 'CatalogIndex', crawled_catalogs: set[str]) -> dict:
+        """
+        Сравнивает индекс с предыдущим обходом и переносит из него товары каталогов, которые в этот раз
+        не обходились. Возвращает разницу: новые, удаленные и переименованные товары.
+        """
+        new = [entry for code, entry in self.entries.items() if code not in previous.entries]
+        renamed = [{'code': code, 'old_name': old['name'], 'new_name': self.entries[code]['name'],
+                    'url': self.entries[code]['url']}
+                   for code, old in previous.entries.items()
+                   if code in self.entries and old['name'] != self.entries[code]['name']]
+        removed = []
+        for code, old in previous.entries.items():
+            not_crawled = [catalog for catalog in old['catalogs'] if catalog not in crawled_catalogs]
+            if code in self.entries:
+                for catalog in not_crawled:
+                    if catalog not in self.entries[code]['catalogs']:
+                        self.entries[code]['catalogs'].append(catalog)
+            elif not_crawled:
+                self.entries[code] = dict(old, catalogs=not_crawled)
+            else:
+                removed.append(old)
+        return {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'new': new, 'removed': removed, 'renamed': renamed}
+
+    def write_url_list(self, path: str = URL_LIST_FILE):
+        """Список всех товаров в прежнем формате out/url_list_product.txt: e_код, название и ссылка через табуляцию"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(f"e_{entry['code']}\t{entry['name']}\t{entry['url']}\n")
+
+
+def save_crawl_results(index: CatalogIndex, crawled_catalogs: set[str]) -> dict:
+    """Сравнивает индекс с предыдущим обходом, сохраняет разницу, ссылки на новые товары и сам индекс."""
+    os.makedirs(os.path.dirname(DIFF_FILE), exist_ok=True)
+    diff = index.merge_previous(CatalogIndex.load(), crawled_catalogs)
+    with open(DIFF_FILE, 'w', encoding='utf-8') as f:
+        json.dump(diff, f, indent=2, ensure_ascii=False)
+    with open(NEW_URLS_FILE, 'w', encoding='utf-8') as f:
+        f.write(''.join(f"{entry['url']}\n" for entry in diff['new']))
+    index.write_url_list()
+    index.save()
+    return diff
@@ -0,0 +1,106 @@
+"""
+Сохранение сессии выбранного города/магазина (cookies и localStorage) в файл storage state Playwright.
+
+После успешного set_city состояние контекста сохраняется в out/session/shop_<индекс магазина>.json. Новые контексты
+браузера создаются уже с этим состоянием, и set_city повторно выполняется, только если сохраненная сессия устарела:
+файл старше SESSION_MAX_AGE_HOURS или истек срок действия cookies, в которых хранятся город и магазин
+(SHOP_COOKIE_RE или индекс магазина в значении). Короткоживущие cookies аналитики сессию не сбрасывают.
+
+Выбор города и магазина на сайте - одна последовательность шагов CITY_STEPS для sync (set_city, step3) и async
+(set_city_async, step2 и ArtsToProductLinks) API Playwright.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+
+SESSION_DIR = os.path.join("out", "session")
+SESSION_MAX_AGE_HOURS = 24
+# Cookies с выбранным городом/магазином и сессией сайта (по имени)
+SHOP_COOKIE_RE = re.compile(r'city|shop|store|region|address|session|sess', re.IGNORECASE)
+CITY_NAME = "Брянск"
+
+# Шаги выбора города и магазина: (локатор на странице, шаг необязателен, пауза после шага в секундах).
+# Локаторы создаются одинаково в sync и async API, отличается только ожидание действий.
+CITY_STEPS = (
+    (lambda page, shop_index: page.get_by_role("button", name="Нет, выбрать другой"), False, 2),
+    (lambda page, shop_index: page.get_by_text(CITY_NAME), False, 2),
+    (lambda page, shop_index: page.get_by_role("button", name="Выбрать"), True, 3),
+    (lambda page, shop_index: page.locator(".user-address--default"), False, 2),
+    (lambda page, shop_index: page.get_by_role("button", name="Самовывоз"), False, 2),
+    (lambda page, shop_index: page.locator("div").filter(
+        has_text=re.compile(r"^Нажмите, чтобы выбрать адрес$")).nth(1), False, 2),
+    (lambda page, shop_index: page.get_by_text(shop_index), False, 2),
+    (lambda page, shop_index: page.get_by_role("button", name="Применить"), False, 5),
+)
+
+
+def session_state_path(shop_index: str) -> str:
+    return os.path.join(SESSION_DIR, f"shop_{shop_index}.json")
+
+
+def load_session_state(shop_index: str) -> str | None:
+    """Возвращает путь к сохраненной сессии магазина, если она есть и еще не устарела, иначе None."""
+    path = session_state_path(shop_index)
+    if not os.path.exists(path):
+        return None
+    if time.time() - os.path.getmtime(path) > SESSION_MAX_AGE_HOURS * 3600:
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return None
+    now = time.time()
+    # expires == -1 у сессионных cookies, такие не устаревают до закрытия браузера
+    if any(0 < cookie.get('expires', -1) < now for cookie in state.get('cookies', [])
+           if SHOP_COOKIE_RE.search(cookie.get('name', '')) or shop_index in str(cookie.get('value', ''))):
+        return None
+    return path
+
+
+def save_session_state(context, shop_index: str) -> str:
+    """Сохраняет cookies и localStorage контекста (sync API Playwright) после установки города."""
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    path = session_state_path(shop_index)
+    context.storage_state(path=path)
+    return path
+
+
+async def save_session_state_async(context, shop_index: str) -> str:
+    """То же, что save_session_state, для async API Playwright."""
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    path = session_state_path(shop_index)
+    await context.storage_state(path=path)
+    return path
+
+
+def set_city(page, base_url: str, shop_index: str):
+    """Выбирает город CITY_NAME и магазин самовывоза shop_index на странице page (sync API Playwright).
+    При ошибке - исключение."""
+    page.goto(f"{base_url}/", timeout=60000)
+    for locate, optional, pause in CITY_STEPS:
+        locator = locate(page, shop_index)
+        if optional and not locator.is_visible():
+            continue
+        locator.click()
+        time.sleep(pause)
+
+
+async def set_city_async(page, base_url: str, shop_index: str):
+    """То же, что set_city, для async API Playwright."""
+    await page.goto(f"{base_url}/", timeout=60000)
+    for locate, optional, pause in CITY_STEPS:
+        locator = locate(page, shop_index)
+        if optional and not await locator.is_visible():
+            continue
+        await locator.click()
+        await asyncio.sleep(pause)
+
+
+def invalidate_session_state(shop_index: str):
+    """Удаляет сохраненную сессию, чтобы при следующем запуске город был установлен заново."""
+    path = session_state_path(shop_index)
+    if os.path.exists(path):
+        os.remove(path)
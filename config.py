@@ -1,4 +1,4 @@
-import requests
+import os
 
 
 class bcolors:
@@ -16,20 +16,31 @@ class bcolors:
 BOT_TOKEN = '645695861:AAEhKxpvbWxeDoq7IPf7fQo0sxbQ_LqSVz0'
 CHAT_ID = '128592002'
 
+# Адрес сайта. Для замеров без обращения к живому сайту - адрес fake_europa_server.py (см. bench_crawl.py)
+BASE_URL = os.environ.get('EUROPA_BASE_URL', 'https://europa-market.ru').rstrip('/')
+# Запуск браузера без окна: EUROPA_HEADLESS=1
+HEADLESS = os.environ.get('EUROPA_HEADLESS') == '1'
+# Отключить уведомления в Telegram: EUROPA_TELEGRAM=0
+TELEGRAM_ENABLED = os.environ.get('EUROPA_TELEGRAM', '1') != '0'
+# Данные товаров и каталогов из ответов API сайта, а не со страницы (см. network_capture.py): EUROPA_NETWORK_CAPTURE=1
+NETWORK_CAPTURE = os.environ.get('EUROPA_NETWORK_CAPTURE') == '1'
+# Частота запросов в минуту для step2, step3 и ArtsToProductLinks вместо их REQUESTS_PER_MINUTE:
+# EUROPA_RATE_LIMIT=600 - постоянная, EUROPA_RATE_LIMIT=8,2,30 - начальная, минимальная, максимальная.
+# bench_crawl.py задает большую постоянную частоту, чтобы замер не упирался в ограничитель (см. rate_limiter.py)
+RATE_LIMIT = tuple(float(value) for value in os.environ['EUROPA_RATE_LIMIT'].split(',')) \
+    if os.environ.get('EUROPA_RATE_LIMIT') else None
+if RATE_LIMIT is not None and len(RATE_LIMIT) == 1:
+    RATE_LIMIT = RATE_LIMIT * 3
+# Адрес Bot API; для проверки уведомлений - локальная заглушка, например fake_europa_server.py
+TELEGRAM_API_URL = os.environ.get('EUROPA_TELEGRAM_API', 'https://api.telegram.org').rstrip('/')
 
-def send_logs_to_telegram(message):
-    import platform
-    import socket
-    import os
 
-    platform = platform.system()
-    hostname = socket.gethostname()
-    user = os.getlogin()
+def send_logs_to_telegram(message):
+    """Ставит сообщение в очередь фоновой отправки в Telegram (см. notifier.py) и сразу возвращает управление."""
+    if not TELEGRAM_ENABLED:
+        return
+    from notifier import get_notifier
 
     bot_token = '6456958617:AAF8thQveHkyLLtWtD02Rq1UqYuhfT4LoTc'
     chat_id = '128592002'
-
-    url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
-    data = {"chat_id": chat_id, "text": message + f'\n\n{platform}\n{hostname}\n{user}'}
-    response = requests.post(url, data=data)
-    return response.json()
+    get_notifier(bot_token, chat_id, TELEGRAM_API_URL).notify(message)
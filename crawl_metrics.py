@@ -0,0 +1,126 @@
+"""
+Замеры времени обхода по каждой ссылке: сколько ушло на загрузку страницы (navigation), определение ее состояния
+(classification), извлечение данных (extraction), сохранение (persistence) и паузы ограничителя частоты (sleep).
+
+Каждая обработанная ссылка дописывается строкой JSON в out/metrics/<скрипт>_<время запуска>.jsonl:
+{"url": ..., "outcome": "ok", "attempts": 1, "ddos": 0, "navigation": 1.23, ..., "total": 3.4}
+
+В конце запуска report() дает p50/p95/p99 по каждой фазе, число страниц в минуту и долю загрузок с DDoS-Guard.
+
+Использование:
+    timer = metrics.start(url)
+    with timer.phase('navigation'):
+        page.goto(url)
+    timer.finish('ok')
+"""
+import os
+import json
+import math
+import time
+import datetime
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+METRICS_DIR = os.path.join("out", "metrics")
+PHASES = ('navigation', 'classification', 'extraction', 'persistence', 'sleep')
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class UrlTimer:
+    """Время фаз обработки одной ссылки. Без metrics ничего не записывает (удобно как заглушка)."""
+
+    def __init__(self, metrics: 'CrawlMetrics | None' = None, url: str = ''):
+        self.metrics = metrics
+        self.url = url
+        self.started = time.perf_counter()
+        self.phases = Counter()
+        self.attempts = 0
+        self.ddos = 0
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - started
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] += seconds
+
+    def attempt(self):
+        """Отмечает очередную загрузку страницы (для доли DDoS-Guard)"""
+        self.attempts += 1
+
+    def mark_ddos(self):
+        self.ddos += 1
+
+    def finish(self, outcome: str):
+        if self.metrics is not None:
+            self.metrics.record(self, outcome)
+
+
+class CrawlMetrics:
+    """Сбор замеров одного запуска скрипта. Запись в файл потокобезопасна."""
+
+    def __init__(self, script_name: str, metrics_dir: str = METRICS_DIR):
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.path = os.path.join(metrics_dir, f"{script_name}_{timestamp}.jsonl")
+        self.started = time.perf_counter()
+        self.samples = {phase: [] for phase in PHASES + ('total',)}
+        self.outcomes = Counter()
+        self.attempts = 0
+        self.ddos = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def start(self, url: str) -> UrlTimer:
+        return UrlTimer(self, url)
+
+    def record(self, timer: UrlTimer, outcome: str):
+        total = time.perf_counter() - timer.started
+        entry = {'url': timer.url, 'outcome': outcome, 'attempts': timer.attempts, 'ddos': timer.ddos}
+        entry.update({phase: round(timer.phases[phase], 3) for phase in PHASES})
+        entry['total'] = round(total, 3)
+        with self._lock:
+            for phase in PHASES:
+                self.samples[phase].append(timer.phases[phase])
+            self.samples['total'].append(total)
+            self.outcomes[outcome] += 1
+            self.attempts += timer.attempts
+            self.ddos += timer.ddos
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def report(self) -> str:
+        """Итог запуска: перцентили по фазам, страниц в минуту и доля DDoS-Guard"""
+        pages = len(self.samples['total'])
+        if not pages:
+            return 'нет обработанных страниц'
+        minutes = (time.perf_counter() - self.started) / 60
+        lines = [f"Страниц: {pages}, {pages / minutes:.1f} стр/мин, DDoS-Guard: {self.ddos} из {self.attempts} "
+                 f"загрузок ({self.ddos / max(self.attempts, 1):.1%})",
+                 "Фаза: " + " / ".join(f"p{p}" for p in PERCENTILES) + ", с"]
+        for phase, values in self.samples.items():
+            values = sorted(values)
+            lines.append(f"{phase}: " + " / ".join(f"{percentile(values, p):.2f}" for p in PERCENTILES))
+        lines.append("Итоги: " + ", ".join(f"{outcome}: {count}" for outcome, count in sorted(self.outcomes.items())))
+        return "\n".join(lines)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,103 @@
+"""
+Отладочные снимки страниц (скриншот и HTML) при ошибках парсинга с ограничением объема.
+
+- на запуск отводится не более DEBUG_BUDGET_MB мегабайт, после этого снимки не делаются;
+- для каждой причины (reason) сохраняются только первые DEBUG_MAX_PER_REASON снимков, причем после первого
+  снимка каждый следующий случай берется с вероятностью DEBUG_SAMPLE_RATE;
+- скриншот снимается только видимой части страницы (JPEG), HTML сжимается gzip;
+- сжатие и запись на диск идут в фоновом потоке, цикл парсинга ждет только снятия данных со страницы.
+
+Файлы: out/debug/<причина>/<артикул>_<время>.jpg и .html.gz
+"""
+import os
+import gzip
+import random
+import datetime
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from colorama import Fore
+
+DEBUG_DIR = os.path.join("out", "debug")
+DEBUG_BUDGET_MB = 200
+DEBUG_MAX_PER_REASON = 5
+DEBUG_SAMPLE_RATE = 0.2
+DEBUG_SCREENSHOT_QUALITY = 50
+
+
+class DebugCapture:
+    def __init__(self, debug_dir: str = DEBUG_DIR, budget_mb: float = DEBUG_BUDGET_MB,
+                 max_per_reason: int = DEBUG_MAX_PER_REASON, sample_rate: float = DEBUG_SAMPLE_RATE):
+        self.debug_dir = debug_dir
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.max_per_reason = max_per_reason
+        self.sample_rate = sample_rate
+        self.seen = Counter()
+        self.captured = Counter()
+        self.written_bytes = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='debug-capture')
+
+    def should_capture(self, reason: str) -> bool:
+        """Решает, снимать ли этот случай, и сразу резервирует место в лимите причины."""
+        with self._lock:
+            self.seen[reason] += 1
+            if self.written_bytes >= self.budget_bytes or self.captured[reason] >= self.max_per_reason:
+                return False
+            if self.captured[reason] and random.random() >= self.sample_rate:
+                return False
+            self.captured[reason] += 1
+            return True
+
+    def capture(self, page, article_id: str, reason: str):
+        """Снимок страницы синхронного Playwright."""
+        if not self.should_capture(reason):
+            return
+        try:
+            screenshot = page.screenshot(type='jpeg', quality=DEBUG_SCREENSHOT_QUALITY)
+            html = page.content()
+        except Exception as e:
+            print(Fore.RED + f"  - Не удалось снять отладочную информацию: {e}")
+            return
+        self._submit(article_id, reason, screenshot, html)
+
+    async def capture_async(self, page, article_id: str, reason: str):
+        """Снимок страницы асинхронного Playwright."""
+        if not self.should_capture(reason):
+            return
+        try:
+            screenshot = await page.screenshot(type='jpeg', quality=DEBUG_SCREENSHOT_QUALITY)
+            html = await page.content()
+        except Exception as e:
+            print(Fore.RED + f"  - Не удалось снять отладочную информацию: {e}")
+            return
+        self._submit(article_id, reason, screenshot, html)
+
+    def _submit(self, article_id: str, reason: str, screenshot: bytes, html: str):
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        base_path = os.path.join(self.debug_dir, reason, f"{article_id}_{timestamp}")
+        print(Fore.MAGENTA + f"!!! Отладочная информация ({reason}) для {article_id}: {base_path}.*")
+        self._executor.submit(self._write, base_path, screenshot, html)
+
+    def _write(self, base_path: str, screenshot: bytes, html: str):
+        try:
+            os.makedirs(os.path.dirname(base_path), exist_ok=True)
+            compressed = gzip.compress(html.encode('utf-8'))
+            with open(base_path + '.jpg', 'wb') as f:
+                f.write(screenshot)
+            with open(base_path + '.html.gz', 'wb') as f:
+                f.write(compressed)
+            with self._lock:
+                self.written_bytes += len(screenshot) + len(compressed)
+        except Exception as e:
+            print(Fore.RED + f"  - Не удалось сохранить отладочную информацию {base_path}: {e}")
+
+    def summary(self) -> str:
+        if not self.seen:
+            return 'нет'
+        parts = [f"{reason}: {self.captured[reason]}/{count}" for reason, count in sorted(self.seen.items())]
+        return ', '.join(parts) + f", {self.written_bytes / 1024 / 1024:.1f} МБ"
+
+    def close(self):
+        """Дожидается записи всех снимков."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,140 @@
+"""
+Исключение нежелательных брендов и каталогов по спискам in/bad_brand.txt и in/bad_catalogs.txt.
+
+Списки читаются один раз и компилируются в один матчер:
+- бренды - одно регулярное выражение со всеми названиями (без учета регистра, целым словом), поэтому проверка
+  названия товара не зависит от длины списка;
+- каталоги - множество путей (/catalog/...), адрес сайта не учитывается, поэтому список работает и с другим
+  config.BASE_URL (например, с локальной заглушкой fake_europa_server.py).
+
+Применяется как можно раньше: step1 не сохраняет исключенные каталоги, step2 не обходит их и не берет в индекс
+карточки нежелательных брендов (по названию), step3 сразу после определения состояния страницы отбрасывает товар
+по характеристике "Бренд" (или по названию, если характеристики нет) и не собирает и не сохраняет его.
+
+В названии товара бренд ищется только там, где он стоит как бренд: в кавычках ("Сок «Тайга»") или в начале
+названия ("Dior Sauvage ..."). Многие бренды из списка - обычные слова ("А4", "Майский", "Прелесть"), и поиск
+по всему названию отбрасывал бы "Тетрадь А4" или "Мёд Майский". Карточки, исключенные step2 по названию,
+записываются в EXCLUDED_LOG_FILE, чтобы ошибочное правило было видно.
+
+Для каждого правила считаются срабатывания и сколько загрузок страниц благодаря ему не понадобилось (summary()).
+"""
+import os
+import re
+import datetime
+from collections import Counter
+from urllib.parse import urlsplit
+
+BAD_BRAND_FILE = os.path.join("in", "bad_brand.txt")
+BAD_CATALOGS_FILE = os.path.join("in", "bad_catalogs.txt")
+EXCLUDED_LOG_FILE = os.path.join("out", "excluded_articles.txt")
+# Текст в кавычках внутри названия товара
+QUOTED_RE = re.compile(r'[«"“„]([^«»"“”„]+)[»"”“]')
+# Характеристики товара, в которых указан бренд
+BRAND_KEYS = ('бренд', 'торговая марка')
+# Сколько правил показывать в сводке
+SUMMARY_TOP = 10
+
+
+def read_list(path: str) -> list[str]:
+    """Непустые строки файла без повторов; если файла нет - пустой список"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return list(dict.fromkeys(line.strip() for line in f if line.strip()))
+
+
+def catalog_path(url: str) -> str:
+    """Путь каталога без адреса сайта, параметров и завершающего слеша"""
+    return urlsplit(url.strip()).path.rstrip('/').lower()
+
+
+class ExclusionRules:
+    def __init__(self, brands: list[str], catalogs: list[str]):
+        self.brands = {brand.casefold(): brand for brand in brands}
+        self.catalogs = {catalog_path(url): url for url in catalogs if catalog_path(url)}
+        # Длинные названия раньше коротких, чтобы "Smith & Cult" не сработал как более короткий бренд
+        alternatives = sorted(self.brands.values(), key=len, reverse=True)
+        self.brand_re = re.compile(r'(?<!\w)(?:' + '|'.join(map(re.escape, alternatives)) + r')(?!\w)',
+                                   re.IGNORECASE) if alternatives else None
+        self.hits = Counter()
+        self.avoided = Counter()
+
+    @classmethod
+    def load(cls, brand_file: str = BAD_BRAND_FILE, catalogs_file: str = BAD_CATALOGS_FILE) -> 'ExclusionRules':
+        return cls(read_list(brand_file), read_list(catalogs_file))
+
+    def match_brand(self, text: str | None) -> str | None:
+        """Правило бренда, найденного в тексте (название товара или значение характеристики), или None"""
+        if not text or self.brand_re is None:
+            return None
+        match = self.brand_re.search(text)
+        if match is None:
+            return None
+        return f"brand:{self.brands.get(match.group(0).casefold(), match.group(0))}"
+
+    def match_name(self, name: str | None) -> str | None:
+        """Правило бренда по названию товара: бренд целиком в кавычках или в начале названия"""
+        if not name or self.brand_re is None:
+            return None
+        name = name.strip()
+        for candidate in [quoted.strip() for quoted in QUOTED_RE.findall(name)]:
+            match = self.brand_re.fullmatch(candidate)
+            if match:
+                return f"brand:{self.brands.get(match.group(0).casefold(), match.group(0))}"
+        match = self.brand_re.match(name)
+        if match:
+            return f"brand:{self.brands.get(match.group(0).casefold(), match.group(0))}"
+        return None
+
+    def match_catalog(self, url: str) -> str | None:
+        path = catalog_path(url)
+        return f"catalog:{path}" if path in self.catalogs else None
+
+    def match_product(self, name: str | None, params: list | None) -> str | None:
+        """Правило для товара: по характеристике бренда, а если ее нет - по названию (см. match_name)"""
+        for param in params or []:
+            key, value = param[0], param[1]
+            if key and key.strip().casefold() in BRAND_KEYS:
+                return self.match_brand(value)
+        return self.match_name(name)
+
+    def has_rule(self, rule: str) -> bool:
+        """Правило (как его возвращают match_*) есть в текущих списках"""
+        kind, _, value = rule.partition(':')
+        if kind == 'brand':
+            return value.casefold() in self.brands
+        return kind == 'catalog' and value in self.catalogs
+
+    def count(self, rule: str, avoided: int = 1):
+        """Учитывает срабатывание правила и число загрузок страниц, которые не понадобились"""
+        self.hits[rule] += 1
+        self.avoided[rule] += avoided
+
+    def exclude_catalog(self, url: str) -> bool:
+        rule = self.match_catalog(url)
+        if rule:
+            self.count(rule)
+        return rule is not None
+
+    def exclude_name(self, name: str, article: str = '', log_path: str = EXCLUDED_LOG_FILE) -> bool:
+        """Карточка нежелательного бренда по названию; исключенная карточка записывается в log_path"""
+        rule = self.match_name(name)
+        if rule is None:
+            return False
+        self.count(rule)
+        dirname = os.path.dirname(log_path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M')} | {rule} | {article} | {name.strip()}\n")
+        return True
+
+    def summary(self) -> str:
+        if not self.hits:
+            return 'исключений нет'
+        lines = [f"Исключено: {sum(self.hits.values())}, не загружено страниц: {sum(self.avoided.values())}"]
+        for rule, hits in self.hits.most_common(SUMMARY_TOP):
+            lines.append(f"{rule}: {hits} (не загружено: {self.avoided[rule]})")
+        if len(self.hits) > SUMMARY_TOP:
+            lines.append(f"... еще правил: {len(self.hits) - SUMMARY_TOP}")
+        return "\n".join(lines)
@@ -0,0 +1,127 @@
+"""
+Хранилище неудачных ссылок step3: артикул -> класс причины, число попыток и время следующей попытки.
+Хранится в out/failures.json с журналом дозаписи out/failures.jsonl (как data.json, см. product_store.py).
+
+Классы причин (FAILURE_POLICIES):
+- постоянные (товар не найден, некорректная ссылка, нежелательный бренд) - такие ссылки исключаются из следующих
+  запусков;
+- временные (ошибка загрузки, нет в наличии) - повторяются с экспоненциальной паузой (не больше MAX_BACKOFF_HOURS):
+  в конце текущего запуска, если пауза уже прошла, или в одном из следующих запусков. Ошибка загрузки после
+  MAX_FAILURE_ATTEMPTS попыток считается постоянной, а товар не в наличии проверяется снова всегда - он может
+  вернуться в продажу;
+- неполные данные (нет фото или описания) - товар сохранен, запись только для отчета, не повторяется.
+
+Текстовый журнал out/articles_with_bad_req.txt по-прежнему ведется рядом.
+"""
+import os
+import json
+import datetime
+import threading
+from collections import Counter
+
+from product_store import ProductStore
+
+FAILURES_FILE = os.path.join("out", "failures.json")
+
+FAILURE_NOT_FOUND = 'not_found'
+FAILURE_BAD_URL = 'bad_url'
+FAILURE_LOAD_ERROR = 'load_error'
+FAILURE_OUT_OF_STOCK = 'out_of_stock'
+FAILURE_NO_IMAGES = 'no_images'
+FAILURE_NO_DESCRIPTION = 'no_description'
+FAILURE_EXCLUDED = 'excluded'
+
+MAX_FAILURE_ATTEMPTS = 5
+
+# permanent - больше не пытаться; backoff_minutes - пауза перед первой повторной попыткой (удваивается
+# с каждой попыткой), None - не повторять; max_attempts - после скольких попыток неудача становится постоянной,
+# None - повторять всегда
+FAILURE_POLICIES = {
+    FAILURE_NOT_FOUND: {'permanent': True, 'backoff_minutes': None, 'max_attempts': None},
+    FAILURE_BAD_URL: {'permanent': True, 'backoff_minutes': None, 'max_attempts': None},
+    FAILURE_LOAD_ERROR: {'permanent': False, 'backoff_minutes': 5, 'max_attempts': MAX_FAILURE_ATTEMPTS},
+    FAILURE_OUT_OF_STOCK: {'permanent': False, 'backoff_minutes': 24 * 60, 'max_attempts': None},
+    FAILURE_NO_IMAGES: {'permanent': False, 'backoff_minutes': None, 'max_attempts': None},
+    FAILURE_NO_DESCRIPTION: {'permanent': False, 'backoff_minutes': None, 'max_attempts': None},
+    FAILURE_EXCLUDED: {'permanent': True, 'backoff_minutes': None, 'max_attempts': None},
+}
+MAX_BACKOFF_HOURS = 7 * 24
+
+
+def now_iso() -> str:
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+class FailureStore(ProductStore):
+    """Неудачные ссылки по артикулам. Безопасно для вызова из нескольких потоков (HTTP-загрузка в step3)."""
+
+    def __init__(self, json_path: str = FAILURES_FILE, log_path: str | None = None):
+        super().__init__(json_path, log_path)
+        self._lock = threading.Lock()
+
+    def load(self) -> 'FailureStore':
+        """Загружает failures.json и журнал дозаписи к нему (без сообщения о товарах, как у ProductStore)."""
+        dirname = os.path.dirname(self.json_path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        if os.path.exists(self.json_path):
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        self._replay_log()
+        return self
+
+    def record(self, article: str, url: str, reason: str, message: str = '') -> dict:
+        """Записывает неудачу: увеличивает число попыток и назначает время следующей попытки."""
+        policy = FAILURE_POLICIES[reason]
+        with self._lock:
+            entry = self.data.get(article)
+            attempts = entry['attempts'] + 1 if entry and entry['reason'] == reason and not entry['resolved'] else 1
+            permanent = policy['permanent']
+            next_retry = None
+            if not permanent and policy['backoff_minutes'] is not None:
+                if policy['max_attempts'] is not None and attempts >= policy['max_attempts']:
+                    permanent = True
+                else:
+                    delay = min(policy['backoff_minutes'] * 2 ** (attempts - 1), MAX_BACKOFF_HOURS * 60)
+                    next_retry = (datetime.datetime.now() + datetime.timedelta(minutes=delay)).isoformat(
+                        timespec='seconds')
+            entry = {'url': url, 'reason': reason, 'message': message, 'permanent': permanent,
+                     'attempts': attempts, 'first_seen': entry['first_seen'] if entry else now_iso(),
+                     'last_attempt': now_iso(), 'next_retry': next_retry, 'resolved': False}
+            self.put(article, entry)
+            return entry
+
+    def resolve(self, article: str):
+        """Товар успешно собран: снимает неудачу, кроме отметок о неполных данных, записанных при этом же разборе."""
+        with self._lock:
+            entry = self.data.get(article)
+            if not entry or entry['resolved'] or entry['reason'] in (FAILURE_NO_IMAGES, FAILURE_NO_DESCRIPTION):
+                return
+            self.put(article, dict(entry, resolved=True, next_retry=None, last_attempt=now_iso()))
+
+    def is_permanent(self, article: str) -> bool:
+        entry = self.data.get(article)
+        return bool(entry and not entry['resolved'] and entry['permanent'])
+
+    def is_waiting(self, article: str, now: str | None = None) -> bool:
+        """Временная неудача, пауза после которой еще не прошла."""
+        entry = self.data.get(article)
+        if not entry or entry['resolved'] or not entry['next_retry']:
+            return False
+        return entry['next_retry'] > (now or now_iso())
+
+    def should_skip(self, article: str) -> bool:
+        return self.is_permanent(article) or self.is_waiting(article)
+
+    def due_urls(self) -> list[str]:
+        """Ссылки временных неудач, пауза после которых уже прошла, начиная с самых давних."""
+        now = now_iso()
+        due = sorted((entry['next_retry'], entry['url']) for entry in self.data.values()
+                     if not entry['resolved'] and not entry['permanent'] and entry['next_retry']
+                     and entry['next_retry'] <= now)
+        return [url for _, url in due]
+
+    def summary(self) -> str:
+        counts = Counter(entry['reason'] + (' (постоянно)' if entry['permanent'] else '')
+                         for entry in self.data.values() if not entry['resolved'])
+        return ', '.join(f'{reason}: {count}' for reason, count in sorted(counts.items())) or 'нет'
@@ -0,0 +1,334 @@
+"""
+Локальная имитация europa-market.ru для замеров скорости step2, step3 и ArtsToProductLinks без обращения к сайту.
+
+Страницы содержат те же селекторы, на которые опираются скрипты:
+- / - главная со списком каталогов (.catalog-list-wrapper), для step1;
+- /catalog/cat-<N>?page=<P> - страница каталога с карточками (.card-product-content__title) и пагинацией
+  (.ui-pagination__pagination), для step2;
+- /catalog?search=<артикул> - поиск (div.product-card a или "Нет подходящих товаров"), для ArtsToProductLinks;
+- /product/tovar-<артикул> - страница товара (.product-cart, .product-title__name, .product-info__*,
+  .product-image__image-slider), для step3. Каждый NOT_FOUND_EVERY-й товар отдает "Товар не найден" (404),
+  каждый OUT_OF_STOCK_EVERY-й - страницу без блока цены с надписью "Нет в наличии";
+- /api/catalog/cat-<N>?page=<P> и /api/product/<артикул> - JSON со списком товаров страницы каталога (с пагинацией)
+  и с данными товара; страницы каталога и товара запрашивают их скриптом fetch, как фронтенд сайта, для режима
+  перехвата ответов API (network_capture.py, EUROPA_NETWORK_CAPTURE=1);
+- /img/<артикул>_<N>.png - изображения товаров: все картинки одного товара одинаковы по содержимому (повторы),
+  у каждого DEAD_IMAGE_EVERY-го товара картинки отдают 404;
+- POST /bot<токен>/sendMessage - заглушка Telegram Bot API для проверки notifier.py (EUROPA_TELEGRAM_API),
+  принятые сообщения сохраняются в FakeEuropa.messages.
+
+Задержка ответа выбирается случайно из LATENCY_MS, с вероятностью ERROR_RATE отдается ошибка 500, с вероятностью
+DDOS_RATE - страница DDoS-Guard. Данные товаров детерминированы: артикул = 100000 + номер каталога * 1000 + номер
+товара в каталоге.
+
+Запуск: python fake_europa_server.py [--port 8765] [--latency 50 300] [--errors 0.01] [--ddos 0.02]
+Скрипты направляются на сервер переменной окружения EUROPA_BASE_URL=http://127.0.0.1:8765 (см. config.py).
+Прогон скриптов против сервера с замером ссылок в минуту: bench_crawl.py
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from html import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, parse_qsl
+
+HOST = '127.0.0.1'
+PORT = 8765
+CATALOGS = 10
+PRODUCTS_PER_CATALOG = 120
+PAGE_SIZE = 30
+NOT_FOUND_EVERY = 25
+OUT_OF_STOCK_EVERY = 17
+DEAD_IMAGE_EVERY = 11
+LATENCY_MS = (50, 300)
+ERROR_RATE = 0.0
+DDOS_RATE = 0.0
+
+# Прозрачная картинка PNG 1x1
+PIXEL_PNG = bytes.fromhex('89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489'
+                          '0000000d49444154789c6360000002000005e27d8a0a0000000049454e44ae426082')
+
+DDOS_PAGE = '<html><head><title>DDoS-Guard</title></head><body>Checking your browser...</body></html>'
+
+
+def catalog_path(catalog_number: int) -> str:
+    return f'/catalog/cat-{catalog_number}'
+
+
+def product_code(catalog_number: int, position: int) -> int:
+    return 100000 + catalog_number * 1000 + position
+
+
+def product_path(code: int) -> str:
+    return f'/product/tovar-{code}'
+
+
+class FakeEuropa:
+    """Параметры имитации и счетчики запросов по типам страниц."""
+
+    def __init__(self, catalogs: int = CATALOGS, products_per_catalog: int = PRODUCTS_PER_CATALOG,
+                 page_size: int = PAGE_SIZE, latency_ms: tuple[int, int] = LATENCY_MS,
+                 error_rate: float = ERROR_RATE, ddos_rate: float = DDOS_RATE):
+        self.catalogs = catalogs
+        self.products_per_catalog = products_per_catalog
+        self.page_size = page_size
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.ddos_rate = ddos_rate
+        self.hits = Counter()
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def count(self, kind: str):
+        with self._lock:
+            self.hits[kind] += 1
+
+    def catalog_urls(self, base_url: str) -> list[str]:
+        return [base_url + catalog_path(n) for n in range(1, self.catalogs + 1)]
+
+    def product_codes(self) -> list[int]:
+        return [product_code(c, p) for c in range(1, self.catalogs + 1) for p in range(self.products_per_catalog)]
+
+    def product_exists(self, code: int) -> bool:
+        catalog_number, position = divmod(code - 100000, 1000)
+        return 1 <= catalog_number <= self.catalogs and 0 <= position < self.products_per_catalog
+
+    @staticmethod
+    def is_not_found(code: int) -> bool:
+        return code % NOT_FOUND_EVERY == 0
+
+    @staticmethod
+    def is_out_of_stock(code: int) -> bool:
+        return not FakeEuropa.is_not_found(code) and code % OUT_OF_STOCK_EVERY == 0
+
+    def page_count(self) -> int:
+        return max((self.products_per_catalog + self.page_size - 1) // self.page_size, 1)
+
+
+def render_home(fake: FakeEuropa) -> str:
+    links = ''.join(f'<a href="{catalog_path(n)}">Каталог {n}</a>' for n in range(1, fake.catalogs + 1))
+    return f'<html><head><title>Европа</title></head><body><div class="catalog-list-wrapper">{links}</div></body></html>'
+
+
+def api_script(path: str) -> str:
+    """Фоновый запрос к API, как у фронтенда сайта"""
+    return f'<script>fetch("{path}").then(r => r.json())</script>'
+
+
+def page_positions(fake: FakeEuropa, page_number: int) -> range:
+    start = (page_number - 1) * fake.page_size
+    return range(start, min(start + fake.page_size, fake.products_per_catalog))
+
+
+def render_catalog(fake: FakeEuropa, catalog_number: int, page_number: int) -> str:
+    cards = ''.join(
+        f'<div class="card-product"><a class="card-product-content__title" '
+        f'href="{product_path(product_code(catalog_number, p))}">Товар {product_code(catalog_number, p)}</a></div>'
+        for p in page_positions(fake, page_number))
+    pages = ''.join(f'<a href="?page={n}"><span>{n}</span></a>' for n in range(1, fake.page_count() + 1))
+    return (f'<html><head><title>Каталог {catalog_number}</title></head><body>{cards}'
+            f'<div class="ui-pagination__pagination">{pages}</div>'
+            f'{api_script(f"/api{catalog_path(catalog_number)}?page={page_number}")}</body></html>')
+
+
+def render_catalog_api(fake: FakeEuropa, catalog_number: int, page_number: int) -> str:
+    items = [{'id': product_code(catalog_number, p), 'name': f'Товар {product_code(catalog_number, p)}',
+              'url': product_path(product_code(catalog_number, p))} for p in page_positions(fake, page_number)]
+    return json.dumps({'data': items, 'meta': {'current_page': page_number, 'last_page': fake.page_count()}},
+                      ensure_ascii=False)
+
+
+def render_search(fake: FakeEuropa, query: str) -> str:
+    if query.isdigit() and fake.product_exists(int(query)) and not fake.is_not_found(int(query)):
+        body = f'<div class="product-card"><a href="{product_path(int(query))}">Товар {query}</a></div>'
+    else:
+        body = '<div class="catalog-empty">Нет подходящих товаров</div>'
+    return f'<html><head><title>Поиск</title></head><body>{body}</body></html>'
+
+
+def product_data(base_url: str, code: int) -> dict:
+    """Детерминированные данные товара - общие для страницы и ответа API"""
+    rng = random.Random(code)
+    name = f'Товар {code}'
+    images = [f'{base_url}/img/{code}_{n}.png?w=600' for n in range(1, rng.randint(1, 4) + 1)]
+    price_int, price_frac = rng.randint(30, 5000), rng.randint(0, 99)
+    nutrition = {key: f'{rng.randint(1, 40)} г' for key in ('Белки', 'Жиры', 'Углеводы')}
+    return {'id': code, 'name': name, 'url': product_path(code), 'images': images,
+            'price': None if FakeEuropa.is_out_of_stock(code) else f'{price_int}.{price_frac:02d}',
+            'nutrition': nutrition, 'description': f'{name} для проверки скорости парсера',
+            'brand': {'name': f'Бренд {code % 13}'}, 'properties': [{'name': 'Страна', 'value': 'Россия'}]}
+
+
+def render_product(base_url: str, code: int) -> str:
+    data = product_data(base_url, code)
+    name = data['name']
+    images = ''.join(f'<img src="{src}">' for src in data['images'])
+    price = '<div class="product-cart-empty">Нет в наличии</div>'
+    if data['price'] is not None:
+        price_int, price_frac = data['price'].split('.')
+        price = f'<div class="product-cart"><span class="product-cart__price-int">{price_int}</span>' \
+                f'<span class="product-cart__price-frac"><span>{price_frac}</span></span></div>'
+    nutrition = ''.join(
+        f'<div class="product-info__nutrition-item"><span class="product-info__nutrition-name">{key}</span>'
+        f'<span class="product-info__nutrition-value">{value}</span></div>'
+        for key, value in data['nutrition'].items())
+    params = (f'<div class="product-info__params">'
+              f'<div><span class="product-info__params-name">Описание</span>'
+              f'<span class="product-info__params-value">{escape(data["description"])}</span></div>'
+              f'<div class="product-info__params-block--columns">'
+              f'<div class="product-info__params-item"><span class="product-info__params-name">Бренд</span>'
+              f'<span class="product-info__params-value">{escape(data["brand"]["name"])}</span></div>'
+              f'<div class="product-info__params-item"><span class="product-info__params-name">Страна</span>'
+              f'<span class="product-info__params-value">Россия</span></div></div></div>')
+    return (f'<html><head><title>{escape(name)}</title></head><body>'
+            f'<h1 class="product-title__name">{escape(name)}</h1>'
+            f'<div class="product-image__image-slider">{images}</div>{price}{nutrition}{params}'
+            f'{api_script(f"/api/product/{code}")}</body></html>')
+
+
+NOT_FOUND_PAGE = '<html><head><title>Европа</title></head><body><h1>Товар не найден</h1></body></html>'
+
+
+class Handler(BaseHTTPRequestHandler):
+    fake: FakeEuropa = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_page(self, status: int, body: str | bytes, content_type: str = 'text/html; charset=utf-8'):
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        fake = self.fake
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        base_url = f'http://{self.headers.get("Host", f"{HOST}:{PORT}")}'
+
+        if match := re.fullmatch(r'/img/(\d+)_\d+\.png', parts.path):
+            code = int(match.group(1))
+            if code % DEAD_IMAGE_EVERY == 0:
+                fake.count('image_dead')
+                self.send_page(404, NOT_FOUND_PAGE)
+                return
+            fake.count('image')
+            # Данные после конца PNG не мешают просмотру, но делают картинку каждого товара уникальной
+            self.send_page(200, PIXEL_PNG + str(code).encode(), 'image/png')
+            return
+
+        time.sleep(random.uniform(*fake.latency_ms) / 1000)
+        if random.random() < fake.error_rate:
+            fake.count('error')
+            self.send_page(500, '<html><head><title>500</title></head><body>Internal Server Error</body></html>')
+            return
+        if random.random() < fake.ddos_rate:
+            fake.count('ddos')
+            self.send_page(403, DDOS_PAGE)
+            return
+
+        if match := re.fullmatch(r'/api/catalog/cat-(\d+)', parts.path):
+            catalog_number = int(match.group(1))
+            page_number = int(query.get('page', ['1'])[0])
+            if not 1 <= catalog_number <= fake.catalogs or not 1 <= page_number <= fake.page_count():
+                fake.count('not_found')
+                self.send_page(404, '{"error": "not found"}', 'application/json')
+                return
+            fake.count('api')
+            self.send_page(200, render_catalog_api(fake, catalog_number, page_number), 'application/json')
+        elif match := re.fullmatch(r'/api/product/(\d+)', parts.path):
+            code = int(match.group(1))
+            if not fake.product_exists(code) or fake.is_not_found(code):
+                fake.count('not_found')
+                self.send_page(404, '{"error": "not found"}', 'application/json')
+                return
+            fake.count('api')
+            self.send_page(200, json.dumps({'data': product_data(base_url, code)}, ensure_ascii=False),
+                           'application/json')
+        elif parts.path == '/':
+            fake.count('home')
+            self.send_page(200, render_home(fake))
+        elif parts.path == '/catalog' and 'search' in query:
+            fake.count('search')
+            self.send_page(200, render_search(fake, query['search'][0].strip()))
+        elif match := re.fullmatch(r'/catalog/cat-(\d+)', parts.path):
+            catalog_number = int(match.group(1))
+            page_number = int(query.get('page', ['1'])[0])
+            if not 1 <= catalog_number <= fake.catalogs or not 1 <= page_number <= fake.page_count():
+                fake.count('not_found')
+                self.send_page(404, NOT_FOUND_PAGE)
+                return
+            fake.count('catalog')
+            self.send_page(200, render_catalog(fake, catalog_number, page_number))
+        elif match := re.fullmatch(r'/product/[\w-]*?-(\d+)', parts.path):
+            code = int(match.group(1))
+            if not fake.product_exists(code) or fake.is_not_found(code):
+                fake.count('not_found')
+                self.send_page(404, NOT_FOUND_PAGE)
+                return
+            fake.count('product')
+            self.send_page(200, render_product(base_url, code))
+        else:
+            fake.count('not_found')
+            self.send_page(404, NOT_FOUND_PAGE)
+
+
+    def do_POST(self):
+        fake = self.fake
+        if not re.fullmatch(r'/bot[^/]+/sendMessage', urlsplit(self.path).path):
+            self.send_page(404, NOT_FOUND_PAGE)
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        if random.random() < fake.error_rate:
+            fake.count('telegram_error')
+            self.send_page(500, '{"ok": false}', 'application/json')
+            return
+        fake.count('telegram')
+        with fake._lock:
+            fake.messages.append(dict(parse_qsl(body)).get('text', ''))
+        self.send_page(200, '{"ok": true}', 'application/json')
+
+
+def start_server(fake: FakeEuropa, host: str = HOST, port: int = PORT) -> ThreadingHTTPServer:
+    """Запускает сервер в фоновом потоке. port=0 - любой свободный порт (см. server.server_address)."""
+    handler = type('FakeEuropaHandler', (Handler,), {'fake': fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная имитация europa-market.ru')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--catalogs', type=int, default=CATALOGS)
+    parser.add_argument('--products', type=int, default=PRODUCTS_PER_CATALOG, help='товаров в каталоге')
+    parser.add_argument('--latency', type=int, nargs=2, default=LATENCY_MS, metavar=('MIN_MS', 'MAX_MS'))
+    parser.add_argument('--errors', type=float, default=ERROR_RATE, help='доля ответов 500')
+    parser.add_argument('--ddos', type=float, default=DDOS_RATE, help='доля ответов DDoS-Guard')
+    args = parser.parse_args()
+
+    fake = FakeEuropa(catalogs=args.catalogs, products_per_catalog=args.products, latency_ms=tuple(args.latency),
+                      error_rate=args.errors, ddos_rate=args.ddos)
+    server = start_server(fake, args.host, args.port)
+    print(f'Сервер запущен: http://{args.host}:{server.server_address[1]} (EUROPA_BASE_URL). Ctrl+C - остановить.')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f'Запросы: {dict(fake.hits)}')
+        for message in fake.messages:
+            print(f'--- Сообщение в Telegram ---\n{message}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Загрузка страниц товаров без браузера: HTTP-клиент с пулом соединений и cookies сессии магазина, сохраненной
+браузером (см. city_session.py), и разбор HTML без рендеринга.
+
+parse_product_html возвращает состояние страницы и те же "сырые" данные, что EXTRACT_PRODUCT_JS
+(см. product_extract.py), поэтому словарь товара собирается тем же build_product_record.
+Если страницу не удалось разобрать, выбрасывается HtmlParseError - тогда товар загружается через браузер.
+
+HTTP-клиенту передаются только cookies сессии: localStorage (origins в storage state) живет в браузере, и если
+сайт берет из него выбранный магазин, HTML без JS может прийти без блока цены. Поэтому PAGE_OUT_OF_STOCK из HTML
+step3 не записывает, а перепроверяет в браузере.
+"""
+import json
+import importlib.util
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+
+from product_extract import PAGE_PRODUCT, PAGE_NOT_FOUND, PAGE_OUT_OF_STOCK, PAGE_DDOS
+
+# lxml заметно быстрее встроенного html.parser, но необязателен
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+HTTP_TIMEOUT = 20
+HTTP_POOL_SIZE = 10
+
+
+class HtmlParseError(Exception):
+    pass
+
+
+def make_http_session(storage_state_path: str | None, user_agent: str) -> requests.Session:
+    """Создает HTTP-сессию с пулом соединений и cookies из файла storage state Playwright (localStorage не
+    переносится, см. описание модуля)."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': user_agent,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'ru-RU,ru;q=0.9',
+    })
+    if storage_state_path:
+        with open(storage_state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        for cookie in state.get('cookies', []):
+            session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''),
+                                path=cookie.get('path', '/'))
+    return session
+
+
+def fetch_product_html(session: requests.Session, url: str) -> str:
+    response = session.get(url, timeout=HTTP_TIMEOUT)
+    # 404 сайт отдает вместе со страницей "Товар не найден", ее разбираем как обычно
+    if response.status_code >= 500:
+        response.raise_for_status()
+    return response.text
+
+
+def _text(root, selector: str) -> str | None:
+    el = root.select_one(selector) if root is not None else None
+    return el.get_text() if el is not None else None
+
+
+def parse_product_html(html: str) -> tuple[str, dict | None]:
+    """
+    Определяет состояние страницы товара по HTML и для страницы с ценой извлекает данные в формате
+    EXTRACT_PRODUCT_JS. Возвращает (состояние, данные или None).
+    """
+    soup = BeautifulSoup(html, HTML_PARSER)
+    title = soup.title.get_text() if soup.title else ''
+    if 'ddos' in title.lower():
+        return PAGE_DDOS, None
+    if any(h.get_text().strip() == 'Товар не найден' for h in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])):
+        return PAGE_NOT_FOUND, None
+
+    name = _text(soup, '.product-title__name')
+    cart = soup.select_one('.product-cart')
+    if cart is None:
+        if name is not None:
+            return PAGE_OUT_OF_STOCK, None
+        raise HtmlParseError('На странице нет ни названия товара, ни блока цены')
+
+    nutrition = []
+    for item in soup.select('.product-info__nutrition-item'):
+        key = _text(item, '.product-info__nutrition-name')
+        value = _text(item, '.product-info__nutrition-value')
+        if key is not None and value is not None:
+            nutrition.append([key, value])
+
+    params = []
+    for container in soup.select('.product-info__params'):
+        for block in container.find_all('div', recursive=False):
+            in_columns = 'product-info__params-block--columns' in (block.get('class') or [])
+            items = block.select('.product-info__params-item') if in_columns else [block]
+            for item in items:
+                key = _text(item, '.product-info__params-name')
+                value = _text(item, '.product-info__params-value')
+                if key is not None and value is not None:
+                    params.append([key, value, in_columns])
+
+    images = [img['src'] for img in soup.select('.product-image__image-slider img') if img.get('src')]
+
+    return PAGE_PRODUCT, {
+        'priceInt': _text(cart, '.product-cart__price-int'),
+        'priceFrac': _text(cart, '.product-cart__price-frac span'),
+        'name': name,
+        'nutrition': nutrition,
+        'params': params,
+        'images': images,
+    }
@@ -0,0 +1,204 @@
+"""
+Проверка и загрузка изображений товаров перед выгрузкой в Excel.
+
+Ссылки из img_url всех товаров (data.json и журнал дозаписи) загружаются параллельно IMAGE_WORKERS потоками через
+общий пул соединений и сохраняются в локальный кэш out/img_cache по хэшу содержимого (sha256): одинаковые картинки
+по разным ссылкам хранятся один раз. Результат по каждой ссылке записывается в out/img_cache/manifest.json:
+- ok - картинка загружена (хэш, путь в кэше, размер);
+- dead - ссылка мертвая (только ответы DEAD_STATUS_CODES - 404/410), в выгрузку не попадает;
+- error - временная ошибка (таймаут, 403/429/5xx, страница проверки DDoS-Guard или другой ответ не с картинкой),
+  ссылка остается в выгрузке и проверяется снова при следующем запуске.
+
+Частота запросов ограничивается общим RateLimiter (см. rate_limiter.py, IMAGE_REQUESTS_PER_MINUTE): при 403, 429
+и ответах-страницах частота снижается с паузой, как при DDoS-Guard у скриптов сбора.
+
+Повторный запуск проверяет только новые ссылки, ссылки с временными ошибками и мертвые ссылки старше
+DEAD_RECHECK_HOURS часов, поэтому прерванную проверку можно просто запустить заново.
+
+JsonToXLS убирает из столбцов фото мертвые ссылки и повторы одной и той же картинки у товара (filter_urls).
+
+Запуск: python image_cache.py [путь к data.json]
+Проверить на локальной заглушке: fake_europa_server.py отдает картинки товаров, в том числе мертвые и одинаковые.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+from colorama import Fore
+
+from config import RATE_LIMIT
+from product_store import iter_products
+from rate_limiter import RateLimiter
+
+IMG_CACHE_DIR = os.path.join("out", "img_cache")
+MANIFEST_FILE = os.path.join(IMG_CACHE_DIR, "manifest.json")
+IMAGE_WORKERS = 8
+IMAGE_TIMEOUT = 20
+DEAD_RECHECK_HOURS = 7 * 24
+# Ответы, после которых ссылка считается мертвой; остальные неудачи - временные ошибки
+DEAD_STATUS_CODES = (404, 410)
+# Частота запросов в минуту (на все потоки вместе): начальная, минимальная, максимальная
+IMAGE_REQUESTS_PER_MINUTE = RATE_LIMIT or (300, 30, 1200)
+IMAGE_DDOS_PAUSE_SECONDS = 60
+# Как часто сохранять манифест (каждые N проверенных ссылок)
+SAVE_MANIFEST_EVERY = 200
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/118.0.0.0 Safari/537.36")
+
+STATUS_OK = 'ok'
+STATUS_DEAD = 'dead'
+STATUS_ERROR = 'error'
+
+EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp', 'image/gif': '.gif'}
+
+
+def now_iso() -> str:
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+def make_image_session(workers: int = IMAGE_WORKERS) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'User-Agent': USER_AGENT})
+    return session
+
+
+def collect_image_urls(products) -> list[str]:
+    """Все ссылки на изображения товаров без повторов, в порядке появления"""
+    urls = {}
+    for _, record in products:
+        for url in record.get('img_url') or []:
+            urls[url] = None
+    return list(urls)
+
+
+class ImageCache:
+    def __init__(self, cache_dir: str = IMG_CACHE_DIR, manifest_path: str = MANIFEST_FILE):
+        self.cache_dir = cache_dir
+        self.manifest_path = manifest_path
+        self.manifest = {}
+
+    def load(self) -> 'ImageCache':
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self.manifest = json.load(f)
+            except json.JSONDecodeError:
+                print(Fore.YELLOW + f"Манифест {self.manifest_path} поврежден, начинаем с пустого.")
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def needs_check(self, url: str) -> bool:
+        entry = self.manifest.get(url)
+        if entry is None or entry['status'] == STATUS_ERROR:
+            return True
+        if entry['status'] == STATUS_OK:
+            return not os.path.exists(entry['path'])
+        cutoff = datetime.datetime.now() - datetime.timedelta(hours=DEAD_RECHECK_HOURS)
+        return entry['checked'] < cutoff.isoformat(timespec='seconds')
+
+    def cache_path(self, sha: str, content_type: str) -> str:
+        return os.path.join(self.cache_dir, sha[:2], sha + EXTENSIONS.get(content_type, '.img'))
+
+    def fetch(self, session: requests.Session, url: str, limiter: RateLimiter) -> dict:
+        """Загружает одну картинку в кэш. Выполняется в потоке пула, манифест не трогает."""
+        limiter.wait()
+        entry = {'checked': now_iso()}
+        started = time.perf_counter()
+        try:
+            response = session.get(url, timeout=IMAGE_TIMEOUT)
+        except requests.RequestException as e:
+            limiter.record_error()
+            return dict(entry, status=STATUS_ERROR, error=str(e)[:200])
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if response.status_code in DEAD_STATUS_CODES:
+            limiter.record_success(time.perf_counter() - started)
+            return dict(entry, status=STATUS_DEAD, error=f'HTTP {response.status_code}')
+        if response.status_code != 200 or not response.content or not content_type.startswith('image/'):
+            # 403/429 и страница вместо картинки - скорее всего защита от частых запросов, а не мертвая ссылка
+            if response.status_code in (403, 429) or content_type == 'text/html':
+                limiter.record_ddos()
+            else:
+                limiter.record_error()
+            return dict(entry, status=STATUS_ERROR, error=f'HTTP {response.status_code}, {content_type or "-"}, '
+                                                          f'{len(response.content)} байт')
+        limiter.record_success(time.perf_counter() - started)
+        sha = hashlib.sha256(response.content).hexdigest()
+        path = self.cache_path(sha, content_type)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{id(response)}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(response.content)
+            os.replace(tmp_path, path)
+        return dict(entry, status=STATUS_OK, sha256=sha, path=path, size=len(response.content))
+
+    def check_all(self, urls: list[str], workers: int = IMAGE_WORKERS) -> dict:
+        """Проверяет и загружает все ссылки, которым нужна проверка. Возвращает количество по статусам."""
+        to_check = [url for url in urls if self.needs_check(url)]
+        print(f"Ссылок на изображения: {len(urls)}, к проверке: {len(to_check)}")
+        counts = {STATUS_OK: 0, STATUS_DEAD: 0, STATUS_ERROR: 0}
+        if not to_check:
+            return counts
+        session = make_image_session(workers)
+        limiter = RateLimiter(*IMAGE_REQUESTS_PER_MINUTE, ddos_pause=IMAGE_DDOS_PAUSE_SECONDS, increase_step=5)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor, \
+                    tqdm(total=len(to_check), desc="Проверка изображений", unit="фото") as pbar:
+                futures = {executor.submit(self.fetch, session, url, limiter): url for url in to_check}
+                for number, future in enumerate(as_completed(futures), start=1):
+                    entry = future.result()
+                    self.manifest[futures[future]] = entry
+                    counts[entry['status']] += 1
+                    pbar.update(1)
+                    if number % SAVE_MANIFEST_EVERY == 0:
+                        self.save()
+        finally:
+            self.save()
+        print(f"Частота запросов изображений: {limiter.summary()}")
+        return counts
+
+    def is_dead(self, url: str) -> bool:
+        entry = self.manifest.get(url)
+        return bool(entry and entry['status'] == STATUS_DEAD)
+
+    def filter_urls(self, urls: list[str]) -> list[str]:
+        """Ссылки без мертвых и без повторов одной картинки (по хэшу). Непроверенные ссылки остаются."""
+        result, seen = [], set()
+        for url in urls:
+            entry = self.manifest.get(url)
+            if entry and entry['status'] == STATUS_DEAD:
+                continue
+            key = entry['sha256'] if entry and entry['status'] == STATUS_OK else url
+            if key in seen:
+                continue
+            seen.add(key)
+            result.append(url)
+        return result
+
+
+def check_product_images(json_path: str) -> ImageCache:
+    """Проверяет изображения всех товаров хранилища и возвращает кэш с обновленным манифестом"""
+    cache = ImageCache().load()
+    counts = cache.check_all(collect_image_urls(iter_products(json_path)))
+    print(Fore.GREEN + f"Изображения: загружено {counts[STATUS_OK]}, мертвых {counts[STATUS_DEAD]}, "
+                       f"ошибок {counts[STATUS_ERROR]} (манифест: {cache.manifest_path})")
+    return cache
+
+
+if __name__ == '__main__':
+    check_product_images(sys.argv[1] if len(sys.argv) > 1 else os.path.join("out", "data.json"))
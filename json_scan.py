@@ -0,0 +1,69 @@
+"""
+Потоковый разбор верхнего уровня словаря JSON без загрузки файла в память: по отображенному в память (mmap)
+файлу находятся границы значений для каждого ключа, а сами значения разбираются только по запросу.
+
+Используется в merge_dicts.py (копирование записей как есть) и product_store.iter_products (выгрузки data.json).
+"""
+import re
+import json
+
+# Конец строки JSON (с учетом экранирования), начиная с символа после открывающей кавычки
+STRING_END_RE = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+# Кавычки и скобки внутри вложенного объекта или массива
+NESTED_TOKEN_RE = re.compile(rb'["{}\[\]]')
+# Конец числа, true/false/null
+SCALAR_END_RE = re.compile(rb'[^,}\]\s]*')
+WHITESPACE_RE = re.compile(rb'[\s,]*')
+SPACE_RE = re.compile(rb'\s*')
+
+
+def string_end(data, pos: int) -> int:
+    """Позиция после закрывающей кавычки строки, открывающая кавычка которой стоит в pos"""
+    match = STRING_END_RE.match(data, pos + 1)
+    if not match:
+        raise ValueError(f'Незакрытая строка в позиции {pos}')
+    return match.end()
+
+
+def value_end(data, pos: int) -> int:
+    """Позиция после значения JSON, которое начинается в pos"""
+    first = data[pos:pos + 1]
+    if first == b'"':
+        return string_end(data, pos)
+    if first not in (b'{', b'['):
+        return SCALAR_END_RE.match(data, pos).end()
+    depth = 0
+    while True:
+        match = NESTED_TOKEN_RE.search(data, pos)
+        if not match:
+            raise ValueError(f'Незакрытый объект в позиции {pos}')
+        token = match.group()
+        if token == b'"':
+            pos = string_end(data, match.start())
+            continue
+        depth += 1 if token in (b'{', b'[') else -1
+        pos = match.end()
+        if depth == 0:
+            return pos
+
+
+def iter_entries(data):
+    """Перебирает верхний уровень словаря JSON: (ключ, начало значения, конец значения)"""
+    pos = data.find(b'{')
+    if pos == -1:
+        raise ValueError('Файл не содержит словарь JSON')
+    pos += 1
+    while True:
+        pos = WHITESPACE_RE.match(data, pos).end()
+        first = data[pos:pos + 1]
+        if first == b'}':
+            return
+        if first != b'"':
+            raise ValueError(f'Ожидался ключ в позиции {pos}')
+        key_end = string_end(data, pos)
+        key = json.loads(data[pos:key_end])
+        pos = data.find(b':', key_end) + 1
+        pos = SPACE_RE.match(data, pos).end()
+        end = value_end(data, pos)
+        yield key, pos, end
+        pos = end
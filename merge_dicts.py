@@ -1,29 +1,148 @@
-"""Скрипт объединяет все словари с товарами из файлов JSON и сохраняет в отдельный JSON:
-merge_dictionaries\\result_merge\\data.json"""
+"""Скрипт объединяет все словари с товарами из файлов JSON папки out и сохраняет в отдельный JSON:
+out/result_merge_data.json
+
+Файлы не загружаются в память целиком: каждый файл отображается в память (mmap), и для каждого артикула
+запоминаются только файл и границы записи в нем. В результат записи копируются как есть, без повторной сериализации.
+
+Если артикул встречается в нескольких файлах с разными данными, запись выбирается по правилу MERGE_POLICY:
+- last - из последнего файла (файлы идут по имени), как раньше при dict.update;
+- newest - с самой поздней датой проверки last_seen (см. step3);
+- lowest_price - с наименьшей ценой.
+Все такие расхождения сохраняются в отчет out/merge_conflicts.json.
+
+Запуск: python merge_dicts.py [--policy newest] [файлы...]
+Без списка файлов берутся все *.json из папки out, кроме служебных и самого результата.
+"""
 import os
+import sys
 import json
+import mmap
+import argparse
+
+from json_scan import iter_entries
 
 # Получаем текущий путь к скрипту
 current_directory = os.path.dirname(os.path.realpath(__file__))
 # Путь к папке с JSON файлами (может потребоваться изменить в соответствии с вашей структурой папок)
-json_folder_path = os.path.join(current_directory, 'out')
-# Общий словарь, в который будут объединяться данные
-merged_dict = {}
-# Проходим по всем файлам в папке
-for filename in os.listdir(json_folder_path):
-    # Проверяем, является ли файл JSON
-    if filename.endswith('.json'):
-        # Формируем полный путь к файлу
-        filepath = os.path.join(json_folder_path, filename)
-
-        # Читаем содержимое файла JSON
-        with open(filepath, 'r', encoding='utf-8') as file:
-            json_content = json.load(file)
-
-        # Объединяем данные из текущего файла в общий словарь
-        merged_dict.update(json_content)  # доработать показ дублирующихся значений
-
-with open('out\\result_merge_data.json', 'w', encoding='utf-8') as json_file:
-    json.dump(merged_dict, json_file, indent=2, ensure_ascii=False)
-
-print('Успешно!')
+JSON_FOLDER_PATH = os.path.join(current_directory, 'out')
+OUTPUT_FILE = os.path.join(JSON_FOLDER_PATH, 'result_merge_data.json')
+CONFLICTS_FILE = os.path.join(JSON_FOLDER_PATH, 'merge_conflicts.json')
+# Служебные JSON в папке out, которые не являются словарями товаров
+EXCLUDED_FILES = {'result_merge_data.json', 'merge_conflicts.json', 'catalog_index.json', 'catalog_diff.json',
+                  'article_index.json', 'arts_cache.json', 'failures.json'}
+MERGE_POLICIES = ('last', 'newest', 'lowest_price')
+MERGE_POLICY = 'last'
+
+
+def record_price(record) -> float:
+    price = record.get('price') if isinstance(record, dict) else None
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        return price
+    return float('inf')
+
+
+def record_last_seen(record) -> str:
+    return (record.get('last_seen') or '') if isinstance(record, dict) else ''
+
+
+def prefer_new(policy: str, old_record, new_record) -> bool:
+    """Выбрать ли запись из более позднего файла вместо уже выбранной. При равенстве выигрывает более поздний файл."""
+    if policy == 'newest':
+        return record_last_seen(new_record) >= record_last_seen(old_record)
+    if policy == 'lowest_price':
+        return record_price(new_record) <= record_price(old_record)
+    return True
+
+
+def conflict_candidate(path: str, record) -> dict:
+    """Строка отчета о расхождении: файл, цена и дата проверки записи"""
+    if not isinstance(record, dict):
+        return {'file': path, 'price': None, 'last_seen': None}
+    return {'file': path, 'price': record.get('price'), 'last_seen': record.get('last_seen')}
+
+
+def find_input_files(folder: str = JSON_FOLDER_PATH) -> list[str]:
+    return [os.path.join(folder, filename) for filename in sorted(os.listdir(folder))
+            if filename.endswith('.json') and filename not in EXCLUDED_FILES]
+
+
+def merge_files(paths: list[str], output_path: str = OUTPUT_FILE, conflicts_path: str = CONFLICTS_FILE,
+                policy: str = MERGE_POLICY) -> dict:
+    """Объединяет словари товаров из paths. Возвращает статистику объединения."""
+    files, maps = [], []
+    # артикул -> (номер файла, начало, конец записи)
+    chosen = {}
+    conflicts = {}
+    stats = {'files': 0, 'entries': 0, 'duplicates': 0, 'conflicts': 0}
+    try:
+        for path in paths:
+            if os.path.abspath(path) == os.path.abspath(output_path):
+                continue
+            if os.path.exists(os.path.splitext(path)[0] + '.jsonl'):
+                print(f'Внимание: у {path} есть несжатый журнал дозаписи, сначала выполните python product_store.py')
+            if os.path.getsize(path) == 0:
+                continue
+            with open(path, 'rb') as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            files.append(path)
+            maps.append(data)
+            file_index = len(maps) - 1
+            stats['files'] += 1
+            for key, start, end in iter_entries(data):
+                stats['entries'] += 1
+                if key not in chosen:
+                    chosen[key] = (file_index, start, end)
+                    continue
+                stats['duplicates'] += 1
+                old_index, old_start, old_end = chosen[key]
+                old_bytes, new_bytes = maps[old_index][old_start:old_end], data[start:end]
+                if old_bytes == new_bytes:
+                    continue
+                old_record, new_record = json.loads(old_bytes), json.loads(new_bytes)
+                if old_record == new_record:
+                    continue
+                conflict = conflicts.setdefault(key, {'candidates': [conflict_candidate(files[old_index], old_record)]})
+                conflict['candidates'].append(conflict_candidate(path, new_record))
+                if prefer_new(policy, old_record, new_record):
+                    chosen[key] = (file_index, start, end)
+                conflict['chosen'] = files[chosen[key][0]]
+
+        tmp_path = output_path + '.tmp'
+        with open(tmp_path, 'wb') as output:
+            output.write(b'{')
+            for number, (key, (file_index, start, end)) in enumerate(chosen.items()):
+                output.write(b',\n  ' if number else b'\n  ')
+                output.write(json.dumps(key, ensure_ascii=False).encode('utf-8'))
+                output.write(b': ')
+                output.write(maps[file_index][start:end])
+            output.write(b'\n}' if chosen else b'}')
+        os.replace(tmp_path, output_path)
+    finally:
+        for data in maps:
+            data.close()
+
+    stats['conflicts'] = len(conflicts)
+    stats['products'] = len(chosen)
+    with open(conflicts_path, 'w', encoding='utf-8') as f:
+        json.dump({'policy': policy, 'files': files, 'conflicts': conflicts}, f, indent=2, ensure_ascii=False)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Объединение словарей товаров из JSON файлов')
+    parser.add_argument('files', nargs='*', help='файлы для объединения (по умолчанию все *.json из out)')
+    parser.add_argument('--policy', choices=MERGE_POLICIES, default=MERGE_POLICY,
+                        help='какую запись оставлять при расхождении данных по артикулу')
+    args = parser.parse_args()
+    paths = args.files or find_input_files()
+    if not paths:
+        print(f'Нет файлов для объединения в {JSON_FOLDER_PATH}')
+        sys.exit(1)
+    stats = merge_files(paths, policy=args.policy)
+    print(f"Файлов: {stats['files']}, записей: {stats['entries']}, товаров: {stats['products']}, "
+          f"дублей: {stats['duplicates']}, расхождений: {stats['conflicts']} ({CONFLICTS_FILE})")
+    print('Успешно!')
+
+
+if __name__ == '__main__':
+    main()
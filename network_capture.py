@@ -0,0 +1,293 @@
+"""
+Режим перехвата ответов API: данные товаров, цен, списков товаров каталога и пагинации берутся из JSON, который
+фронтенд сайта сам загружает фоном (XHR/fetch), а не из отрисованной страницы.
+
+NetworkCapture подписывается на page.on('response') и запоминает JSON-ответы, адрес которых подходит под
+API_URL_RE. Тела ответов читаются уже после загрузки страницы (payloads / payloads_async), поэтому обработчик
+события ничего не ждет и годится и для sync, и для async API Playwright. Перед каждым переходом - clear().
+
+Структура ответов API сайта не зафиксирована, поэтому разбор не привязан к конкретным адресам: в JSON ищутся
+объекты, похожие на товар (есть артикул и название, см. *_KEYS), и поля пагинации. Карточкой каталога считается
+только объект со ссылкой на страницу товара (PRODUCT_URL_PREFIX), а не пункт меню или подкаталог; товар страницы
+ищется по артикулу из ссылки, поле id сравнивается с артикулом, только если ссылки у объекта нет. Товар приводится к тому же
+"сырому" виду, что возвращает EXTRACT_PRODUCT_JS (product_extract.py), и дальше собирается как обычно.
+Если в ответах ничего не нашлось или у найденного товара нет названия или ненулевой цены, скрипт берет данные
+со страницы (прежний разбор DOM), а первые MAX_SAMPLES неразобранных ответов сохраняются в out/network_samples
+для настройки *_KEYS и API_URL_RE.
+
+Включается переменной окружения EUROPA_NETWORK_CAPTURE=1 (config.NETWORK_CAPTURE), используется в step2 и step3.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import threading
+from collections import Counter
+from urllib.parse import urljoin
+
+# Какие ответы слушать
+API_URL_RE = re.compile(r'/api/', re.IGNORECASE)
+RESOURCE_TYPES = ('xhr', 'fetch')
+# Сколько ждать первого ответа API после перехода на страницу, мс
+CAPTURE_WAIT_MS = 5000
+SAMPLES_DIR = os.path.join("out", "network_samples")
+MAX_SAMPLES = 20
+
+# Названия полей в ответах API (без учета регистра), по порядку предпочтения
+ID_KEYS = ('article', 'code', 'sku', 'xml_id', 'id')
+NAME_KEYS = ('name', 'title')
+URL_KEYS = ('url', 'link', 'href', 'path', 'slug')
+PRICE_KEYS = ('price', 'current_price', 'price_value', 'cost')
+IMAGE_KEYS = ('images', 'gallery', 'pictures', 'photos')
+IMAGE_URL_KEYS = ('url', 'src', 'original', 'big', 'path')
+PROPERTY_KEYS = ('properties', 'characteristics', 'params', 'attributes')
+PROPERTY_NAME_KEYS = ('name', 'title', 'key')
+PROPERTY_VALUE_KEYS = ('value', 'text', 'values')
+NUTRITION_KEYS = ('nutrition', 'nutritional_value', 'energy')
+DESCRIPTION_KEYS = ('description', 'detail_text', 'text')
+BRAND_KEYS = ('brand', 'brand_name', 'manufacturer')
+PAGE_COUNT_KEYS = ('last_page', 'lastpage', 'total_pages', 'totalpages', 'page_count', 'pagecount', 'pages')
+PRODUCT_URL_PREFIX = '/product/'
+
+
+def pick(obj: dict, keys: tuple[str, ...]):
+    """Значение первого найденного поля из keys (без учета регистра) или None"""
+    lowered = {str(key).lower(): value for key, value in obj.items()}
+    for key in keys:
+        value = lowered.get(key)
+        if value not in (None, '', [], {}):
+            return value
+    return None
+
+
+def as_text(value) -> str | None:
+    """Строка из значения поля; у вложенного объекта берется его название или значение"""
+    if isinstance(value, dict):
+        value = pick(value, NAME_KEYS + PROPERTY_VALUE_KEYS)
+    if isinstance(value, list):
+        value = ', '.join(filter(None, (as_text(item) for item in value)))
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    return str(value)
+
+
+def iter_objects(payload):
+    """Все словари JSON в глубину"""
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            yield node
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def is_product(obj: dict) -> bool:
+    return pick(obj, ID_KEYS) is not None and isinstance(pick(obj, NAME_KEYS), str) and \
+        (pick(obj, URL_KEYS) is not None or pick(obj, PRICE_KEYS) is not None)
+
+
+def find_products(payloads: list) -> list[dict]:
+    return [obj for payload in payloads for obj in iter_objects(payload) if is_product(obj)]
+
+
+def find_page_count(payloads: list) -> int | None:
+    for payload in payloads:
+        for obj in iter_objects(payload):
+            value = pick(obj, PAGE_COUNT_KEYS)
+            if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+                return value
+            if isinstance(value, str) and value.isdigit() and int(value) > 0:
+                return int(value)
+    return None
+
+
+def product_url(obj: dict, base_url: str) -> str | None:
+    """Полная ссылка на страницу товара или None, если ссылки нет или она ведет не на товар (меню, каталог)"""
+    url = as_text(pick(obj, URL_KEYS))
+    if not url or PRODUCT_URL_PREFIX not in url:
+        return None
+    return urljoin(base_url + '/', url)
+
+
+def url_article(url: str) -> str | None:
+    """Артикул по окончанию ссылки на товар, как в step2"""
+    match = re.search(r'-(\d+)/?$', url)
+    return match.group(1) if match else None
+
+
+def product_code(obj: dict, url: str | None) -> str:
+    """Артикул: по окончанию ссылки, а если ее нет - из поля артикула"""
+    return (url and url_article(url)) or str(pick(obj, ID_KEYS))
+
+
+def split_price(value) -> dict:
+    """Цена в виде {'priceInt', 'priceFrac'}, как у EXTRACT_PRICE_JS"""
+    if isinstance(value, dict):
+        value = pick(value, ('value', 'current', 'actual', 'price'))
+    if value is None:
+        return {'priceInt': None, 'priceFrac': None}
+    text = re.sub(r'[^\d.,]', '', str(value)).replace(',', '.')
+    if not re.search(r'\d', text):
+        return {'priceInt': None, 'priceFrac': None}
+    price_int, _, price_frac = text.partition('.')
+    return {'priceInt': price_int or '0', 'priceFrac': (price_frac + '00')[:2]}
+
+
+def has_name_and_price(raw: dict) -> bool:
+    """Есть ли в товаре из product_raw непустое название и ненулевая цена"""
+    if not (raw['name'] or '').strip() or raw['priceInt'] is None:
+        return False
+    return float(f"{raw['priceInt']}.{raw['priceFrac']}") > 0
+
+
+def product_raw(obj: dict) -> dict:
+    """Товар из ответа API в виде результата EXTRACT_PRODUCT_JS"""
+    params = []
+    description = as_text(pick(obj, DESCRIPTION_KEYS))
+    if description:
+        params.append(['Описание', description, False])
+    brand = as_text(pick(obj, BRAND_KEYS))
+    if brand:
+        params.append(['Бренд', brand, True])
+    properties = pick(obj, PROPERTY_KEYS) or []
+    if isinstance(properties, dict):
+        properties = [{'name': key, 'value': value} for key, value in properties.items()]
+    for prop in properties:
+        if isinstance(prop, dict):
+            key, value = as_text(pick(prop, PROPERTY_NAME_KEYS)), as_text(pick(prop, PROPERTY_VALUE_KEYS))
+            if key and value:
+                params.append([key, value, True])
+
+    nutrition = pick(obj, NUTRITION_KEYS) or []
+    if isinstance(nutrition, dict):
+        nutrition = [{'name': key, 'value': value} for key, value in nutrition.items()]
+    nutrition = [[as_text(pick(item, PROPERTY_NAME_KEYS)), as_text(pick(item, PROPERTY_VALUE_KEYS))]
+                 for item in nutrition if isinstance(item, dict)]
+
+    images = []
+    for image in pick(obj, IMAGE_KEYS) or []:
+        src = as_text(pick(image, IMAGE_URL_KEYS)) if isinstance(image, dict) else as_text(image)
+        if src:
+            images.append(src)
+
+    return dict(split_price(pick(obj, PRICE_KEYS)), name=as_text(pick(obj, NAME_KEYS)),
+                nutrition=[item for item in nutrition if all(item)], params=params, images=images)
+
+
+class NetworkCapture:
+    def __init__(self, samples_dir: str = SAMPLES_DIR):
+        self.samples_dir = samples_dir
+        self.responses = []
+        self.stats = Counter()
+        self._samples = 0
+        self._lock = threading.Lock()
+
+    def attach(self, page):
+        page.on('response', self.on_response)
+
+    def on_response(self, response):
+        """Обработчик page.on('response'): только запоминает подходящий ответ, тело читается позже"""
+        if response.request.resource_type not in RESOURCE_TYPES or not API_URL_RE.search(response.url):
+            return
+        if 'json' not in (response.headers.get('content-type') or ''):
+            return
+        self.responses.append(response)
+
+    def clear(self):
+        """Вызывается перед переходом на следующую страницу"""
+        self.responses = []
+
+    def payloads(self) -> list:
+        """JSON ответов API текущей страницы (синхронный Playwright)"""
+        result = []
+        for response in list(self.responses):
+            try:
+                result.append((response.url, response.json()))
+            except Exception:
+                self.stats['unreadable'] += 1
+        return result
+
+    async def payloads_async(self) -> list:
+        result = []
+        for response in list(self.responses):
+            try:
+                result.append((response.url, await response.json()))
+            except Exception:
+                self.stats['unreadable'] += 1
+        return result
+
+    def wait(self, page, timeout_ms: int = CAPTURE_WAIT_MS) -> bool:
+        """Ждет первого ответа API после перехода (синхронный Playwright). True, если ответ пришел."""
+        deadline = time.monotonic() + timeout_ms / 1000
+        while not self.responses and time.monotonic() < deadline:
+            page.wait_for_timeout(50)
+        return bool(self.responses)
+
+    async def wait_async(self, timeout_ms: int = CAPTURE_WAIT_MS) -> bool:
+        deadline = time.monotonic() + timeout_ms / 1000
+        while not self.responses and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return bool(self.responses)
+
+    def listing(self, payloads: list, base_url: str) -> tuple[list[tuple[str, str, str]], int | None]:
+        """Карточки каталога (артикул, название, ссылка) и число страниц каталога из ответов API"""
+        entries = {}
+        for obj in find_products([payload for _, payload in payloads]):
+            url = product_url(obj, base_url)
+            if url:
+                code = product_code(obj, url)
+                entries.setdefault(code, (code, as_text(pick(obj, NAME_KEYS)).strip(), url))
+        page_count = find_page_count([payload for _, payload in payloads])
+        self._count(payloads, bool(entries))
+        return list(entries.values()), page_count
+
+    def product(self, payloads: list, article: str) -> dict | None:
+        """Товар с артикулом article в виде результата EXTRACT_PRODUCT_JS или None"""
+        for obj in find_products([payload for _, payload in payloads]):
+            url = as_text(pick(obj, URL_KEYS))
+            # id в ответах API может быть внутренним номером (или id соседнего объекта), поэтому при наличии ссылки
+            # артикул берется только из нее
+            if url:
+                if PRODUCT_URL_PREFIX not in url or url_article(url) != article:
+                    continue
+            elif str(pick(obj, ID_KEYS)) != article:
+                continue
+            raw = product_raw(obj)
+            # Без названия или ненулевой цены товар не собрать (иначе в выгрузку попадут '-' и цена 0) -
+            # данные возьмутся со страницы
+            if not has_name_and_price(raw):
+                continue
+            self._count(payloads, True)
+            return raw
+        self._count(payloads, False)
+        return None
+
+    def _count(self, payloads: list, found: bool):
+        self.stats['api' if found else 'fallback'] += 1
+        if not found and payloads:
+            self._save_samples(payloads)
+
+    def _save_samples(self, payloads: list):
+        """Сохраняет неразобранные ответы для настройки разбора (не больше MAX_SAMPLES за запуск)"""
+        with self._lock:
+            if self._samples >= MAX_SAMPLES:
+                return
+            self._samples += 1
+            number = self._samples
+        os.makedirs(self.samples_dir, exist_ok=True)
+        path = os.path.join(self.samples_dir, f"{os.getpid()}_{number}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([{'url': url, 'payload': payload} for url, payload in payloads], f, ensure_ascii=False)
+
+    def summary(self) -> str:
+        return summarize_captures([self])
+
+
+def summarize_captures(captures: list[NetworkCapture]) -> str:
+    """Сколько страниц разобрано по ответам API и сколько - со страницы (по всем страницам браузера)"""
+    stats = sum((capture.stats for capture in captures), Counter())
+    return (f"из API: {stats['api']}, со страницы: {stats['fallback']}"
+            + (f", нечитаемых ответов: {stats['unreadable']}" if stats['unreadable'] else ''))
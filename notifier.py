@@ -0,0 +1,176 @@
+"""
+Отправка уведомлений в Telegram в фоновом потоке, чтобы цикл парсинга никогда не ждал сети.
+
+- notify() только кладет сообщение в ограниченную очередь (NOTIFY_QUEUE_SIZE); если очередь полна, сообщение
+  отбрасывается и учитывается в dropped;
+- первое сообщение отправляется сразу, а пришедшие в течение COALESCE_SECONDS после отправки объединяются
+  в одно сообщение;
+- при ошибке сети или ответе 429/5xx отправка повторяется с растущей паузой, но не дольше RETRY_DEADLINE_SECONDS;
+- при завершении процесса неотправленные сообщения дожидаются отправки (не дольше RETRY_DEADLINE_SECONDS).
+
+Адрес API задается config.TELEGRAM_API_URL (EUROPA_TELEGRAM_API), поэтому уведомления можно проверить на локальной
+заглушке: fake_europa_server.py принимает /bot<токен>/sendMessage и запоминает сообщения.
+"""
+import os
+import time
+import queue
+import socket
+import atexit
+import getpass
+import platform
+import threading
+import requests
+
+NOTIFY_QUEUE_SIZE = 100
+COALESCE_SECONDS = 5
+SEND_TIMEOUT = 10
+RETRY_DEADLINE_SECONDS = 60
+# Ограничение Telegram на длину одного сообщения
+TELEGRAM_MAX_LENGTH = 4096
+
+_STOP = object()
+
+
+def host_footer() -> str:
+    """Подпись с системой, компьютером и пользователем, откуда пришло сообщение"""
+    try:
+        user = os.getlogin()
+    except OSError:
+        user = getpass.getuser()
+    return f'\n\n---\n🖥️ {platform.system()}\n👤 {socket.gethostname()}\\{user}'
+
+
+def split_message(text: str, limit: int = TELEGRAM_MAX_LENGTH) -> list[str]:
+    """Делит длинный текст на части не длиннее limit, по возможности по переводам строк"""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        cut = cut if cut > 0 else limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    parts.append(text)
+    return parts
+
+
+class TelegramNotifier:
+    def __init__(self, bot_token: str, chat_id: str, api_url: str, footer: str = '',
+                 queue_size: int = NOTIFY_QUEUE_SIZE, coalesce_seconds: float = COALESCE_SECONDS,
+                 retry_deadline: float = RETRY_DEADLINE_SECONDS):
+        self.url = f'{api_url.rstrip("/")}/bot{bot_token}/sendMessage'
+        self.chat_id = chat_id
+        self.footer = footer
+        self.coalesce_seconds = coalesce_seconds
+        self.retry_deadline = retry_deadline
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._session = requests.Session()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_sent = 0.0
+
+    def notify(self, message: str):
+        """Ставит сообщение в очередь на отправку. Никогда не блокирует."""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='telegram-notifier', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _drain(self) -> list:
+        """Забирает все элементы, уже стоящие в очереди"""
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            # Сообщение сразу после недавней отправки ждет конца окна, чтобы уйти вместе с соседними
+            wait = self._last_sent + self.coalesce_seconds - time.monotonic()
+            if items[0] is not _STOP and wait > 0:
+                time.sleep(wait)
+            items += self._drain()
+            messages = [item for item in items if item is not _STOP]
+            if messages:
+                self._send('\n\n➖➖➖\n\n'.join(messages) + self.footer)
+                self._last_sent = time.monotonic()
+            for _ in items:
+                self._queue.task_done()
+            if len(messages) < len(items):
+                return
+
+    def _send(self, text: str):
+        deadline = time.monotonic() + self.retry_deadline
+        for part in split_message(text):
+            delay = 1.0
+            while True:
+                retry_after = None
+                try:
+                    response = self._session.post(self.url, data={'chat_id': self.chat_id, 'text': part},
+                                                  timeout=SEND_TIMEOUT)
+                    if response.status_code == 200:
+                        self.sent += 1
+                        break
+                    if response.status_code == 429:
+                        try:
+                            retry_after = response.json()['parameters']['retry_after']
+                        except (ValueError, KeyError, TypeError):
+                            retry_after = None
+                    elif response.status_code < 500:
+                        print(f'Telegram отклонил сообщение: {response.status_code} {response.text[:200]}')
+                        self.failed += 1
+                        break
+                except requests.RequestException as e:
+                    print(f'Ошибка отправки в Telegram: {e}')
+                pause = retry_after if retry_after is not None else delay
+                if time.monotonic() + pause > deadline:
+                    print('Сообщение в Telegram не отправлено: истекло время на повторы')
+                    self.failed += 1
+                    return
+                time.sleep(pause)
+                delay = min(delay * 2, 30)
+
+    def flush(self, timeout: float = RETRY_DEADLINE_SECONDS) -> bool:
+        """Ждет, пока очередь опустеет (например, перед выходом из скрипта). Возвращает True, если успела."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.1)
+        return not self._queue.unfinished_tasks
+
+    def close(self, timeout: float | None = None):
+        """Отправляет оставшиеся сообщения и останавливает поток."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=1)
+        except queue.Full:
+            return
+        self._thread.join(self.retry_deadline + self.coalesce_seconds if timeout is None else timeout)
+
+
+_notifiers = {}
+_notifiers_lock = threading.Lock()
+
+
+def get_notifier(bot_token: str, chat_id: str, api_url: str | None = None) -> TelegramNotifier:
+    """Общий уведомитель процесса для пары бот/чат"""
+    if api_url is None:
+        from config import TELEGRAM_API_URL
+        api_url = TELEGRAM_API_URL
+    key = (bot_token, chat_id, api_url)
+    with _notifiers_lock:
+        if key not in _notifiers:
+            _notifiers[key] = TelegramNotifier(bot_token, chat_id, api_url, footer=host_footer())
+        return _notifiers[key]
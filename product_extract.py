@@ -0,0 +1,135 @@
+"""
+Извлечение данных товара со страницы europa-market.ru за один вызов page.evaluate.
+
+EXTRACT_PRODUCT_JS выполняется внутри страницы и возвращает "сырые" тексты (цена, название, характеристики,
+ссылки на изображения) одним объектом, вместо десятков отдельных запросов count()/text_content()/get_attribute()
+к браузеру. build_product_record собирает из них словарь товара в прежнем формате parse_product_page.
+
+Скрипт годится и для sync, и для async API Playwright: page.evaluate(EXTRACT_PRODUCT_JS).
+Сравнение скорости с извлечением через локаторы: bench_parse_product.py
+
+CLASSIFY_PAGE_JS определяет состояние страницы (товар с ценой, 404, нет в наличии, DDoS-Guard) и предназначен
+для page.wait_for_function: возвращает null, пока ни одно состояние не определилось, поэтому ожидание
+заканчивается, как только появится любое из них. "Нет в наличии" определяется сразу по явной надписи
+(OUT_OF_STOCK_TEXTS), а без нее - только если блок цены не появился за время ожидания (аргумент outOfStockGraceMs):
+поздно отрисованная цена не должна превращаться в отсутствующий товар.
+"""
+
+# Состояния страницы товара
+PAGE_PRODUCT = 'product'
+PAGE_NOT_FOUND = 'not_found'
+PAGE_OUT_OF_STOCK = 'out_of_stock'
+PAGE_DDOS = 'ddos'
+
+# Значения поля stock в словаре товара
+STOCK_AVAILABLE = "В наличии"
+STOCK_OUT_OF_STOCK = "Нет в наличии"
+STOCK_NOT_FOUND = "Товар не найден"
+
+# Надписи об отсутствии товара на странице товара (в нижнем регистре)
+OUT_OF_STOCK_TEXTS = ('нет в наличии', 'товар закончился', 'нет в продаже')
+
+CLASSIFY_PAGE_JS = """
+(outOfStockGraceMs) => {
+    if (document.title.toLowerCase().includes('ddos')) return 'ddos';
+    for (const heading of document.querySelectorAll('h1, h2, h3, h4, h5, h6, [role="heading"]')) {
+        if (heading.textContent.trim() === 'Товар не найден') return 'not_found';
+    }
+    if (document.querySelector('.product-cart')) return 'product';
+    if (document.readyState === 'complete' && document.querySelector('.product-title__name')) {
+        // Нет в наличии: явная надпись - сразу, без нее - если блок цены не появился за outOfStockGraceMs
+        const text = document.body.innerText.toLowerCase();
+        if (""" + repr(list(OUT_OF_STOCK_TEXTS)) + """.some(marker => text.includes(marker))) return 'out_of_stock';
+        window.__noCartSince = window.__noCartSince || performance.now();
+        if (performance.now() - window.__noCartSince >= outOfStockGraceMs) return 'out_of_stock';
+    }
+    return null;
+}
+"""
+
+# Только цена - для обновления цен уже собранных товаров
+EXTRACT_PRICE_JS = """
+() => {
+    const cart = document.querySelector('.product-cart');
+    const intEl = cart ? cart.querySelector('.product-cart__price-int') : null;
+    const fracEl = cart ? cart.querySelector('.product-cart__price-frac span') : null;
+    return {priceInt: intEl ? intEl.textContent : null, priceFrac: fracEl ? fracEl.textContent : null};
+}
+"""
+
+EXTRACT_PRODUCT_JS = """
+() => {
+    const text = (root, selector) => {
+        const el = root ? root.querySelector(selector) : null;
+        return el ? el.textContent : null;
+    };
+    const cart = document.querySelector('.product-cart');
+
+    const nutrition = [];
+    for (const item of document.querySelectorAll('.product-info__nutrition-item')) {
+        const key = text(item, '.product-info__nutrition-name');
+        const value = text(item, '.product-info__nutrition-value');
+        if (key !== null && value !== null) nutrition.push([key, value]);
+    }
+
+    const params = [];
+    for (const container of document.querySelectorAll('.product-info__params')) {
+        for (const block of container.querySelectorAll(':scope > div')) {
+            const inColumns = block.classList.contains('product-info__params-block--columns');
+            const items = inColumns ? block.querySelectorAll('.product-info__params-item') : [block];
+            for (const item of items) {
+                const key = text(item, '.product-info__params-name');
+                const value = text(item, '.product-info__params-value');
+                if (key !== null && value !== null) params.push([key, value, inColumns]);
+            }
+        }
+    }
+
+    const images = [];
+    for (const img of document.querySelectorAll('.product-image__image-slider img')) {
+        const src = img.getAttribute('src');
+        if (src) images.push(src);
+    }
+
+    return {
+        priceInt: text(cart, '.product-cart__price-int'),
+        priceFrac: text(cart, '.product-cart__price-frac span'),
+        name: text(document, '.product-title__name'),
+        nutrition: nutrition,
+        params: params,
+        images: images,
+    };
+}
+"""
+
+
+def build_price(raw: dict) -> float:
+    """Цена из результата EXTRACT_PRODUCT_JS или EXTRACT_PRICE_JS."""
+    price_int = raw['priceInt'] if raw['priceInt'] is not None else '0'
+    price_frac = raw['priceFrac'] if raw['priceFrac'] is not None else '00'
+    return float(f"{price_int}.{price_frac}")
+
+
+def build_product_record(raw: dict, product_url: str) -> dict:
+    """Собирает словарь товара из результата EXTRACT_PRODUCT_JS."""
+    price = build_price(raw)
+
+    name = raw['name'].strip() if raw['name'] is not None else '-'
+
+    description = '-'
+    characteristics_dict = {}
+    for key, value in raw['nutrition']:
+        characteristics_dict[key.strip()] = value.strip()
+    for key, value, in_columns in raw['params']:
+        key, value = key.strip(), value.strip()
+        if not in_columns and 'описание' in key.lower():
+            description = value
+        else:
+            characteristics_dict[key] = value
+
+    image_links = [src.split('?')[0] for src in raw['images']]
+
+    return {
+        'name': name, 'price': price, 'stock': STOCK_AVAILABLE, 'description': description,
+        'characteristics': characteristics_dict, 'img_url': image_links, 'art_url': product_url
+    }
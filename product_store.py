@@ -0,0 +1,159 @@
+"""
+Хранилище собранных товаров: основной файл out/data.json (словарь артикул -> данные товара) и журнал дозаписи
+out/data.jsonl, в который каждый новый товар добавляется одной строкой сразу после парсинга.
+
+Журнал позволяет не перезаписывать весь data.json после каждого товара. При загрузке data.json дополняется
+записями из журнала, при уплотнении (compact) журнал сливается в data.json и очищается. При аварийном
+завершении теряется не более последней (недописанной) строки журнала.
+
+Уплотнить вручную: python product_store.py [путь к data.json]
+
+Для выгрузок большого data.json есть iter_products: товары читаются потоком, без загрузки всего файла в память -
+границы записей находятся разбором верхнего уровня по mmap (json_scan.py, как в merge_dicts.py), и в память
+разбирается по одной записи.
+"""
+import os
+import re
+import sys
+import json
+import mmap
+from colorama import Fore, Style
+
+from json_scan import iter_entries
+
+OUTPUT_JSON_FILE = os.path.join("out", "data.json")
+
+
+def get_article_from_url(url: str) -> str | None:
+    """Артикул товара по окончанию ссылки: .../product/nazvanie-123456 -> 123456"""
+    match = re.search(r'-(\d+)$', url)
+    return match.group(1) if match else None
+
+
+def log_path_for(json_path: str) -> str:
+    """Возвращает путь к журналу дозаписи для JSON-файла: out/data.json -> out/data.jsonl"""
+    return os.path.splitext(json_path)[0] + '.jsonl'
+
+
+def iter_products(json_path: str, log_path: str | None = None):
+    """
+    Перебирает пары (артикул, данные товара) из data.json и журнала дозаписи, не загружая data.json целиком.
+    Записи журнала перекрывают записи data.json. В памяти держится только журнал (он сливается в data.json в конце
+    каждого запуска step3, поэтому обычно пуст или невелик).
+    """
+    log_path = log_path or log_path_for(json_path)
+    from_log = ProductStore(json_path, log_path)
+    from_log._replay_log()
+
+    if os.path.exists(json_path) and os.path.getsize(json_path):
+        with open(json_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for article, start, end in iter_entries(data):
+                if article not in from_log.data:
+                    yield article, json.loads(data[start:end])
+    yield from from_log.data.items()
+
+
+class ProductStore:
+    """Словарь товаров с журналом дозаписи. Поддерживает `in`, len(), get() и items() как обычный dict."""
+
+    def __init__(self, json_path: str, log_path: str | None = None):
+        self.json_path = json_path
+        self.log_path = log_path or log_path_for(json_path)
+        self.data = {}
+        self._log_file = None
+
+    def __contains__(self, article: str) -> bool:
+        return article in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def get(self, article: str, default=None):
+        return self.data.get(article, default)
+
+    def items(self):
+        return self.data.items()
+
+    def values(self):
+        return self.data.values()
+
+    def load(self) -> 'ProductStore':
+        """Загружает data.json и применяет поверх него записи из журнала."""
+        dirname = os.path.dirname(self.json_path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        if os.path.exists(self.json_path):
+            try:
+                with open(self.json_path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except json.JSONDecodeError:
+                print(Fore.YELLOW + f"ПРЕДУПРЕЖДЕНИЕ: JSON-файл {self.json_path} поврежден. Начинаем с нуля.")
+                self.data = {}
+        replayed = self._replay_log()
+        print(f"Загружено {Fore.GREEN}{len(self.data)}{Style.RESET_ALL} уже собранных товаров "
+              f"(из журнала: {replayed}).")
+        return self
+
+    def _replay_log(self) -> int:
+        if not os.path.exists(self.log_path):
+            return 0
+        replayed = 0
+        with open(self.log_path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    self.data[entry['article']] = entry['record']
+                    replayed += 1
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    # Недописанная строка после аварийного завершения - пропускаем
+                    print(Fore.YELLOW + f"ПРЕДУПРЕЖДЕНИЕ: пропущена поврежденная строка {line_no} журнала "
+                                        f"{self.log_path}.")
+        return replayed
+
+    def put(self, article: str, record: dict):
+        """Сохраняет товар: в память и одной строкой в журнал (с принудительной записью на диск)."""
+        self.data[article] = record
+        if self._log_file is None:
+            self._log_file = self._open_log()
+        self._log_file.write(json.dumps({'article': article, 'record': record}, ensure_ascii=False) + '\n')
+        self._log_file.flush()
+        os.fsync(self._log_file.fileno())
+
+    def _open_log(self):
+        """Открывает журнал на дозапись. Если последняя строка оборвана при аварии - начинаем с новой строки."""
+        needs_newline = False
+        if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > 0:
+            with open(self.log_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        log_file = open(self.log_path, 'a', encoding='utf-8')
+        if needs_newline:
+            log_file.write('\n')
+        return log_file
+
+    def compact(self):
+        """Сливает журнал в data.json (через временный файл) и очищает журнал."""
+        self.close()
+        tmp_path = self.json_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.json_path)
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+    def close(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else OUTPUT_JSON_FILE
+    store = ProductStore(path).load()
+    store.compact()
+    print(Fore.GREEN + f"Журнал слит в {path}, товаров: {len(store)}")
@@ -0,0 +1,91 @@
+"""
+Адаптивное ограничение частоты запросов к сайту, общее для всех скриптов (step2, step3, ArtsToProductLinks)
+и для нескольких одновременных воркеров.
+
+Перед каждым переходом на страницу скрипт ждет свой слот: wait() для sync-кода, wait_async() для asyncio.
+Слоты выдаются с текущей частотой rate (запросов в минуту) на всех воркеров вместе, с небольшим случайным разбросом.
+После каждого запроса скрипт сообщает результат:
+- record_success(latency) - частота понемногу растет (до max_rate), пока ответы здоровые;
+- record_ddos() - частота резко падает и все слоты откладываются на ddos_pause секунд;
+- record_error() / record_crash() - частота снижается;
+- всплеск задержки (latency заметно выше средней) тоже снижает частоту.
+Текущая частота и счетчики доступны через rate, counters и summary().
+"""
+import time
+import random
+import asyncio
+import threading
+from collections import Counter
+
+
+class RateLimiter:
+    def __init__(self, start_rate: float, min_rate: float, max_rate: float, ddos_pause: float = 60,
+                 increase_step: float = 0.5, jitter: float = 0.2):
+        self.rate = start_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.ddos_pause = ddos_pause
+        self.increase_step = increase_step
+        self.jitter = jitter
+        self.counters = Counter()
+        self.avg_latency = None
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def _take_slot(self) -> float:
+        """Резервирует следующий слот и возвращает, сколько секунд до него ждать."""
+        # Блокировка - для вызова wait() из нескольких потоков (загрузка изображений, image_cache.py)
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            interval = 60 / self.rate
+            self._next_slot = slot + interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            self.counters['requests'] += 1
+            return slot - now
+
+    def wait(self) -> float:
+        """Ждет следующий слот (sync). Возвращает время ожидания в секундах."""
+        delay = self._take_slot()
+        time.sleep(delay)
+        return delay
+
+    async def wait_async(self) -> float:
+        """Ждет следующий слот (asyncio). Слот резервируется без await, поэтому блокировка не нужна."""
+        delay = self._take_slot()
+        await asyncio.sleep(delay)
+        return delay
+
+    def pause(self, seconds: float):
+        """Откладывает все следующие слоты минимум на seconds секунд."""
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+    def _slow_down(self, factor: float):
+        self.rate = max(self.min_rate, self.rate * factor)
+
+    def record_success(self, latency: float):
+        """Успешный ответ за latency секунд: повышаем частоту, если задержка не выросла скачком."""
+        self.counters['success'] += 1
+        if self.avg_latency is not None and latency > max(3.0, self.avg_latency * 2.5):
+            self.counters['latency_spikes'] += 1
+            self._slow_down(0.7)
+        else:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+        self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+
+    def record_ddos(self):
+        self.counters['ddos'] += 1
+        self._slow_down(0.5)
+        self.pause(self.ddos_pause)
+
+    def record_error(self):
+        self.counters['errors'] += 1
+        self._slow_down(0.8)
+
+    def record_crash(self):
+        self.counters['crashes'] += 1
+        self._slow_down(0.5)
+
+    def summary(self) -> str:
+        return (f"{self.rate:.1f} запр/мин, запросов: {self.counters['requests']}, "
+                f"DDoS: {self.counters['ddos']}, ошибок: {self.counters['errors']}, "
+                f"падений: {self.counters['crashes']}, всплесков задержки: {self.counters['latency_spikes']}")
@@ -1,12 +1,15 @@
 """
-Скрипт загружает HTML https://europa-market.ru/ и извлекает все каталоги в файл, кроме тех, что в in/bad_catalogs.txt
+Скрипт загружает HTML главной страницы сайта (config.BASE_URL) и извлекает все каталоги в файл, кроме тех, что в in/bad_catalogs.txt
+(см. exclusion_rules.py)
 """
 
 import requests
 from bs4 import BeautifulSoup
 
-with open('in/bad_catalogs.txt', 'r', encoding='utf-8') as file:
-    bad_catalogs = [f'{line}'.rstrip() for line in file]
+from config import BASE_URL
+from exclusion_rules import ExclusionRules
+
+exclusion_rules = ExclusionRules.load()
 
 
 def extract_catalog_links(url, output_file):
@@ -21,16 +24,17 @@ def extract_catalog_links(url, output_file):
         print("Блок catalog-list-wrapper не найден")
         return
 
-    links = ['https://europa-market.ru' + a['href'] for a in catalog_div.find_all('a', href=True) if
-             'https://europa-market.ru' + a['href'] not in bad_catalogs]
+    links = [BASE_URL + a['href'] for a in catalog_div.find_all('a', href=True) if
+             not exclusion_rules.exclude_catalog(a['href'])]
 
     with open(output_file, 'w', encoding='utf-8') as file:
         file.write('\n'.join(links))
 
     print(f"Ссылки сохранены в {output_file}")
+    print(f"Исключенные каталоги:\n{exclusion_rules.summary()}")
 
 
 # Пример использования
-url = "https://europa-market.ru/"  # Замените на нужный URL
+url = f"{BASE_URL}/"  # Замените на нужный URL
 output_file = "out/catalog_links.txt"
 extract_catalog_links(url, output_file)
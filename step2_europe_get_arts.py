@@ -2,6 +2,25 @@
 имеющихся страниц в файл out/url_list_product.txt с учетом цены или без. Остатки приблизительны. Количество товаров
 может зависеть от адреса магазина до 2 раз.
 Особенность: исключить брэнд Собственное производство
+Каталоги из in/bad_catalogs.txt не обходятся, карточки брендов из in/bad_brand.txt (по названию товара) не попадают
+в индекс, поэтому step3 их не загружает (см. exclusion_rules.py).
+Паузы между запросами подстраиваются под ответы сайта (см. rate_limiter.py), вместо фиксированных 5-60 с.
+
+Каталоги обходятся параллельно CATALOG_WORKERS страницами одного браузера. Количество страниц каталога
+определяется один раз по пагинации на первой странице, остальные страницы открываются напрямую по адресу
+(?page=N), поэтому не важно, сколько товаров выводится на странице.
+
+Товары собираются в индекс по артикулу без повторов (см. catalog_index.py). В конце обхода out/url_list_product.txt
+перезаписывается списком из индекса, а разница с прошлым обходом (новые, удаленные и переименованные товары)
+сохраняется в out/catalog_diff.json. Ссылки только на новые товары - в out/new_product_urls.txt, их и нужно
+передавать в step3.
+
+Если включен config.NETWORK_CAPTURE, ссылки и названия товаров и число страниц каталога берутся из JSON-ответов API,
+которые загружает сама страница (см. network_capture.py), без ожидания отрисовки карточек. Если в ответах
+ничего не нашлось, страница разбирается как обычно.
+
+Время загрузки, ожидания карточек и сбора ссылок по каждой странице каталога пишется в out/metrics
+(см. crawl_metrics.py), сводка выводится в конце обхода.
 
 **************************************************
 Как получить список новых товаров для выгрузки?
@@ -10,20 +29,59 @@
 3. Собираем в одном месте все ссылки на товары с нежелательным брендом.
 4. Собираем в одном месте все ссылки на товары, которые не стали грузить (например, хлеб)
 5. Вы читаем из п.2 ссылки из пунктов 1, 3 и 4.
-
-ДОРАБОТКА:
-- Если в каталоге 60 товаров, то будет ошибка, т.к. не перейдет на 2 страницу (наверное)
 """
 
 import time
+import asyncio
 import datetime
-from playwright.sync_api import Playwright, sync_playwright, expect
+from playwright.async_api import async_playwright, TimeoutError
 import traceback
 from tqdm import tqdm
 
-from config import send_logs_to_telegram, bcolors
+from config import send_logs_to_telegram, bcolors, BASE_URL, HEADLESS, NETWORK_CAPTURE, RATE_LIMIT
+from crawl_metrics import CrawlMetrics
+from exclusion_rules import ExclusionRules
+from network_capture import NetworkCapture, summarize_captures
+from catalog_index import CatalogIndex, save_crawl_results, NEW_URLS_FILE
+from city_session import load_session_state, save_session_state_async, set_city_async
+from rate_limiter import RateLimiter
 
 ADDRESS_SHOP = 'Брянск-58, ул. Горбатова, 18'
+SHOP_INDEX = '241001'
+# Частота запросов в минуту (на все страницы вместе): начальная, минимальная, максимальная
+REQUESTS_PER_MINUTE = RATE_LIMIT or (6, 1, 20)
+DDOS_PAUSE_SECONDS = 60
+MAX_RETRIES = 3
+# Сколько ждать появления карточек товаров (или страницы DDoS-Guard) на странице каталога, мс
+CARDS_TIMEOUT = 15000
+# Сколько страниц каталогов загружается одновременно
+CATALOG_WORKERS = 4
+
+# Ссылки и названия всех карточек товаров на странице каталога
+CARDS_JS = """
+() => [...document.querySelectorAll('.card-product-content__title')]
+    .map(el => [el.getAttribute('href'), el.textContent])
+"""
+
+# Состояние страницы каталога: 'ddos', 'cards' или null, пока не ясно (как CLASSIFY_PAGE_JS в step3)
+CATALOG_STATE_JS = """
+() => {
+    if (document.title.toLowerCase().includes('ddos')) return 'ddos';
+    if (document.querySelector('.card-product-content__title')) return 'cards';
+    return null;
+}
+"""
+
+# Номер последней страницы по пагинации (1, если пагинации нет)
+PAGE_COUNT_JS = """
+() => {
+    const numbers = [...document.querySelectorAll('.ui-pagination__pagination *')]
+        .filter(el => el.children.length === 0)
+        .map(el => parseInt(el.textContent.trim(), 10))
+        .filter(n => !isNaN(n));
+    return numbers.length ? Math.max(...numbers) : 1;
+}
+"""
 
 
 def read_catalogs_from_txt():
@@ -33,11 +91,12 @@ def read_catalogs_from_txt():
     return catalogs
 
 
-def add_to_txt_file_url_product(urls):
-    with open('out/url_list_product.txt', 'a') as output:
-        # print('Добавляю в файл out/url_list_product.txt')
-        for row in urls:
-            output.write(str(f'{row}') + '\n')
+def catalog_page_url(catalog, page_number):
+    """Адрес страницы каталога с номером page_number"""
+    if page_number == 1:
+        return catalog
+    separator = '&' if '?' in catalog else '?'
+    return f'{catalog}{separator}page={page_number}'
 
 
 class Europa:
@@ -47,52 +106,45 @@ class Europa:
     context = None
 
     def __init__(self, playwright):
-        self.catalogs = read_catalogs_from_txt()
-        self.set_playwright_config(playwright=playwright)
-        self.click = 1
+        self.exclusion_rules = ExclusionRules.load()
+        self.catalogs = [catalog for catalog in read_catalogs_from_txt()
+                         if not self.exclusion_rules.exclude_catalog(catalog)]
+        self.playwright = playwright
+        self.limiter = RateLimiter(*REQUESTS_PER_MINUTE, ddos_pause=DDOS_PAUSE_SECONDS)
+        self.queue = asyncio.Queue()
+        self.pbar = None
+        self.session_state = None
+        self.index = CatalogIndex()
+        self.crawled_catalogs = set()
+        self.failed_catalogs = set()
+        self.metrics = CrawlMetrics('step2')
+        self.captures = []
 
-    def set_playwright_config(self, playwright):
+    async def set_playwright_config(self):
         js = """
         Object.defineProperties(navigator, {webdriver:{get:()=>undefined}});
         """
-        self.playwright = playwright
-        self.browser = playwright.chromium.launch(headless=False, args=['--blink-settings=imagesEnabled=false'])
-        self.context = self.browser.new_context()
-        self.page = self.context.new_page()
-        self.page.add_init_script(js)
+        self.browser = await self.playwright.chromium.launch(headless=HEADLESS,
+                                                             args=['--blink-settings=imagesEnabled=false'])
+        self.session_state = load_session_state(SHOP_INDEX)
+        self.context = await self.browser.new_context(storage_state=self.session_state)
+        await self.context.add_init_script(js)
+        self.page = await self.context.new_page()
 
-    def set_city(self):
+    async def set_city(self):
+        """Устанавливает город и магазин, если нет сохраненной сессии магазина (см. city_session.py)"""
+        if self.session_state:
+            print(f'Используется сохраненная сессия магазина: {self.session_state}')
+            return
         try:
             print('Устанавливаем город')
-            self.page.goto("https://europa-market.ru/")
-            self.page.get_by_role("button", name="Нет, выбрать другой").click()
-            self.page.get_by_role("link", name="Брянск").click()
-            time.sleep(10)
-            self.page.get_by_role("button", name="Адрес доставки").click()
-            self.page.get_by_text("Самовывоз").click()
-            self.page.get_by_placeholder("Выберите магазин из списка").click()
-            self.page.get_by_role("option", name="Брянск-58, ул. Горбатова,").click()
-            self.page.get_by_role("button", name="Готово").click()
+            await set_city_async(self.page, BASE_URL, SHOP_INDEX)
             print(f'Успешно установлен адрес: {ADDRESS_SHOP}')
-            time.sleep(10)
+            self.session_state = await save_session_state_async(self.context, SHOP_INDEX)
         except Exception as exp:
             print(exp)
             print(traceback.format_exc())
 
-    def view60(self):
-        """Делаем вывод товаров по 60 шт на странице"""
-        self.page.goto('https://europa-market.ru/catalog/sobstvennaya-torgovaya-marka-3')
-        self.page.wait_for_load_state('load')
-        time.sleep(5)
-        print(
-            f'{bcolors.OKGREEN}Установите вывод товаров по 60 шт вручную, затем в инспекторе нажмите продолжить{bcolors.ENDC}')
-        self.page.pause()
-        # self.page.get_by_role("button", name="Выводить по 24").click()
-        # time.sleep(10)
-        # self.page.get_by_role("button", name="Выводить по 60").click()
-        # print('Сейчас должен быть вывод по 60, если нет, можно включить вручную, есть 10 сек')
-        # time.sleep(10)
-
     def check_ddos(self, title):
         """Проверяем, сработала ли DDOS защита, т.е. смотрим текст, что в заголовке"""
         if title == 'DDoS-Guard':
@@ -100,67 +152,182 @@ class Europa:
         else:
             return False
 
-    def get_urls_from_page(self):
-        # Извлечение ссылок на товары
-        products = self.page.query_selector_all('.card-product-content__title')
-        # Сохранение ссылок в списке
-        links = [link.get_attribute('href') for link in products]
-        # Сохранение имен в списке
-        names = [name.text_content() for name in products]
-        codes = [link.split('-')[-1] for link in links]
-        if len(links) != len(names):
-            input('ОШИБКА! Количество имен и ссылок на странице не совпадают')
-        # Объединение имен, ссылок и кодов с табуляцией
-        combined_data = [f"e_{code}\t{name.strip()}\thttps://europa-market.ru{link}" for code, name, link in
-                         zip(codes, names, links)]
-        add_to_txt_file_url_product(combined_data)
-        return len(links)
-
-    def paginator(self):
-        """Пролистываем страницы, пока на странице не будет менее 60 товаров."""
-        len_links = self.get_urls_from_page()
-        if len_links <= 60:
+    def add_card(self, catalog, code, name, url):
+        # Карточка нежелательного бренда: страница товара в step3 не понадобится
+        if self.exclusion_rules.exclude_name(name, code):
             return
-        else:
-            self.page.locator(".ui-pagination__pagination > div:nth-child(3) > .icon").click()
-            self.click += 1
-            print(f'Прогружается страница: {self.click}')
-            time.sleep(5)
-            self.paginator()
-
-    def get_arts_from_catalogs(self):
-        for catalog in tqdm(self.catalogs):
-            print(f'Работаю с каталогом: {catalog}')
-            self.page.goto(catalog)
-            time.sleep(10)
-            if self.check_ddos(title=self.page.title()):
-                print(f'{bcolors.FAIL}DDOS. Ждем 60 с{bcolors.ENDC}')
-                time.sleep(60)
-                self.page.goto(catalog)
-            # self.view60()
-            self.click = 1
-            self.paginator()
-
-    def start(self):
-        self.set_city()
-        self.view60()
-        self.get_arts_from_catalogs()
+        self.index.add(code=code, name=name.strip(), url=url, catalog=catalog)
+
+    async def get_urls_from_page(self, page, catalog, capture=None):
+        """Добавляет товары страницы каталога в индекс. Возвращает (число карточек, число страниц каталога или None,
+        если его нужно взять из пагинации)."""
+        if capture is not None:
+            entries, page_count = capture.listing(await capture.payloads_async(), BASE_URL)
+            if entries:
+                for code, name, url in entries:
+                    self.add_card(catalog, code, name, url)
+                return len(entries), page_count
+            await self.wait_for_catalog(page)
+        # Извлечение ссылок и имен товаров за один запрос к странице
+        cards = await page.evaluate(CARDS_JS)
+        links = [link for link, _ in cards if link]
+        names = [name for link, name in cards if link]
+        for name, link in zip(names, links):
+            self.add_card(catalog, link.split('-')[-1], name, f'{BASE_URL}{link}')
+        return len(links), None
+
+    async def wait_for_catalog(self, page):
+        """Одним ожиданием ждем карточек товаров или страницы DDoS-Guard вместо фиксированной паузы.
+        Возвращает 'ddos', 'cards' или None, если за CARDS_TIMEOUT не появилось ни то, ни другое."""
+        try:
+            handle = await page.wait_for_function(CATALOG_STATE_JS, polling=100, timeout=CARDS_TIMEOUT)
+            return await handle.json_value()
+        except TimeoutError:
+            return None
+
+    async def open_catalog_page(self, page, url, timer, capture=None):
+        """Открываем страницу каталога с учетом частоты запросов. При DDoS-Guard частота снижается и делается повтор,
+        страница, на которой за CARDS_TIMEOUT не появилось ни карточек, ни DDoS-Guard, повторяется как ошибка загрузки."""
+        for attempt in range(MAX_RETRIES):
+            with timer.phase('sleep'):
+                await self.limiter.wait_async()
+            timer.attempt()
+            started = time.perf_counter()
+            if capture is not None:
+                capture.clear()
+            try:
+                with timer.phase('navigation'):
+                    await page.goto(url)
+            except TimeoutError:
+                self.limiter.record_error()
+                continue
+            with timer.phase('classification'):
+                # В режиме перехвата ждем ответа API, а не отрисовки карточек
+                if capture is None or not await capture.wait_async():
+                    state = await self.wait_for_catalog(page)
+                else:
+                    state = 'ddos' if self.check_ddos(title=await page.title()) else 'api'
+            if state is None:
+                print(f'{bcolors.WARNING}Карточки не появились за {CARDS_TIMEOUT / 1000:.0f} с: {url}{bcolors.ENDC}')
+                self.limiter.record_error()
+                continue
+            if state == 'ddos':
+                print(f'{bcolors.FAIL}DDOS. Снижаем частоту запросов: {self.limiter.summary()}{bcolors.ENDC}')
+                self.limiter.record_ddos()
+                timer.mark_ddos()
+                continue
+            self.limiter.record_success(time.perf_counter() - started)
+            return True
+        return False
+
+    async def crawl_catalog_page(self, page, catalog, page_number, capture=None):
+        """Собирает ссылки со страницы каталога. С первой страницы ставит в очередь остальные страницы каталога."""
+        url = catalog_page_url(catalog, page_number)
+        timer = self.metrics.start(url)
+        if not await self.open_catalog_page(page, url, timer, capture):
+            print(f'{bcolors.FAIL}Страница не загружена после {MAX_RETRIES} попыток: {url}{bcolors.ENDC}')
+            self.failed_catalogs.add(catalog)
+            timer.finish('failed')
+            return
+        with timer.phase('extraction'):
+            count, page_count = await self.get_urls_from_page(page, catalog, capture)
+        # Страница без карточек: состояние неизвестно, и каталог нельзя считать обойденным - иначе все его товары
+        # из прошлого индекса попали бы в удаленные
+        if not count:
+            print(f'{bcolors.FAIL}На странице нет карточек товаров: {url}{bcolors.ENDC}')
+            self.failed_catalogs.add(catalog)
+            timer.finish('empty')
+            return
+        with timer.phase('extraction'):
+            if page_number == 1 and not page_count:
+                # В режиме перехвата карточки могли еще не отрисоваться, и без пагинации вышла бы одна страница
+                if capture is not None:
+                    await self.wait_for_catalog(page)
+                page_count = await page.evaluate(PAGE_COUNT_JS)
+        if page_number == 1:
+            self.crawled_catalogs.add(catalog)
+            for number in range(2, page_count + 1):
+                self.queue.put_nowait((catalog, number))
+            self.pbar.total += page_count - 1
+            self.pbar.refresh()
+        timer.finish('ok')
+
+    async def new_worker_page(self, capture):
+        page = await self.context.new_page()
+        if capture is not None:
+            capture.attach(page)
+        return page
+
+    async def worker(self):
+        capture = NetworkCapture() if NETWORK_CAPTURE else None
+        if capture is not None:
+            self.captures.append(capture)
+        page = await self.new_worker_page(capture)
+        while True:
+            catalog, page_number = await self.queue.get()
+            try:
+                await self.crawl_catalog_page(page, catalog, page_number, capture)
+            except Exception as exp:
+                print(f'{bcolors.FAIL}Ошибка на странице {page_number} каталога {catalog}: {exp}{bcolors.ENDC}')
+                self.failed_catalogs.add(catalog)
+                if page.is_closed():
+                    page = await self.new_worker_page(capture)
+            finally:
+                self.pbar.update(1)
+                self.queue.task_done()
+
+    async def get_arts_from_catalogs(self):
+        for catalog in self.catalogs:
+            self.queue.put_nowait((catalog, 1))
+        with tqdm(total=len(self.catalogs), desc='Страницы каталогов', unit='стр') as self.pbar:
+            workers = [asyncio.create_task(self.worker()) for _ in range(CATALOG_WORKERS)]
+            await self.queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        print(f'Частота запросов: {self.limiter.summary()}')
+        self.metrics.close()
+        print(f'Замеры ({self.metrics.path}):\n{self.metrics.report()}')
+        print(f'Исключения:\n{self.exclusion_rules.summary()}')
+        if self.captures:
+            print(f'Перехват API: {summarize_captures(self.captures)}')
+
+    def save_index(self):
+        """Сохраняет индекс и разницу с прошлым обходом. Удаленными считаются только товары полностью обойденных
+        каталогов."""
+        diff = save_crawl_results(self.index, self.crawled_catalogs - self.failed_catalogs)
+        print(f'{bcolors.OKGREEN}Товаров в индексе: {len(self.index.entries)}. Новых: {len(diff["new"])}, '
+              f'удаленных: {len(diff["removed"])}, переименованных: {len(diff["renamed"])}. '
+              f'Ссылки на новые товары: {NEW_URLS_FILE}{bcolors.ENDC}')
+
+    async def start(self):
+        await self.set_playwright_config()
+        await self.set_city()
+        await self.get_arts_from_catalogs()
+        await self.browser.close()
+        self.save_index()
+        return f'{self.metrics.report()}\n\nИсключения:\n{self.exclusion_rules.summary()}'
+
+
+async def run():
+    async with async_playwright() as playwright:
+        return await Europa(playwright=playwright).start()
 
 
 def main():
     t1 = datetime.datetime.now()
     print(f'Start: {t1}')
+    report = ''
     try:
-        with sync_playwright() as playwright:
-            Europa(playwright=playwright).start()
-        print(f'Успешно')
+        report = asyncio.run(run())
+        print('Успешно')
     except Exception as exp:
         print(exp)
         print(traceback.format_exc())
         send_logs_to_telegram(message=f'Произошла ошибка!\n\n\n{exp}')
     t2 = datetime.datetime.now()
     print(f'Finish: {t2}, TIME: {t2 - t1}')
-    send_logs_to_telegram(message=f'Finish: {t2}, TIME: {t2 - t1}')
+    send_logs_to_telegram(message=f'Finish: {t2}, TIME: {t2 - t1}\n\n{report}')
 
 
 if __name__ == '__main__':
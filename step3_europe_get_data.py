@@ -3,79 +3,158 @@
 переходит по ним, предварительно установив город и адрес магазина из константы ADDRESS_SHOP,
 считывает информацию каждого товара, записывает результаты в файл JSON.
 
+Каждый товар сразу дописывается одной строкой в журнал out/data.jsonl (см. product_store.py), в конце работы
+журнал сливается в out/data.json. При перезапуске уже собранные товары берутся из data.json и журнала.
+
+Выбранный город/магазин сохраняется в out/session (см. city_session.py), поэтому при перезапусках браузера
+set_city выполняется повторно, только если сохраненная сессия устарела.
+
+У каждого товара хранится время последней проверки last_seen. Если REFRESH_MODE = True, ссылки из файла не
+читаются: заново посещаются только уже собранные товары, проверенные более REFRESH_MAX_AGE_HOURS часов назад
+(сначала самые давние), и у них обновляются только цена и наличие.
+
+Если FETCH_MODE = 'http', страница товара сначала загружается обычным HTTP-запросом с cookies сохраненной сессии
+и разбирается без рендеринга (см. http_fetch.py). Браузер используется, только если пришла страница DDoS-Guard,
+HTML не удалось разобрать или на странице нет блока цены (отсутствие товара подтверждается в браузере).
+
+Если WORKERS > 1, ссылки обрабатываются параллельно: город устанавливается один раз, затем WORKERS асинхронных
+страниц в одном браузере (с одной сессией магазина) берут ссылки из общей очереди.
+
+Если включен config.NETWORK_CAPTURE (EUROPA_NETWORK_CAPTURE=1), данные товара и цена берутся из JSON-ответов API,
+которые загружает сама страница (см. network_capture.py); состояние страницы по-прежнему определяется по DOM.
+Если товара с ценой в ответах нет, данные извлекаются со страницы.
+
+Браузер (в параллельном режиме - страница воркера) перезапускается не через фиксированное число ссылок, а когда
+растут память рендерера или задержка загрузки; после падения страницы пауза перед перезапуском короткая и растет
+с числом падений подряд (см. browser_supervisor.py).
+
+Паузы между запросами не фиксированы: общий для всех воркеров RateLimiter (см. rate_limiter.py) начинает
+с REQUESTS_PER_MINUTE[0] запросов в минуту, ускоряется, пока сайт отвечает нормально, и резко замедляется
+при DDoS-Guard, падениях страницы и всплесках задержки.
+
 Помимо результирующего файла JSON, формируются дополнительные файлы:
 articles_with_bad_req.txt - для ссылок, которые не удалось загрузить, либо товар из списка нежелательных
 брэндов, либо другая ошибка с указанием этой ошибки
+failures.json - те же неудачи по артикулам с классом причины и числом попыток (см. failure_store.py). Ссылки
+с постоянными неудачами (товар не найден) в следующие запуски не берутся, временные (ошибка загрузки, нет в наличии)
+повторяются с растущей паузой: в конце запуска и в следующих запусках.
+
+Если задан WORK_QUEUE_FILE, ссылки берутся не напрямую из файла, а пачками в аренду из общей очереди SQLite
+(см. work_queue.py): можно запустить несколько step3 в разных процессах или на разных компьютерах, каждая ссылка
+посещается одним воркером, собранные товары всех воркеров сливаются в одно хранилище. Ссылки из файла (если он есть
+у воркера) добавляются в очередь, уже известные очереди артикулы не дублируются. Пачки арендуются по ходу работы
+одного браузера; воркер завершается, когда очередь разобрана, и только первый такой воркер выгружает результаты
+всех воркеров в data.json и уплотняет хранилища.
+
+Товары брендов из in/bad_brand.txt (по характеристике "Бренд" или названию, см. exclusion_rules.py) отбрасываются
+сразу после определения состояния страницы, не сохраняются и записываются в failures.json как постоянная неудача
+excluded, поэтому в следующие запуски не загружаются, пока бренд есть в списке.
 """
 import os
 import time
+import asyncio
 import datetime
-import json
-import random
-import re
 import requests
-import platform
-import socket
 import traceback
+from collections import defaultdict, deque
 from playwright.sync_api import sync_playwright, Page, TimeoutError
+from playwright.async_api import async_playwright, Page as AsyncPage, TimeoutError as AsyncTimeoutError
 from tqdm import tqdm
 from colorama import init, Fore, Style
 
+from browser_supervisor import BrowserSupervisor, summarize_supervisors
+from city_session import load_session_state, save_session_state, invalidate_session_state, set_city as select_city
+from crawl_metrics import CrawlMetrics, UrlTimer
+from debug_capture import DebugCapture
+from exclusion_rules import ExclusionRules
+from failure_store import (FailureStore, FAILURES_FILE, FAILURE_NOT_FOUND, FAILURE_BAD_URL, FAILURE_LOAD_ERROR,
+                           FAILURE_OUT_OF_STOCK, FAILURE_NO_IMAGES, FAILURE_NO_DESCRIPTION, FAILURE_EXCLUDED)
+from http_fetch import HtmlParseError, make_http_session, fetch_product_html, parse_product_html
+from network_capture import NetworkCapture, summarize_captures
+from notifier import get_notifier
+from product_extract import (CLASSIFY_PAGE_JS, EXTRACT_PRODUCT_JS, EXTRACT_PRICE_JS, build_product_record,
+                             build_price, PAGE_PRODUCT, PAGE_NOT_FOUND, PAGE_OUT_OF_STOCK, PAGE_DDOS,
+                             STOCK_AVAILABLE, STOCK_OUT_OF_STOCK, STOCK_NOT_FOUND)
+from product_store import ProductStore, OUTPUT_JSON_FILE, get_article_from_url
+from rate_limiter import RateLimiter
+from work_queue import WorkQueue
+
 # --- НАСТРОЙКИ СКРИПТА ---
 INPUT_URL_FILE = os.path.join("in", "product_links_for_get_data.txt")
-OUTPUT_JSON_FILE = os.path.join("out", "data.json")
 OUTPUT_FAILED_FILE = os.path.join("out", "articles_with_bad_req.txt")
-DEBUG_DIR = os.path.join("out", "debug")
 
-# Настройки подключения к Telegram (если есть)
+# Настройки подключения к Telegram (если есть) и адрес сайта
 try:
-    from config import BOT_TOKEN, CHAT_ID
+    from config import (BOT_TOKEN, CHAT_ID, BASE_URL, HEADLESS, TELEGRAM_ENABLED, TELEGRAM_API_URL, NETWORK_CAPTURE,
+                        RATE_LIMIT)
 except ImportError:
     BOT_TOKEN, CHAT_ID = None, None
+    BASE_URL, HEADLESS, TELEGRAM_ENABLED, NETWORK_CAPTURE = "https://europa-market.ru", False, True, False
+    RATE_LIMIT = None
+    TELEGRAM_API_URL = "https://api.telegram.org"
 
 # Настройки парсера
 ADDRESS_SHOP = 'Брянск-58, ул. Горбатова, 18'
 SHOP_INDEX_TO_CLICK = "241001"
 
-HEADLESS_MODE = False
+HEADLESS_MODE = HEADLESS
 TIMEOUT = 45000
 MAX_RETRIES = 3
-PAUSE_BETWEEN_REQUESTS = (3, 7)
-RESTART_BROWSER_EVERY_N_URLS = 100
-CRASH_RECOVERY_WAIT_SECONDS = 300
+# Частота запросов в минуту (на все воркеры вместе): начальная, минимальная, максимальная
+REQUESTS_PER_MINUTE = RATE_LIMIT or (8, 2, 30)
+# Классификация страницы: сколько ждать любого из состояний и сколько ждать блок цены у загруженной страницы
+# без надписи "Нет в наличии" (как прежнее ожидание блока цены)
+CLASSIFY_TIMEOUT = 15000
+OUT_OF_STOCK_GRACE_MS = 7000
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/118.0.0.0 Safari/537.36")
+
+# Режим обновления цен уже собранных товаров: кого считать устаревшим и сколько обновить за запуск (None - всех)
+REFRESH_MODE = False
+REFRESH_MAX_AGE_HOURS = 72
+REFRESH_LIMIT = None
+
+# Способ загрузки страниц товаров: 'browser' - через Playwright, 'http' - HTTP-запросом, браузер как запасной
+FETCH_MODE = 'browser'
+
+# Параллельный режим (WORKERS = 1 - последовательная обработка одной страницей)
+WORKERS = 1
+DDOS_PAUSE_SECONDS = 60
+
+# Общая очередь ссылок для нескольких процессов/компьютеров (см. work_queue.py): путь к файлу очереди
+# (например, os.path.join("out", "work_queue.sqlite")) или None - обрабатывать файл ссылок целиком
+WORK_QUEUE_FILE = None
+QUEUE_BATCH_SIZE = 20
+# Как часто проверять очередь, если свободных ссылок пока нет (отложенные повторы, чужие аренды), не реже, с
+QUEUE_POLL_SECONDS = 60
+
+# Время классификации страниц по состояниям (секунды), выводится в итоговом сообщении
+classification_times = defaultdict(list)
+# Неудачные ссылки по артикулам, загружаются в main
+failures = FailureStore(FAILURES_FILE)
+# Отладочные снимки страниц с ошибками (out/debug, см. debug_capture.py)
+debug_capture = DebugCapture()
+# Время фаз обработки каждой ссылки (out/metrics, см. crawl_metrics.py)
+metrics = CrawlMetrics('step3')
+# Нежелательные бренды (in/bad_brand.txt, см. exclusion_rules.py)
+exclusion_rules = ExclusionRules.load()
+# Наблюдение за браузером: по одному на последовательный режим или на каждого воркера (см. browser_supervisor.py)
+supervisors: list[BrowserSupervisor] = []
+# Перехват ответов API: по одному на страницу браузера, если включен NETWORK_CAPTURE (см. network_capture.py)
+captures: list[NetworkCapture] = []
+# Общая очередь ссылок, создается в main, если задан WORK_QUEUE_FILE
+work_queue: WorkQueue | None = None
 
 
 # --- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ---
 def send_logs_to_telegram(message: str):
+    """Отправка в Telegram в фоновом потоке (см. notifier.py): цикл парсинга не ждет ответа."""
+    if not TELEGRAM_ENABLED:
+        return
     if not BOT_TOKEN or not CHAT_ID:
         print(Fore.YELLOW + "ПРЕДУПРЕЖДЕНИЕ: BOT_TOKEN или CHAT_ID не заданы. Уведомление не отправлено.")
         return
-    try:
-        platform_info = platform.system()
-        hostname = socket.gethostname()
-        user = os.getlogin()
-        full_message = message + f'\n\n---\n🖥️ {platform_info}\n👤 {hostname}\\{user}'
-        url = f'https://api.telegram.org/bot{BOT_TOKEN}/sendMessage'
-        data = {"chat_id": CHAT_ID, "text": full_message}
-        requests.post(url, data=data, timeout=10)
-    except Exception as e:
-        print(Fore.RED + f"Критическая ошибка при отправке в Telegram: {e}")
-
-
-def save_debug_info(page: Page, article_id: str):
-    print(Fore.MAGENTA + f"!!! Сохраняю отладочную информацию для {article_id}...")
-    os.makedirs(DEBUG_DIR, exist_ok=True)
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    screenshot_path = os.path.join(DEBUG_DIR, f"{article_id}_{timestamp}_debug.png")
-    html_path = os.path.join(DEBUG_DIR, f"{article_id}_{timestamp}_debug.html")
-    try:
-        page.screenshot(path=screenshot_path, full_page=True)
-        print(Fore.MAGENTA + f"  - Скриншот сохранен: {screenshot_path}")
-        with open(html_path, 'w', encoding='utf-8') as f:
-            f.write(page.content())
-        print(Fore.MAGENTA + f"  - HTML-код сохранен: {html_path}")
-    except Exception as e:
-        print(Fore.RED + f"  - Не удалось сохранить отладочную информацию: {e}")
+    get_notifier(BOT_TOKEN, CHAT_ID, TELEGRAM_API_URL).notify(message)
 
 
 def read_urls_from_file(filepath: str) -> list[str]:
@@ -92,22 +171,9 @@ def read_urls_from_file(filepath: str) -> list[str]:
     return unique_urls
 
 
-def load_existing_data(filepath: str) -> dict:
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    if not os.path.exists(filepath): return {}
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            print(f"Загружено {Fore.GREEN}{len(data)}{Style.RESET_ALL} уже собранных товаров из JSON.")
-            return data
-    except (json.JSONDecodeError, FileNotFoundError):
-        print(Fore.YELLOW + f"ПРЕДУПРЕЖДЕНИЕ: JSON-файл {filepath} не найден или поврежден. Начинаем с нуля.")
-        return {}
-
-
-def save_json_data(data: dict, filepath: str):
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def load_existing_data(filepath: str) -> ProductStore:
+    """Загружает уже собранные товары из JSON-файла и журнала дозаписи к нему."""
+    return ProductStore(filepath).load()
 
 
 def log_failed_url(url: str, reason: str, filepath: str):
@@ -115,50 +181,18 @@ def log_failed_url(url: str, reason: str, filepath: str):
         f.write(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M')} | {reason} | {url}\n")
 
 
-def get_article_from_url(url: str) -> str | None:
-    match = re.search(r'-(\d+)$', url)
-    return match.group(1) if match else None
+def record_failure(url: str, failure: str, reason: str):
+    """Записывает неудачу в текстовый журнал и в хранилище неудач (ключ - артикул, для некорректных ссылок - ссылка)."""
+    log_failed_url(url, reason, OUTPUT_FAILED_FILE)
+    failures.record(get_article_from_url(url) or url, url, failure, reason)
 
 
 def set_city(page: Page):
     try:
         print('Автоматическая установка города и магазина...')
-        page.goto("https://europa-market.ru/", timeout=60000)
-
-        # print("1. Ждем окно выбора города и нажимаем 'Нет, выбрать другой'")
-        page.get_by_role("button", name="Нет, выбрать другой").click(timeout=15000)
-        time.sleep(2)
-
-        # print("2. Выбираем 'Брянск'")
-        page.get_by_text("Брянск").click()
-        time.sleep(2)
-
-        if page.get_by_role("button", name="Выбрать").is_visible(timeout=3000):
-            # print("3. Нажимаем 'Выбрать'")
-            page.get_by_role("button", name="Выбрать").click()
-            time.sleep(3)
-
-        # print("4. Открываем меню выбора адреса/самовывоза")
-        page.locator(".user-address--default").click()
-        time.sleep(2)
-
-        # print("5. Переключаемся на вкладку 'Самовывоз'")
-        page.get_by_role("button", name="Самовывоз").click()
-        time.sleep(2)
-
-        # print("6. Открываем список магазинов")
-        page.locator("div").filter(has_text=re.compile(r"^Нажмите, чтобы выбрать адрес$")).nth(1).click()
-        time.sleep(2)
-
-        # print(f"7. Выбираем магазин по индексу '{SHOP_INDEX_TO_CLICK}'")
-        page.get_by_text(SHOP_INDEX_TO_CLICK).click()
-        time.sleep(2)
-
-        # print("8. Нажимаем 'Применить'")
-        page.get_by_role("button", name="Применить").click()
-
+        # Шаги выбора - общие со step2 и ArtsToProductLinks (city_session.CITY_STEPS)
+        select_city(page, BASE_URL, SHOP_INDEX_TO_CLICK)
         print(Fore.GREEN + f'Успешно установлен адрес: {ADDRESS_SHOP}')
-        time.sleep(5)
         return True
     except Exception:
         print(Fore.RED + "Произошла ошибка при автоматической установке города.")
@@ -167,209 +201,769 @@ def set_city(page: Page):
         return False
 
 
-def parse_product_page(page: Page, product_url: str) -> dict | None:
+def classify_product_page(page: Page) -> str:
+    """
+    Ждет, пока страница товара придет в одно из состояний (товар с ценой, 404, нет в наличии, DDoS-Guard),
+    и возвращает первое определившееся. Время классификации сохраняется в classification_times.
+    """
+    start = time.perf_counter()
     try:
-        not_found_heading = page.get_by_role("heading", name="Товар не найден")
-        if not_found_heading.is_visible(timeout=2500):
-            print(Fore.YELLOW + f"  - Товар не найден (страница 404).")
-            log_failed_url(product_url, "Товар не найден (404-style page)", OUTPUT_FAILED_FILE)
-            return None
-    except TimeoutError:
-        pass
-    except Exception as e:
-        print(Fore.RED + f"  - Ошибка при проверке на 'Товар не найден': {e}")
-        pass
-
-    try:
-        cart_block = page.locator('.product-cart')
-        cart_block.wait_for(timeout=7000)
-
-        price_int_loc = cart_block.locator('.product-cart__price-int')
-        price_frac_loc = cart_block.locator('.product-cart__price-frac span').first
-
-        price_int = price_int_loc.text_content() if price_int_loc.count() > 0 else '0'
-        price_frac = price_frac_loc.text_content() if price_frac_loc.count() > 0 else '00'
-        price = float(f"{price_int}.{price_frac}")
-
+        handle = page.wait_for_function(CLASSIFY_PAGE_JS, arg=OUT_OF_STOCK_GRACE_MS, polling=100,
+                                        timeout=CLASSIFY_TIMEOUT)
+        state = handle.json_value()
     except TimeoutError:
-        print(Fore.YELLOW + f"  - Товар отсутствует в наличии (не найден блок с ценой).")
-        log_failed_url(product_url, "Товар отсутствует (нет блока цены)", OUTPUT_FAILED_FILE)
-        article_id = get_article_from_url(product_url) or "unknown"
-        save_debug_info(page, f"{article_id}_no_price_block")
+        raise ValueError(f"Не удалось определить состояние страницы за {CLASSIFY_TIMEOUT / 1000:.0f} с")
+    classification_times[state].append(time.perf_counter() - start)
+    return state
+
+
+def check_page_state(state: str, product_url: str) -> bool:
+    """Логирует отсутствующие товары. Возвращает True, если на странице есть товар с ценой."""
+    if state == PAGE_DDOS:
+        raise ValueError("Обнаружена DDOS-защита")
+    if state == PAGE_NOT_FOUND:
+        print(Fore.YELLOW + "  - Товар не найден (страница 404).")
+        record_failure(product_url, FAILURE_NOT_FOUND, "Товар не найден (404-style page)")
+        return False
+    if state == PAGE_OUT_OF_STOCK:
+        print(Fore.YELLOW + "  - Товар отсутствует в наличии (не найден блок с ценой).")
+        record_failure(product_url, FAILURE_OUT_OF_STOCK, "Товар отсутствует (нет блока цены)")
+        return False
+    return state == PAGE_PRODUCT
+
+
+def parse_product_page(page: Page, product_url: str, existing: dict | None = None,
+                       timer: UrlTimer | None = None, capture: NetworkCapture | None = None) -> dict | None:
+    """
+    Данные товара со страницы. Если передан existing (режим обновления), обновляются только цена и наличие.
+    Если передан capture, данные сначала ищутся в ответах API страницы.
+    """
+    timer = timer or UrlTimer()
+    with timer.phase('classification'):
+        state = classify_product_page(page)
+    api_raw = None
+    if capture is not None and state == PAGE_PRODUCT:
+        with timer.phase('extraction'):
+            api_raw = capture.product(capture.payloads(), get_article_from_url(product_url) or '')
+    if existing is not None:
+        with timer.phase('extraction'):
+            price_raw = api_raw or (page.evaluate(EXTRACT_PRICE_JS) if state == PAGE_PRODUCT else None)
+        return refresh_record(existing, state, price_raw)
+    if not check_page_state(state, product_url):
+        if state == PAGE_OUT_OF_STOCK:
+            debug_capture.capture(page, get_article_from_url(product_url) or 'unknown', 'no_price_block')
         return None
-    except Exception as e:
+    with timer.phase('extraction'):
+        raw = api_raw or page.evaluate(EXTRACT_PRODUCT_JS)
+    return build_checked_record(raw, product_url)
+
+
+def refresh_record(existing: dict, state: str, price_raw: dict | None) -> dict:
+    """Обновляет у уже собранного товара цену и наличие по состоянию страницы, остальные данные не трогает."""
+    if state == PAGE_DDOS:
+        raise ValueError("Обнаружена DDOS-защита")
+    record = dict(existing)
+    if state == PAGE_PRODUCT:
+        try:
+            record['price'] = build_price(price_raw)
+        except ValueError as e:
+            raise ValueError(f"Не удалось получить цену: {e}")
+        record['stock'] = STOCK_AVAILABLE
+    elif state == PAGE_OUT_OF_STOCK:
+        record['stock'] = STOCK_OUT_OF_STOCK
+    elif state == PAGE_NOT_FOUND:
+        record['stock'] = STOCK_NOT_FOUND
+    return record
+
+
+def save_product(all_data: ProductStore, article_id: str, product_data: dict):
+    """Сохраняет товар в хранилище с отметкой времени последней проверки."""
+    product_data['last_seen'] = datetime.datetime.now().isoformat(timespec='seconds')
+    all_data.put(article_id, product_data)
+    failures.resolve(article_id)
+    if work_queue is not None and article_id in work_queue.held:
+        work_queue.complete(article_id, product_data)
+
+
+def select_stale_urls(all_data: ProductStore) -> list[str]:
+    """Ссылки на товары, проверенные более REFRESH_MAX_AGE_HOURS часов назад, начиная с самых давних."""
+    cutoff = (datetime.datetime.now() - datetime.timedelta(hours=REFRESH_MAX_AGE_HOURS)).isoformat(timespec='seconds')
+    stale = sorted((record.get('last_seen', ''), record['art_url']) for record in all_data.values()
+                   if record.get('art_url') and record.get('last_seen', '') < cutoff)
+    urls = [url for _, url in stale]
+    return urls[:REFRESH_LIMIT] if REFRESH_LIMIT else urls
+
+
+def check_excluded(raw: dict, product_url: str) -> bool:
+    """Проверяет бренд товара по спискам исключений. Исключенный товар записывается как постоянная неудача."""
+    rule = exclusion_rules.match_product(raw.get('name'), raw.get('params'))
+    if rule is None:
+        return False
+    print(Fore.YELLOW + f"  - Товар исключен правилом {rule}.")
+    # Эта страница уже загружена, экономия - в следующих запусках (см. main)
+    exclusion_rules.count(rule, avoided=0)
+    record_failure(product_url, FAILURE_EXCLUDED, rule)
+    return True
+
+
+def build_checked_record(raw: dict, product_url: str) -> dict | None:
+    """
+    Собирает словарь товара из результата EXTRACT_PRODUCT_JS и логирует товары без описания или фото.
+    Товар нежелательного бренда не собирается (None).
+    """
+    if check_excluded(raw, product_url):
+        return None
+    try:
+        product_data = build_product_record(raw, product_url)
+    except ValueError as e:
         raise ValueError(f"Не удалось получить цену: {e}")
 
-    code_loc = page.locator('.product-info__sku')
-    code = (re.search(r'\d+', code_loc.text_content()).group()
-            if code_loc.count() > 0 and re.search(r'\d+', code_loc.text_content())
-            else get_article_from_url(product_url))
-
-    name_loc = page.locator('.product-title__name')
-    name = name_loc.text_content().strip() if name_loc.count() > 0 else '-'
-
-    stock = "В наличии"
-    description = '-'
-    characteristics_dict = {}
-
-    nutrition_items = page.locator('.product-info__nutrition-item').all()
-    for item in nutrition_items:
-        key = item.locator('.product-info__nutrition-name').text_content().strip()
-        value = item.locator('.product-info__nutrition-value').text_content().strip()
-        characteristics_dict[key] = value
-
-    params_container = page.locator('.product-info__params')
-    if params_container.count() > 0:
-        all_top_level_blocks = params_container.locator('> div').all()
-        for block in all_top_level_blocks:
-            block_class = block.get_attribute('class') or ''
-            if 'product-info__params-block--columns' in block_class:
-                inner_items = block.locator('.product-info__params-item').all()
-                for inner_item in inner_items:
-                    key_loc = inner_item.locator('.product-info__params-name')
-                    value_loc = inner_item.locator('.product-info__params-value')
-                    if key_loc.count() > 0 and value_loc.count() > 0:
-                        characteristics_dict[key_loc.text_content().strip()] = value_loc.text_content().strip()
-            else:
-                key_loc = block.locator('.product-info__params-name')
-                value_loc = block.locator('.product-info__params-value')
-                if key_loc.count() > 0 and value_loc.count() > 0:
-                    key = key_loc.text_content().strip()
-                    value = value_loc.text_content().strip()
-                    if 'описание' in key.lower():
-                        description = value
-                    else:
-                        characteristics_dict[key] = value
-
-    if not characteristics_dict and description == '-':
-        log_failed_url(product_url, 'Блок описания/характеристик не найден', OUTPUT_FAILED_FILE)
-
-    image_locators = page.locator('.product-image__image-slider img').all()
-    image_links = [loc.get_attribute('src').split('?')[0] for loc in image_locators if loc.get_attribute('src')]
-    if not image_links:
-        log_failed_url(product_url, 'Блок с изображениями не найден', OUTPUT_FAILED_FILE)
-
-    return {
-        'name': name, 'price': price, 'stock': stock, 'description': description,
-        'characteristics': characteristics_dict, 'img_url': image_links, 'art_url': product_url
-    }
-
-
-def main():
-    init(autoreset=True)
-    start_time = datetime.datetime.now()
-    start_message = f"🚀 Парсер Europa-Market запущен в {start_time.strftime('%H:%M:%S')}"
-    print(Fore.CYAN + start_message)
-    # send_logs_to_telegram(start_message)
-
+    if not product_data['characteristics'] and product_data['description'] == '-':
+        record_failure(product_url, FAILURE_NO_DESCRIPTION, 'Блок описания/характеристик не найден')
+    if not product_data['img_url']:
+        record_failure(product_url, FAILURE_NO_IMAGES, 'Блок с изображениями не найден')
+    return product_data
+
+
+def parse_product_http(session: requests.Session, product_url: str, existing: dict | None = None,
+                       timer: UrlTimer | None = None) -> tuple[str | None, dict | None]:
+    """
+    Загружает и разбирает страницу товара без браузера. Возвращает (состояние страницы, данные товара или None).
+    Если состояние None, PAGE_DDOS или PAGE_OUT_OF_STOCK (ошибка загрузки или разбора, DDoS-Guard, нет блока цены),
+    товар нужно загрузить через браузер.
+    Если передан existing (режим обновления), обновляются только цена и наличие.
+    Разбор HTML учитывается в замерах как extraction (состояние и данные определяются за один проход).
+    """
+    timer = timer or UrlTimer()
     try:
-        urls_to_parse = read_urls_from_file(INPUT_URL_FILE)
-        all_data = load_existing_data(OUTPUT_JSON_FILE)
-        initial_data_count = len(all_data)
+        with timer.phase('navigation'):
+            html = fetch_product_html(session, product_url)
+        with timer.phase('extraction'):
+            state, raw = parse_product_html(html)
+    except (requests.RequestException, HtmlParseError) as e:
+        print(Fore.YELLOW + f"  - HTTP-режим: {e}. Загружаю через браузер.")
+        return None, None
+
+    if state == PAGE_DDOS:
+        print(Fore.YELLOW + "  - HTTP-режим: DDoS-Guard. Загружаю через браузер.")
+        return state, None
+    if state == PAGE_OUT_OF_STOCK:
+        # Выбранный магазин хранится и в localStorage, которого у HTTP-клиента нет: без него блок цены может
+        # не прийти и у товара в наличии, поэтому отсутствие подтверждается в браузере
+        print(Fore.YELLOW + "  - HTTP-режим: нет блока цены. Проверяю наличие через браузер.")
+        return state, None
+    try:
+        if existing is not None:
+            return state, refresh_record(existing, state, raw)
+        if not check_page_state(state, product_url):
+            return state, None
+        return state, build_checked_record(raw, product_url)
+    except ValueError as e:
+        print(Fore.YELLOW + f"  - HTTP-режим: {e}. Загружаю через браузер.")
+        return None, None
+
+
+def record_http_result(limiter: RateLimiter, state: str | None, latency: float) -> bool:
+    """Сообщает ограничителю частоты результат HTTP-загрузки. Возвращает True, если браузер не нужен."""
+    if state == PAGE_DDOS:
+        limiter.record_ddos()
+    elif state is None:
+        limiter.record_error()
+    else:
+        limiter.record_success(latency)
+    return state not in (None, PAGE_DDOS, PAGE_OUT_OF_STOCK)
+
+
+def record_browser_error(limiter: RateLimiter, error_text: str):
+    """Сообщает ограничителю частоты об ошибке при загрузке страницы в браузере."""
+    if "ddos" in error_text.lower():
+        limiter.record_ddos()
+    elif "crashed" in error_text.lower():
+        limiter.record_crash()
+    else:
+        limiter.record_error()
+
+
+async def classify_product_page_async(page: AsyncPage) -> str:
+    """Асинхронный вариант classify_product_page."""
+    start = time.perf_counter()
+    try:
+        handle = await page.wait_for_function(CLASSIFY_PAGE_JS, arg=OUT_OF_STOCK_GRACE_MS, polling=100,
+                                              timeout=CLASSIFY_TIMEOUT)
+        state = await handle.json_value()
+    except AsyncTimeoutError:
+        raise ValueError(f"Не удалось определить состояние страницы за {CLASSIFY_TIMEOUT / 1000:.0f} с")
+    classification_times[state].append(time.perf_counter() - start)
+    return state
+
+
+async def parse_product_page_async(page: AsyncPage, product_url: str, existing: dict | None = None,
+                                   timer: UrlTimer | None = None,
+                                   capture: NetworkCapture | None = None) -> dict | None:
+    """Асинхронный вариант parse_product_page для параллельного режима, результат тот же."""
+    timer = timer or UrlTimer()
+    with timer.phase('classification'):
+        state = await classify_product_page_async(page)
+    api_raw = None
+    if capture is not None and state == PAGE_PRODUCT:
+        with timer.phase('extraction'):
+            api_raw = capture.product(await capture.payloads_async(), get_article_from_url(product_url) or '')
+    if existing is not None:
+        with timer.phase('extraction'):
+            price_raw = api_raw or (await page.evaluate(EXTRACT_PRICE_JS) if state == PAGE_PRODUCT else None)
+        return refresh_record(existing, state, price_raw)
+    if not check_page_state(state, product_url):
+        if state == PAGE_OUT_OF_STOCK:
+            await debug_capture.capture_async(page, get_article_from_url(product_url) or 'unknown', 'no_price_block')
+        return None
+    with timer.phase('extraction'):
+        raw = api_raw or await page.evaluate(EXTRACT_PRODUCT_JS)
+    return build_checked_record(raw, product_url)
+
+
+def new_city_context(browser):
+    """
+    Создает контекст браузера с сессией выбранного магазина: из сохраненного файла, если он не устарел,
+    иначе устанавливает город через set_city и сохраняет сессию. Возвращает (context, page).
+    """
+    state_path = load_session_state(SHOP_INDEX_TO_CLICK)
+    context = browser.new_context(user_agent=USER_AGENT, storage_state=state_path)
+    context.set_default_timeout(TIMEOUT)
+    page = context.new_page()
+    if state_path:
+        print(Fore.GREEN + f"Используется сохраненная сессия магазина: {state_path}")
+        return context, page
+
+    if not set_city(page):
+        invalidate_session_state(SHOP_INDEX_TO_CLICK)
+        raise RuntimeError("Не удалось установить город, дальнейшая работа невозможна.")
+    save_session_state(context, SHOP_INDEX_TO_CLICK)
+    return context, page
+
+
+def get_city_session_state() -> str:
+    """Гарантирует наличие актуальной сохраненной сессии магазина и возвращает путь к ней."""
+    state_path = load_session_state(SHOP_INDEX_TO_CLICK)
+    if state_path:
+        return state_path
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=HEADLESS_MODE)
+        try:
+            new_city_context(browser)
+        finally:
+            browser.close()
+    return load_session_state(SHOP_INDEX_TO_CLICK)
+
+
+class QueueUrlSource:
+    """
+    Ссылки из общей очереди для run_sequential и run_worker_pool: следующая пачка арендуется, когда кончается
+    предыдущая, поэтому браузер работает без перезапусков между пачками. Когда воркер (owner) просит следующую
+    ссылку, его предыдущая уже обработана: если товар не собран (собранные закрывает save_product), ссылка
+    возвращается в очередь как неудачная - с повтором по расписанию failures (next_retry), как и без очереди.
+    Ссылок нет (None), только когда очередь разобрана.
+    """
+
+    def __init__(self, queue: WorkQueue, all_data: ProductStore):
+        self.queue = queue
+        self.all_data = all_data
+        self.pending = deque()
+        self.current = {}
+
+    def _settle(self, owner: int):
+        article = self.current.pop(owner, None)
+        if article is not None and article in self.queue.held:
+            entry = failures.get(article)
+            retry_at = None
+            if entry and not entry['resolved'] and entry['next_retry']:
+                retry_at = datetime.datetime.fromisoformat(entry['next_retry']).timestamp()
+            self.queue.fail(article, entry['message'] if entry else 'товар не собран', failures.is_permanent(article),
+                            retry_at)
+
+    def _refill(self) -> float | None:
+        """Арендует пачку. Возвращает 0, если ссылки есть, паузу до следующей проверки, если свободных пока нет,
+        и None, если очередь разобрана."""
+        batch = self.queue.lease_batch(QUEUE_BATCH_SIZE)
+        if batch:
+            for article, url in batch:
+                # Товар уже собран этим воркером раньше (например, до перехода на очередь) - страница не нужна
+                if not REFRESH_MODE and article in self.all_data:
+                    self.queue.complete(article, self.all_data.get(article))
+                else:
+                    self.pending.append((article, url))
+            print(Fore.CYAN + f"\nОчередь: {self.queue.summary()}")
+            return 0
+        wait = self.queue.seconds_until_available()
+        if wait is None:
+            return None
+        # Свои же воркеры еще обрабатывают ссылки: их итог станет известен скоро, чужие аренды ждать не нужно
+        wait = 1.0 if self.current else max(1.0, min(wait, QUEUE_POLL_SECONDS))
+        print(Fore.CYAN + f"\nСвободных ссылок нет, следующая проверка через {wait:.0f} с ({self.queue.summary()})")
+        return wait
+
+    def _take(self, owner: int) -> str:
+        article, url = self.pending.popleft()
+        self.current[owner] = article
+        return url
+
+    def next_url(self, owner: int = 0) -> str | None:
+        self._settle(owner)
+        while not self.pending:
+            wait = self._refill()
+            if wait is None:
+                return None
+            time.sleep(wait)
+        return self._take(owner)
+
+    async def next_url_async(self, owner: int) -> str | None:
+        """next_url для параллельного режима: пока один воркер ждет свободных ссылок, остальные работают"""
+        self._settle(owner)
+        while not self.pending:
+            wait = self._refill()
+            if wait is None:
+                return None
+            await asyncio.sleep(wait)
+        return self._take(owner)
+
+
+async def close_page(page: AsyncPage):
+    """Закрывает страницу, не обращая внимания на ошибки (страница или весь браузер могли упасть)"""
+    try:
+        await page.close()
+    except Exception:
+        pass
 
-        urls_to_process = [url for url in urls_to_parse if get_article_from_url(url) not in all_data]
 
-        if not urls_to_process:
-            print(Fore.YELLOW + "Все товары из списка уже обработаны. Завершение работы.")
-            send_logs_to_telegram("✅ Все товары уже обработаны. Новых ссылок нет.")
-            return
+async def run_worker_pool(urls_to_process: list[str], all_data: ProductStore, storage_state: str,
+                          limiter: RateLimiter, source: QueueUrlSource | None = None):
+    """
+    Обрабатывает ссылки WORKERS параллельными страницами одного браузера. Все страницы открыты в одном контексте
+    с сессией выбранного магазина, берут ссылки из общей очереди и пишут в общее хранилище all_data.
+    Если передан source, ссылки берутся из него (общая очередь SQLite), а не из urls_to_process.
+    """
+    queue = asyncio.Queue()
+    for url in urls_to_process:
+        queue.put_nowait(url)
+
+    async def next_url(worker_id: int) -> str | None:
+        if source is not None:
+            return await source.next_url_async(worker_id)
+        try:
+            return queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
 
-        print(f"К обработке {Fore.CYAN}{len(urls_to_process)}{Style.RESET_ALL} новых ссылок.")
+    http_session = make_http_session(storage_state, USER_AGENT) if FETCH_MODE == 'http' else None
 
-        with sync_playwright() as p:
-            browser = None
-            context = None
-            page = None
+    async with async_playwright() as p:
+        browser = None
+        context = None
+        # Номер запуска браузера: воркеры, одновременно заметившие падение, перезапускают его только один раз
+        generation = 0
+        relaunch_lock = asyncio.Lock()
 
-            def launch_browser():
-                nonlocal browser, context, page
+        async def launch_browser(seen_generation: int):
+            nonlocal browser, context, generation
+            async with relaunch_lock:
+                if generation != seen_generation:
+                    return
                 if browser:
                     try:
-                        browser.close()
+                        await browser.close()
                     except Exception as e:
                         print(Fore.YELLOW + f"Не удалось корректно закрыть браузер: {e}")
-
                 print(Fore.CYAN + "\n--- Запускаю новый экземпляр браузера ---")
-                browser = p.chromium.launch(headless=HEADLESS_MODE)
-                context = browser.new_context(
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36")
+                browser = await p.chromium.launch(headless=HEADLESS_MODE)
+                context = await browser.new_context(user_agent=USER_AGENT, storage_state=storage_state)
                 context.set_default_timeout(TIMEOUT)
-                page = context.new_page()
+                generation += 1
 
-                if not set_city(page):
-                    raise RuntimeError("Не удалось установить город, дальнейшая работа невозможна.")
+        await launch_browser(generation)
 
-            launch_browser()
+        with tqdm(total=len(urls_to_process) if source is None else None, desc=f"Сбор данных ({WORKERS} воркеров)",
+                  unit="url", ncols=120) as pbar:
 
-            url_counter = 0
-            with tqdm(total=len(urls_to_process), desc="Подготовка...", unit="url", ncols=120) as pbar:
-                for url in urls_to_process:
-                    # --- ИЗМЕНЕНИЕ ЗДЕСЬ ---
-                    # Сначала получаем артикул из ссылки
-                    article_id = get_article_from_url(url)
-                    # Затем устанавливаем описание для tqdm, используя этот артикул
-                    pbar.set_description(f"Сбор данных (Арт: {article_id or 'N/A'})")
+            async def worker(worker_id: int):
+                supervisor = BrowserSupervisor()
+                supervisors.append(supervisor)
+                capture = NetworkCapture() if NETWORK_CAPTURE else None
+                if capture is not None:
+                    captures.append(capture)
 
-                    url_counter += 1
-                    if url_counter > 1 and (url_counter - 1) % RESTART_BROWSER_EVERY_N_URLS == 0:
-                        print(Fore.CYAN + f"\nОбработано {url_counter - 1} ссылок. Плановый перезапуск браузера...")
-                        launch_browser()
+                async def new_page():
+                    """Новая страница воркера. Если упал весь браузер, он перезапускается (один раз на всех)."""
+                    seen_generation = generation
+                    try:
+                        new = await context.new_page()
+                    except Exception as e:
+                        print(Fore.RED + Style.BRIGHT + f"!!! [Воркер {worker_id}] Не удалось открыть страницу ({e}), "
+                                                        f"перезапускаю браузер !!!")
+                        await launch_browser(seen_generation)
+                        new = await context.new_page()
+                    await supervisor.attach_async(new)
+                    if capture is not None:
+                        capture.attach(new)
+                    return new
+
+                page = await new_page()
+                while True:
+                    url = await next_url(worker_id)
+                    if url is None:
+                        break
+                    article_id = get_article_from_url(url)
+                    reason = await supervisor.recycle_reason_async()
+                    if reason:
+                        print(Fore.CYAN + f"\n[Воркер {worker_id}] Перезапуск страницы ({reason}): "
+                                          f"{supervisor.describe(reason)}")
+                        supervisor.record_recycle(reason)
+                        await close_page(page)
+                        page = await new_page()
 
                     product_data = None
                     if not article_id:
-                        log_failed_url(url, "Некорректный URL", OUTPUT_FAILED_FILE)
+                        record_failure(url, FAILURE_BAD_URL, "Некорректный URL")
                         pbar.update(1)
                         continue
+                    existing = all_data.get(article_id) if REFRESH_MODE else None
+                    timer = metrics.start(url)
+
+                    if http_session is not None:
+                        with timer.phase('sleep'):
+                            await limiter.wait_async()
+                        timer.attempt()
+                        started = time.perf_counter()
+                        state, product_data = await asyncio.to_thread(parse_product_http, http_session, url, existing,
+                                                                      timer)
+                        if state == PAGE_DDOS:
+                            timer.mark_ddos()
+                        if record_http_result(limiter, state, time.perf_counter() - started):
+                            if product_data:
+                                with timer.phase('persistence'):
+                                    save_product(all_data, article_id, product_data)
+                            timer.finish('ok' if product_data else state)
+                            pbar.update(1)
+                            continue
 
                     for attempt in range(MAX_RETRIES):
+                        with timer.phase('sleep'):
+                            await limiter.wait_async()
+                        timer.attempt()
                         try:
-                            page.goto(url, wait_until="domcontentloaded")
-                            title = page.title()
-                            if "ddos" in title.lower():
-                                raise ValueError("Обнаружена DDOS-защита")
-
-                            product_data = parse_product_page(page, url)
-                            if product_data is not None:
-                                break
-                            else:
-                                break
-
+                            started = time.perf_counter()
+                            if capture is not None:
+                                capture.clear()
+                            with timer.phase('navigation'):
+                                await page.goto(url, wait_until="domcontentloaded")
+                            product_data = await parse_product_page_async(page, url, existing, timer, capture)
+                            latency = time.perf_counter() - started
+                            limiter.record_success(latency)
+                            supervisor.record_url(latency)
+                            break
                         except Exception as e:
                             error_text = str(e)
-                            print(Fore.RED + f"\n  [Попытка {attempt + 1}] ОШИБКА: {error_text[:200]}")
-                            if "crashed" in error_text.lower():
-                                print(Fore.RED + Style.BRIGHT + "!!! ОБНАРУЖЕНО ПАДЕНИЕ СТРАНИЦЫ !!!")
-                                send_logs_to_telegram(
-                                    f"🟡 ВНИМАНИЕ: Страница упала (crashed). Перезапускаю браузер через {CRASH_RECOVERY_WAIT_SECONDS} сек.")
-                                time.sleep(CRASH_RECOVERY_WAIT_SECONDS)
-                                launch_browser()
+                            record_browser_error(limiter, error_text)
+                            if "ddos" in error_text.lower():
+                                timer.mark_ddos()
+                            print(Fore.RED + f"\n  [Воркер {worker_id}, попытка {attempt + 1}] ОШИБКА "
+                                             f"({article_id}): {error_text[:200]}")
+                            if "crashed" in error_text.lower() or page.is_closed():
+                                wait = supervisor.record_crash()
+                                print(Fore.RED + Style.BRIGHT + f"!!! ОБНАРУЖЕНО ПАДЕНИЕ СТРАНИЦЫ, открываю новую "
+                                                                f"через {wait} с !!!")
+                                await close_page(page)
+                                with timer.phase('sleep'):
+                                    await asyncio.sleep(wait)
+                                page = await new_page()
                                 continue
-                            debug_id = f"{article_id}_attempt_{attempt + 1}"
-                            save_debug_info(page, debug_id)
-                            if attempt < MAX_RETRIES - 1:
-                                time.sleep(10)
+                            await debug_capture.capture_async(page, f"{article_id}_attempt_{attempt + 1}",
+                                                              'attempt_error')
+                    else:
+                        print(Fore.RED + Style.BRIGHT + f"!!! НЕ УДАЛОСЬ обработать {url} после {MAX_RETRIES} попыток.")
+                        record_failure(url, FAILURE_LOAD_ERROR, "Не удалось спарсить после всех попыток")
+                        supervisor.record_url(None)
+                        timer.finish('failed')
+                        pbar.update(1)
+                        continue
 
                     if product_data:
-                        all_data[article_id] = product_data
-                        save_json_data(all_data, OUTPUT_JSON_FILE)
-                    elif attempt == MAX_RETRIES - 1:
-                        print(Fore.RED + Style.BRIGHT + f"!!! НЕ УДАЛОСЬ обработать {url} после {MAX_RETRIES} попыток.")
-                        log_failed_url(url, "Не удалось спарсить после всех попыток", OUTPUT_FAILED_FILE)
+                        with timer.phase('persistence'):
+                            save_product(all_data, article_id, product_data)
+                    timer.finish('ok' if product_data else 'no_product')
+                    pbar.update(1)
+                    pbar.set_postfix_str(f"{limiter.rate:.1f} запр/мин")
+                await close_page(page)
+
+            await asyncio.gather(*(worker(i + 1) for i in range(WORKERS)))
+
+        try:
+            await browser.close()
+        except Exception as e:
+            print(Fore.YELLOW + f"Не удалось корректно закрыть браузер: {e}")
+
+
+def count_refreshed(all_data: ProductStore, since: datetime.datetime) -> int:
+    """Сколько товаров проверено начиная с момента since."""
+    since_iso = since.isoformat(timespec='seconds')
+    return sum(1 for record in all_data.values() if record.get('last_seen', '') >= since_iso)
+
+
+def format_classification_stats() -> str:
+    """Количество и среднее время классификации страниц по состояниям для итогового сообщения."""
+    if not classification_times:
+        return ''
+    lines = [f"{state}: {len(times)} шт., {sum(times) / len(times):.2f} с"
+             for state, times in sorted(classification_times.items())]
+    return "\n\n⏱️ Классификация страниц:\n" + "\n".join(lines)
+
+
+def run_sequential(urls_to_process: list[str], all_data: ProductStore, limiter: RateLimiter,
+                   source: QueueUrlSource | None = None):
+    """Обрабатывает ссылки по одной в одной странице браузера. Если передан source, ссылки берутся из него."""
+    with sync_playwright() as p:
+        browser = None
+        context = None
+        page = None
+        supervisor = BrowserSupervisor()
+        supervisors.append(supervisor)
+        capture = NetworkCapture() if NETWORK_CAPTURE else None
+        if capture is not None:
+            captures.append(capture)
+
+        def launch_browser():
+            nonlocal browser, context, page
+            if browser:
+                try:
+                    browser.close()
+                except Exception as e:
+                    print(Fore.YELLOW + f"Не удалось корректно закрыть браузер: {e}")
+
+            print(Fore.CYAN + "\n--- Запускаю новый экземпляр браузера ---")
+            browser = p.chromium.launch(headless=HEADLESS_MODE)
+            context, page = new_city_context(browser)
+            supervisor.attach(page)
+            if capture is not None:
+                capture.attach(page)
+
+        launch_browser()
+        http_session = None
+        if FETCH_MODE == 'http':
+            http_session = make_http_session(load_session_state(SHOP_INDEX_TO_CLICK), USER_AGENT)
+
+        urls = urls_to_process if source is None else iter(source.next_url, None)
+        with tqdm(total=len(urls_to_process) if source is None else None, desc="Подготовка...", unit="url",
+                  ncols=120) as pbar:
+            for url in urls:
+                # --- ИЗМЕНЕНИЕ ЗДЕСЬ ---
+                # Сначала получаем артикул из ссылки
+                article_id = get_article_from_url(url)
+                # Затем устанавливаем описание для tqdm, используя этот артикул
+                pbar.set_description(f"Сбор данных (Арт: {article_id or 'N/A'})")
+
+                reason = supervisor.recycle_reason()
+                if reason:
+                    print(Fore.CYAN + f"\nПерезапуск браузера ({reason}): {supervisor.describe(reason)}")
+                    supervisor.record_recycle(reason)
+                    launch_browser()
+
+                product_data = None
+                if not article_id:
+                    record_failure(url, FAILURE_BAD_URL, "Некорректный URL")
+                    pbar.update(1)
+                    continue
+                existing = all_data.get(article_id) if REFRESH_MODE else None
+                timer = metrics.start(url)
+
+                if http_session is not None:
+                    with timer.phase('sleep'):
+                        limiter.wait()
+                    timer.attempt()
+                    started = time.perf_counter()
+                    state, product_data = parse_product_http(http_session, url, existing, timer)
+                    if state == PAGE_DDOS:
+                        timer.mark_ddos()
+                    if record_http_result(limiter, state, time.perf_counter() - started):
+                        if product_data:
+                            with timer.phase('persistence'):
+                                save_product(all_data, article_id, product_data)
+                        timer.finish('ok' if product_data else state)
+                        pbar.update(1)
+                        continue
 
+                for attempt in range(MAX_RETRIES):
+                    with timer.phase('sleep'):
+                        limiter.wait()
+                    timer.attempt()
+                    try:
+                        started = time.perf_counter()
+                        if capture is not None:
+                            capture.clear()
+                        with timer.phase('navigation'):
+                            page.goto(url, wait_until="domcontentloaded")
+                        product_data = parse_product_page(page, url, existing, timer, capture)
+                        latency = time.perf_counter() - started
+                        limiter.record_success(latency)
+                        supervisor.record_url(latency)
+                        break
+
+                    except Exception as e:
+                        error_text = str(e)
+                        record_browser_error(limiter, error_text)
+                        if "ddos" in error_text.lower():
+                            timer.mark_ddos()
+                        print(Fore.RED + f"\n  [Попытка {attempt + 1}] ОШИБКА: {error_text[:200]}")
+                        if "crashed" in error_text.lower():
+                            wait = supervisor.record_crash()
+                            print(Fore.RED + Style.BRIGHT + "!!! ОБНАРУЖЕНО ПАДЕНИЕ СТРАНИЦЫ !!!")
+                            send_logs_to_telegram(
+                                f"🟡 ВНИМАНИЕ: Страница упала (crashed, {supervisor.consecutive_crashes} подряд). "
+                                f"Перезапускаю браузер через {wait} сек.")
+                            with timer.phase('sleep'):
+                                time.sleep(wait)
+                            launch_browser()
+                            continue
+                        debug_capture.capture(page, f"{article_id}_attempt_{attempt + 1}", 'attempt_error')
+                else:
+                    print(Fore.RED + Style.BRIGHT + f"!!! НЕ УДАЛОСЬ обработать {url} после {MAX_RETRIES} попыток.")
+                    record_failure(url, FAILURE_LOAD_ERROR, "Не удалось спарсить после всех попыток")
+                    supervisor.record_url(None)
+                    timer.finish('failed')
                     pbar.update(1)
-                    time.sleep(random.uniform(*PAUSE_BETWEEN_REQUESTS))
+                    continue
+
+                if product_data:
+                    with timer.phase('persistence'):
+                        save_product(all_data, article_id, product_data)
+                    timer.finish('ok')
+                else:
+                    timer.finish('no_product')
+
+                pbar.update(1)
+                pbar.set_postfix_str(f"{limiter.rate:.1f} запр/мин")
+
+        if browser: browser.close()
+
+
+def process_urls(urls_to_process: list[str], all_data: ProductStore, limiter: RateLimiter,
+                 source: QueueUrlSource | None = None):
+    if WORKERS > 1:
+        storage_state = get_city_session_state()
+        asyncio.run(run_worker_pool(urls_to_process, all_data, storage_state, limiter, source))
+    else:
+        run_sequential(urls_to_process, all_data, limiter, source)
+
+
+def should_skip_url(url: str) -> bool:
+    """
+    Ссылку не нужно загружать: постоянная неудача или пауза перед повтором. Товар, исключенный правилом, которого
+    больше нет в списках, загружается снова.
+    """
+    key = get_article_from_url(url) or url
+    entry = failures.get(key)
+    if entry and not entry['resolved'] and entry['reason'] == FAILURE_EXCLUDED:
+        if not exclusion_rules.has_rule(entry['message']):
+            return False
+        exclusion_rules.count(entry['message'])
+        return True
+    return failures.should_skip(key)
+
+
+def select_retry_urls(all_data: ProductStore, exclude: set[str]) -> list[str]:
+    """Ссылки временных неудач, которые пора повторить, кроме уже собранных товаров и ссылок из exclude."""
+    return [url for url in failures.due_urls()
+            if url not in exclude and get_article_from_url(url) not in all_data]
+
+
+def main():
+    global work_queue
+    init(autoreset=True)
+    start_time = datetime.datetime.now()
+    start_message = f"🚀 Парсер Europa-Market запущен в {start_time.strftime('%H:%M:%S')}"
+    print(Fore.CYAN + start_message)
+    # send_logs_to_telegram(start_message)
+
+    try:
+        all_data = load_existing_data(OUTPUT_JSON_FILE)
+        failures.load()
+        initial_data_count = len(all_data)
 
-            if browser: browser.close()
+        if WORK_QUEUE_FILE:
+            work_queue = WorkQueue(WORK_QUEUE_FILE)
+        if REFRESH_MODE:
+            urls_to_process = select_stale_urls(all_data)
+            if not urls_to_process:
+                print(Fore.YELLOW + f"Нет товаров старше {REFRESH_MAX_AGE_HOURS} ч. Завершение работы.")
+                send_logs_to_telegram("✅ Все цены актуальны. Обновлять нечего.")
+                return
+            print(f"К обновлению цен {Fore.CYAN}{len(urls_to_process)}{Style.RESET_ALL} товаров.")
+        else:
+            urls_to_parse = read_urls_from_file(INPUT_URL_FILE)
+            urls_to_process = [url for url in urls_to_parse if get_article_from_url(url) not in all_data]
+            skipped = [url for url in urls_to_process if should_skip_url(url)]
+            if skipped:
+                print(f"Пропущено {Fore.YELLOW}{len(skipped)}{Style.RESET_ALL} ссылок с постоянной неудачей "
+                      f"или еще не истекшей паузой перед повтором (см. {FAILURES_FILE}).")
+                skipped = set(skipped)
+                urls_to_process = [url for url in urls_to_process if url not in skipped]
+            urls_to_process += select_retry_urls(all_data, set(urls_to_process))
+
+            if not urls_to_process and work_queue is None:
+                print(Fore.YELLOW + "Все товары из списка уже обработаны. Завершение работы.")
+                send_logs_to_telegram("✅ Все товары уже обработаны. Новых ссылок нет.")
+                return
+
+            print(f"К обработке {Fore.CYAN}{len(urls_to_process)}{Style.RESET_ALL} новых ссылок.")
+
+        limiter = RateLimiter(*REQUESTS_PER_MINUTE, ddos_pause=DDOS_PAUSE_SECONDS)
+        if work_queue is not None:
+            added = work_queue.add_urls([(get_article_from_url(url), url) for url in urls_to_process
+                                         if get_article_from_url(url)])
+            print(f"Добавлено в очередь {WORK_QUEUE_FILE}: {added} ссылок.")
+            try:
+                process_urls([], all_data, limiter, QueueUrlSource(work_queue, all_data))
+            finally:
+                work_queue.close()
+        else:
+            process_urls(urls_to_process, all_data, limiter)
+        if not REFRESH_MODE and work_queue is None:
+            retry_urls = select_retry_urls(all_data, set())
+            if retry_urls:
+                print(Fore.CYAN + f"Повтор {len(retry_urls)} ссылок с временными ошибками...")
+                process_urls(retry_urls, all_data, limiter)
+
+        debug_capture.close()
+        metrics.close()
+        # Хранилище общей очереди выгружает и уплотняет только воркер, первым заставший ее разобранной: остальные
+        # оставляют свои записи в журнале дозаписи, чтобы не уплотнять файлы одновременно
+        if work_queue is None or work_queue.claim_export():
+            if work_queue is not None:
+                print(f"Очередь разобрана, товаров других воркеров выгружено: {work_queue.export(all_data)}")
+                # В журнале неудач есть и записи других воркеров на этом компьютере - перечитываем его с диска,
+                # иначе уплотнение оставило бы только неудачи этого процесса
+                failures.load()
+            all_data.compact()
+            failures.compact()
 
         end_time = datetime.datetime.now()
         duration = end_time - start_time
         newly_added_count = len(all_data) - initial_data_count
 
+        extra_lines = f"\n📬 Очередь: {work_queue.summary()}" if work_queue is not None else ''
+        if captures:
+            extra_lines += f"\n📡 Перехват API: {summarize_captures(captures)}"
         finish_message = (
             f"✅ Парсер Europa-Market успешно завершил работу.\n\n"
             f"👍 Добавлено новых товаров: {newly_added_count}\n"
+            f"🔄 Обновлено цен: {count_refreshed(all_data, start_time) if REFRESH_MODE else 0}\n"
             f"💾 Всего товаров в базе: {len(all_data)}\n"
             f"🕒 Время выполнения: {str(duration).split('.')[0]}"
+            f"\n🚦 Частота запросов: {limiter.summary()}"
+            f"\n⚠️ Неудачные ссылки: {failures.summary()}"
+            f"\n🚫 Исключения: {exclusion_rules.summary()}"
+            f"{extra_lines}"
+            f"\n🧭 Браузер: {summarize_supervisors(supervisors)}"
+            f"\n📸 Отладочные снимки: {debug_capture.summary()}"
+            f"\n\n📈 Замеры ({metrics.path}):\n{metrics.report()}"
+            f"{format_classification_stats()}"
         )
         print("-" * 50)
         print(Fore.CYAN + finish_message)
@@ -0,0 +1,325 @@
+"""
+Общая очередь ссылок step3 для нескольких процессов и компьютеров в одном файле SQLite (out/work_queue.sqlite).
+
+Вместо ручного деления product_links_for_get_data.txt каждый запущенный step3 (WORK_QUEUE_FILE в настройках) берет
+из очереди пачку ссылок в аренду (lease_batch) и, пока обрабатывает ее, продлевает аренду из фонового потока
+(renew). Если процесс упал или завис и аренда истекла, ссылки достаются другим воркерам. Одну ссылку в один момент
+держит только один воркер, поэтому добавление воркера увеличивает скорость без повторных посещений.
+
+Очередь хранится по артикулам:
+- pending - ждет воркера (для повторов - не раньше available_at);
+- leased - в аренде у воркера worker до lease_until;
+- done - товар собран, данные в таблице results;
+- deferred - временная неудача (нет в наличии, ошибка загрузки), повтор по расписанию хранилища неудач
+  (failure_store.py) не раньше available_at: снова раздается воркерам, но разобранной очередь не держит;
+- failed - не удалось после MAX_QUEUE_ATTEMPTS попыток или постоянная неудача (товар не найден, исключен).
+
+Воркер завершает работу, только когда очередь разобрана (is_drained): пока остаются ожидающие повтора ссылки
+(pending) или чужие аренды, он ждет ближайшего из них (seconds_until_available).
+
+Собранные товары всех воркеров лежат в одной таблице results и выгружаются в общее хранилище data.json
+(export, см. product_store.py). step3 выгружает их сам, если именно он первым застал очередь разобранной
+(claim_export), поэтому хранилище выгружает и уплотняет только один воркер. Вручную:
+    python work_queue.py stats|export|reset [--queue out/work_queue.sqlite] [--out out/data.json]
+
+Файл очереди можно положить в общую папку для нескольких компьютеров, но SQLite надежно блокирует файл только
+на локальном диске: для нескольких компьютеров файл лучше держать на одном из них и запускать воркеры там
+или на диске с поддержкой блокировок.
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from collections import Counter
+from contextlib import closing
+from colorama import Fore
+
+from product_store import ProductStore, OUTPUT_JSON_FILE
+
+WORK_QUEUE_FILE = os.path.join("out", "work_queue.sqlite")
+LEASE_SECONDS = 600
+# Пауза перед повтором ссылки после неудачи (умножается на номер попытки)
+RETRY_DELAY_SECONDS = 300
+MAX_QUEUE_ATTEMPTS = 3
+# Сколько ждать освобождения файла очереди другим процессом, с
+BUSY_TIMEOUT_SECONDS = 60
+
+STATUS_PENDING = 'pending'
+STATUS_LEASED = 'leased'
+STATUS_DONE = 'done'
+STATUS_DEFERRED = 'deferred'
+STATUS_FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    article TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    available_at REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS queue_status ON queue (status, available_at);
+CREATE TABLE IF NOT EXISTS results (
+    article TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    worker TEXT,
+    saved REAL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """Очередь одного воркера. Каждая операция открывает свое соединение, поэтому методы можно вызывать из разных
+    потоков (продление аренды идет из фонового потока)."""
+
+    def __init__(self, path: str = WORK_QUEUE_FILE, worker_id: str | None = None, lease_seconds: int = LEASE_SECONDS):
+        self.path = path
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        # Артикулы, которые этот воркер держит в аренде и еще не закрыл
+        self.held = set()
+        self.completed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = None
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _transaction(self, callback):
+        """Выполняет callback(conn) в транзакции с блокировкой на запись (BEGIN IMMEDIATE)"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = callback(conn)
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+            return result
+        finally:
+            conn.close()
+
+    def add_urls(self, urls: list[tuple[str, str]]) -> int:
+        """Добавляет пары (артикул, ссылка). Уже известные очереди артикулы не трогает. Возвращает число новых."""
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO queue (article, url, updated) VALUES (?, ?, ?)',
+                             [(article, url, time.time()) for article, url in urls])
+            return conn.total_changes - before
+        return self._transaction(insert)
+
+    def lease_batch(self, size: int) -> list[tuple[str, str]]:
+        """Берет в аренду до size ссылок: ожидающих, отложенных, чей повтор наступил, и с истекшей арендой.
+        Возвращает пары (артикул, ссылка)."""
+        def lease(conn):
+            now = time.time()
+            # Ссылки, на которых воркеры падали MAX_QUEUE_ATTEMPTS раз, больше не раздаются
+            conn.execute('UPDATE queue SET status = ?, error = ?, worker = NULL, updated = ? '
+                         'WHERE status = ? AND lease_until < ? AND attempts >= ?',
+                         (STATUS_FAILED, 'аренда истекла', now, STATUS_LEASED, now, MAX_QUEUE_ATTEMPTS))
+            rows = conn.execute('SELECT article, url FROM queue '
+                                'WHERE (status IN (?, ?) AND available_at <= ?) OR (status = ? AND lease_until < ?) '
+                                'ORDER BY attempts, rowid LIMIT ?',
+                                (STATUS_PENDING, STATUS_DEFERRED, now, STATUS_LEASED, now, size)).fetchall()
+            conn.executemany('UPDATE queue SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, '
+                             'updated = ? WHERE article = ?',
+                             [(STATUS_LEASED, self.worker_id, now + self.lease_seconds, now, row['article'])
+                              for row in rows])
+            return [(row['article'], row['url']) for row in rows]
+        batch = self._transaction(lease)
+        with self._lock:
+            self.held.update(article for article, _ in batch)
+        if batch:
+            self._ensure_heartbeat()
+        return batch
+
+    def renew(self) -> int:
+        """Продлевает аренду всех удерживаемых ссылок. Возвращает, сколько аренд еще принадлежит воркеру."""
+        with self._lock:
+            held = list(self.held)
+        if not held:
+            return 0
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.executemany('UPDATE queue SET lease_until = ?, updated = ? '
+                                      'WHERE article = ? AND status = ? AND worker = ?',
+                                      [(now + self.lease_seconds, now, article, STATUS_LEASED, self.worker_id)
+                                       for article in held])
+            return cursor.rowcount
+
+    def _ensure_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._run_heartbeat, name='work-queue-heartbeat',
+                                                   daemon=True)
+                self._heartbeat.start()
+
+    def _run_heartbeat(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                self.renew()
+            except sqlite3.Error as e:
+                print(Fore.YELLOW + f"Очередь: не удалось продлить аренду: {e}")
+
+    def complete(self, article: str, data: dict):
+        """Сохраняет собранный товар в общую таблицу результатов и закрывает ссылку"""
+        now = time.time()
+
+        def save(conn):
+            conn.execute('INSERT OR REPLACE INTO results (article, data, worker, saved) VALUES (?, ?, ?, ?)',
+                         (article, json.dumps(data, ensure_ascii=False), self.worker_id, now))
+            conn.execute('UPDATE queue SET status = ?, worker = ?, lease_until = NULL, error = NULL, updated = ? '
+                         'WHERE article = ?', (STATUS_DONE, self.worker_id, now, article))
+        self._transaction(save)
+        with self._lock:
+            self.held.discard(article)
+            self.completed += 1
+
+    def fail(self, article: str, error: str, permanent: bool = False, retry_at: float | None = None):
+        """
+        Неудача: ссылка возвращается в очередь с паузой или, если попытки кончились, помечается failed.
+        retry_at - время повтора по правилам хранилища неудач: тогда ссылка откладывается (deferred) до этого
+        времени без ограничения числа попыток очереди.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            if retry_at is not None and not permanent:
+                conn.execute('UPDATE queue SET status = ?, available_at = ?, attempts = 0, lease_until = NULL, '
+                             'error = ?, updated = ? WHERE article = ? AND status = ? AND worker = ?',
+                             (STATUS_DEFERRED, retry_at, error, now, article, STATUS_LEASED, self.worker_id))
+            else:
+                conn.execute('UPDATE queue SET status = CASE WHEN ? OR attempts >= ? THEN ? ELSE ? END, '
+                             'available_at = ? + attempts * ?, lease_until = NULL, error = ?, updated = ? '
+                             'WHERE article = ? AND status = ? AND worker = ?',
+                             (permanent, MAX_QUEUE_ATTEMPTS, STATUS_FAILED, STATUS_PENDING, now, RETRY_DELAY_SECONDS,
+                              error, now, article, STATUS_LEASED, self.worker_id))
+        with self._lock:
+            self.held.discard(article)
+
+    def release(self):
+        """Возвращает все удерживаемые ссылки в очередь без штрафа (при остановке воркера)"""
+        with self._lock:
+            held, self.held = list(self.held), set()
+        if not held:
+            return
+        with closing(self._connect()) as conn:
+            conn.executemany('UPDATE queue SET status = ?, worker = NULL, lease_until = NULL, '
+                             'attempts = MAX(attempts - 1, 0) WHERE article = ? AND status = ? AND worker = ?',
+                             [(STATUS_PENDING, article, STATUS_LEASED, self.worker_id) for article in held])
+
+    def stats(self) -> Counter:
+        with closing(self._connect()) as conn:
+            return Counter({row['status']: row['count'] for row in
+                            conn.execute('SELECT status, COUNT(*) AS count FROM queue GROUP BY status')})
+
+    def is_drained(self) -> bool:
+        """Не осталось ни ожидающих, ни арендованных ссылок"""
+        counts = self.stats()
+        return not counts[STATUS_PENDING] and not counts[STATUS_LEASED]
+
+    def seconds_until_available(self) -> float | None:
+        """Через сколько секунд может освободиться ссылка: ближайший отложенный повтор или истечение аренды.
+        None - ни ожидающих, ни арендованных ссылок нет, т.е. очередь разобрана (как is_drained)."""
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT MIN(CASE WHEN status = ? THEN available_at ELSE lease_until END) AS at '
+                               'FROM queue WHERE status IN (?, ?)',
+                               (STATUS_PENDING, STATUS_PENDING, STATUS_LEASED)).fetchone()
+        if row['at'] is None:
+            return None
+        return max(0.0, row['at'] - time.time())
+
+    def claim_export(self) -> bool:
+        """Очередь разобрана, и ее текущие результаты еще никто не выгружал: отмечает, что выгружает этот воркер.
+        Из воркеров, одновременно заставших очередь разобранной, True получает только один."""
+        def claim(conn):
+            counts = conn.execute('SELECT COUNT(*) AS active, (SELECT MAX(updated) FROM queue) AS changed '
+                                  'FROM queue WHERE status IN (?, ?)', (STATUS_PENDING, STATUS_LEASED)).fetchone()
+            if counts['active']:
+                return False
+            # Отметка - время последнего изменения очереди: после reset или новых ссылок выгрузка нужна снова
+            changed = repr(counts['changed'])
+            row = conn.execute("SELECT value FROM meta WHERE key = 'exported'").fetchone()
+            if row is not None and row['value'] == changed:
+                return False
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('exported', ?)", (changed,))
+            return True
+        return self._transaction(claim)
+
+    def export(self, store: ProductStore) -> int:
+        """Дописывает в хранилище товары из результатов, которых в нем нет или которые изменились"""
+        exported = 0
+        with closing(self._connect()) as conn:
+            for row in conn.execute('SELECT article, data FROM results ORDER BY saved'):
+                data = json.loads(row['data'])
+                if store.get(row['article']) != data:
+                    store.put(row['article'], data)
+                    exported += 1
+        return exported
+
+    def reset(self, statuses: tuple[str, ...] = (STATUS_DONE, STATUS_DEFERRED, STATUS_FAILED)) -> int:
+        """Возвращает в очередь закрытые ссылки (например, для нового обхода тех же товаров)"""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(f'UPDATE queue SET status = ?, attempts = 0, available_at = 0, error = NULL, '
+                                  f'updated = ? WHERE status IN ({", ".join("?" * len(statuses))})',
+                                  (STATUS_PENDING, time.time(), *statuses))
+            return cursor.rowcount
+
+    def summary(self) -> str:
+        counts = self.stats()
+        return (f"воркер {self.worker_id} собрал {self.completed}; в очереди: " +
+                ", ".join(f"{status}: {counts[status]}"
+                          for status in (STATUS_PENDING, STATUS_LEASED, STATUS_DONE, STATUS_DEFERRED, STATUS_FAILED)))
+
+    def close(self):
+        """Останавливает продление аренды и возвращает незакрытые ссылки в очередь"""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join(timeout=5)
+        self.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Общая очередь ссылок step3')
+    parser.add_argument('command', choices=['stats', 'export', 'reset'])
+    parser.add_argument('--queue', default=WORK_QUEUE_FILE, help='файл очереди')
+    parser.add_argument('--out', default=OUTPUT_JSON_FILE, help='хранилище для export')
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue)
+    if args.command == 'export':
+        store = ProductStore(args.out).load()
+        exported = queue.export(store)
+        store.compact()
+        print(Fore.GREEN + f"Выгружено товаров: {exported}, всего в {args.out}: {len(store)}")
+    elif args.command == 'reset':
+        print(f"Возвращено в очередь: {queue.reset()}")
+    print(queue.summary())
+
+
+if __name__ == '__main__':
+    main()